@@ -1,124 +1,868 @@
+import copy
 import flet
+import hashlib
 import numpy as np
+import os
 import threading
 import time
 import warnings
 import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from ikpy.chain import Chain
 from scipy.spatial.transform import Rotation as R
 from scipy.spatial.transform import Slerp
+from gui.reachability import ReachabilityMap
+from gui.tools import get_tool_library
+from gui.trajectory import plan_joint_move, load_joint_dynamics, get_trajectory_cache, JointTrajectory, SampledTrajectory, PROFILE_TRAPEZOID
+from gui.streaming import get_motion_streamer
+from gui.program import Program, ProgramError, ProgramRunner, MOVE_JOINT
+from gui.collision import setpoint_validator, collision_checker_error
 
-# === TOOL DICTIONARY ===
-ROBOT_TOOLS = {
-    "CHWYTAK_MALY": {
-        "translation": [0.100, 0.0, -0.090],
-        "orientation": [0.0, -180.0, 0.0]
-    },
-    
-    "CHWYTAK_DUZY": {
-        "translation": [0.0, 0.0, -0.18831],
-        "orientation": [0.0, -90.0, 0.0]
-    }
-}
+# Compiled chains are cached here as <urdf name>_<sha1>.npz
+KINEMATICS_CACHE_DIR = "cache"
+KINEMATICS_CACHE_VERSION = 1
 
 # ==============================================================================
 # ==============================================================================
 # 1. KINEMATICS ENGINE
 # ==============================================================================
+_ENGINES = {}
+_ENGINES_LOCK = threading.Lock()
+
+def get_kinematics_engine(urdf_path="resources/PAROL6.urdf"):
+    """Returns the KinematicsEngine shared by all views for urdf_path, creating it on first use."""
+    key = os.path.abspath(urdf_path)
+    with _ENGINES_LOCK:
+        engine = _ENGINES.get(key)
+        if engine is None:
+            engine = KinematicsEngine(urdf_path)
+            engine.load_reachability_maps()
+            _ENGINES[key] = engine
+        return engine
+
+# Batch IK worker processes hold their own engine, loaded once from the disk cache
+_BATCH_IK_ENGINE = None
+
+def _batch_ik_worker_init(urdf_path):
+    global _BATCH_IK_ENGINE
+    _BATCH_IK_ENGINE = KinematicsEngine(urdf_path)
+
+def _batch_ik_worker(tool_name, world_offset, positions, orientations):
+    engine = _BATCH_IK_ENGINE
+    if engine.current_tool != tool_name:
+        engine.set_tool(tool_name)
+    engine.world_offset = np.asarray(world_offset, dtype=float)
+    return engine._solve_ik_branches(positions, orientations)
+
+
 class KinematicsEngine:
-    def __init__(self, urdf_path, active_links_mask=None):
-        self.chain = None
+    def __init__(self, urdf_path, active_links_mask=None, cache_dir=KINEMATICS_CACHE_DIR):
+        self._chain = None
+        self._chain_lock = threading.Lock()
+        self._chain_failed = False
         self.urdf_path = urdf_path
+        self.cache_dir = cache_dir
         self.n_active_joints = 6
+        self.n_links = 0
+        self.active_links_mask = []
         self.visual_origins = {}
         self.joint_limits_rad = [(-np.pi, np.pi)] * 6
         
+        # Tools come from the shared tool table; the active one is applied as
+        # its precomposed flange -> TCP transform and inverse
+        self.tools = get_tool_library()
+        self.tool = None
+        self.tool_matrix = np.eye(4)
+        self.tool_inverse = np.eye(4)
         self.tool_translation = np.zeros(3) 
         self.tool_rotation_matrix = np.eye(3) 
         self.current_tool = "NONE"
         
         self.world_offset = np.array([0.0, 0.0, 0.0]) 
+        self.analytic_model = None
+        self.joint_origins = None
+        self._active_indices = np.array([], dtype=int)
+        self.joint_axes = None
+        self.flange_offset = np.eye(4)
+
+        # IK cache: quantized flange pose (base frame) -> known solutions (LRU)
+        self.ik_cache = OrderedDict()
+        self.ik_cache_size = 512
+        self.ik_cache_hits = 0
+        self.ik_cache_misses = 0
+        self._ik_cache_lock = threading.Lock()
+
+        # Per-thread result of the last IK solve: index of the joint whose limit was binding
+        self._ik_local = threading.local()
+
+        # Process pool for inverse_kinematics_batch, created on first use
+        self._ik_pool = None
+        self._ik_pool_workers = 0
+        self._ik_pool_lock = threading.Lock()
+
+        # Reachability voxel maps per tool, built offline (python -m gui.reachability)
+        self.reachability_maps = {}
+        self.reachability_resolution = 0.02
+        self.urdf_digest = ""
 
         try:
-            # Loading URDF
-            
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore", UserWarning)
-                self.chain = Chain.from_urdf_file(urdf_path)
-            
-            
-            mask = []
-            for link in self.chain.links:
-                if link.joint_type == 'fixed':
-                    mask.append(False)
-                else:
-                    mask.append(True)
-            
-            self.chain.active_links_mask = mask
-            self.active_links_mask = mask
-            
-            # === INCREASED PRECISION ===
-            self.chain.max_iterations = 50
-            self.chain.convergence_limit = 1e-4
-            
             self.joint_limits_rad = self._load_active_joint_limits()
-            self.visual_origins = self._load_visual_origins(urdf_path)
+
+            # Compiled chain from the disk cache, the URDF is only parsed on a miss
+            if not self._load_compiled_cache():
+                self._compile_chain()
+                self.visual_origins = self._load_visual_origins(urdf_path)
+                self._save_compiled_cache()
+            self._prepare_compiled_chain()
+
+            self.analytic_model = self._build_analytic_model()
             
             self.set_tool("CHWYTAK_MALY")
 
         except Exception as e:
             self._setup_mock_chain()
 
+    @property
+    def chain(self):
+        """ikpy chain, parsed on first use (only the iterative IK fallback needs it)."""
+        if self._chain is None and not self._chain_failed:
+            with self._chain_lock:
+                if self._chain is None and not self._chain_failed:
+                    try:
+                        self._chain = self._load_chain()
+                    except Exception:
+                        self._chain_failed = True
+        return self._chain
+
+    @chain.setter
+    def chain(self, value):
+        self._chain = value
+
+    @property
+    def is_ready(self):
+        return self.joint_origins is not None or self._chain is not None
+
+    def tool_transform(self, tool_name):
+        """Flange -> TCP homogeneous transform of a tool from the tool table (read-only)."""
+        return self.tools.get(tool_name).transform
+
     def set_tool(self, tool_name):
-        if tool_name not in ROBOT_TOOLS:
+        tool = self.tools.get(tool_name)
+        if tool is None:
             return
 
-        tool_data = ROBOT_TOOLS[tool_name]
-        self.tool_translation = np.array(tool_data["translation"])
-        rpy = tool_data.get("orientation", [0,0,0])
-        self.tool_rotation_matrix = R.from_euler('xyz', rpy, degrees=True).as_matrix()
+        self.tool = tool
+        self.tool_matrix = tool.transform
+        self.tool_inverse = tool.inverse
+        self.tool_translation = tool.translation
+        self.tool_rotation_matrix = tool.rotation
+        if self.joint_origins is not None:
+            self._update_flange_tool()
         
         self.current_tool = tool_name
 
+    def for_tool(self, tool_name):
+        """
+        Copy of the engine with tool_name active, for planning with another
+        tool (e.g. compiling a program on a worker thread) without switching
+        the tool the UI sees. Shares the compiled chain, the tool table and
+        the batch IK pool; has its own IK cache and per-thread buffers.
+        """
+        engine = copy.copy(self)
+        engine.ik_cache = OrderedDict()
+        engine.ik_cache_hits = 0
+        engine.ik_cache_misses = 0
+        engine._ik_cache_lock = threading.Lock()
+        engine._ik_local = threading.local()
+        engine._fk_local = threading.local()
+        engine.world_offset = np.array(self.world_offset, dtype=float)
+        engine._get_batch_ik_pool = self._get_batch_ik_pool
+        engine.shutdown_batch_ik_pool = self.shutdown_batch_ik_pool
+        engine.set_tool(tool_name)
+        return engine
+
+    def define_tool(self, tool_name, translation, orientation=(0.0, 0.0, 0.0)):
+        """
+        Adds or redefines a tool in the tool table. Cached IK solutions and the
+        reachability map of a redefined tool are dropped; its new map is picked
+        up once it is built (python -m gui.reachability).
+        """
+        self.tools.define(tool_name, translation, orientation)
+        self.reachability_maps.pop(tool_name, None)
+        self.clear_ik_cache()
+        if tool_name == self.current_tool:
+            self.set_tool(tool_name)
+
+    def calibrate_tool(self, tool_name, joint_poses, orientation=(0.0, 0.0, 0.0)):
+        """
+        TCP calibration from joint configurations [rad] that all touch the TCP to
+        the same fixed point. Stores the tool and returns the rms residual [m].
+        """
+        flange_poses = self.forward_kinematics_batch(joint_poses, tool_name=None, world_offset=False) @ self.tool_inverse
+        translation, _, rms = self.tools.calibrate_tcp(flange_poses)
+        self.define_tool(tool_name, translation, orientation)
+        return rms
+
     # ================= KINEMATICS =================
 
-    def forward_kinematics(self, active_angles):
+    def forward_kinematics(self, active_angles, copy=True):
+        """
+        TCP transform for one configuration. Runs on the compiled chain with
+        per-thread scratch buffers; copy=False returns the thread's output
+        buffer itself (valid until the next FK call on the same thread).
+        """
+        if self.joint_origins is None:
+            return self._chain_forward_kinematics(active_angles)
+
+        buf = self._fk_buffers()
+        q = buf.q
+        if len(active_angles) == 6:
+            q[:] = active_angles
+        else:
+            arr = np.asarray(active_angles, dtype=float).flatten()
+            q[:] = arr[1:] if len(arr) == 7 else np.resize(arr, len(q))
+        np.sin(q, out=buf.sin_flat)
+        np.cos(q, out=buf.cos_flat)
+
+        # origin_rot @ Rodrigues(q) = A + sin(q) * B - cos(q) * C, all joints at once
+        joints = buf.joints
+        np.multiply(self._joint_B, buf.sin, out=joints)
+        joints += self._joint_A
+        np.multiply(self._joint_C, buf.cos, out=buf.joints_tmp)
+        joints -= buf.joints_tmp
+
+        rot, tmp, pos = buf.rot, buf.tmp, buf.pos
+        rot[:] = self._eye3
+        pos.fill(0.0)
+        for j in range(len(q)):
+            np.matmul(rot, self._origin_pos[j], out=buf.vec)
+            pos += buf.vec
+            np.matmul(rot, joints[j], out=tmp)
+            rot, tmp = tmp, rot
+
+        np.matmul(rot, self._flange_tool_pos, out=buf.vec)
+        pos += buf.vec
+        pos += self.world_offset
+
+        tcp = buf.tcp
+        np.matmul(rot, self._flange_tool_rot, out=tmp)
+        tcp[:3, :3] = tmp
+        tcp[:3, 3] = pos
+        return tcp.copy() if copy else tcp
+
+    def _chain_forward_kinematics(self, active_angles):
         full_joints = self._active_to_full(active_angles)
         flange_matrix = self.chain.forward_kinematics(full_joints)
         
-        R_flange = flange_matrix[:3, :3]
-        P_flange = flange_matrix[:3, 3]
-        
-        offset_global = R_flange @ self.tool_translation
-        P_tcp = P_flange + offset_global + self.world_offset
-        
-        tcp_matrix = np.eye(4)
-        tcp_matrix[:3, 3] = P_tcp
-        tcp_matrix[:3, :3] = R_flange @ self.tool_rotation_matrix
-        
+        tcp_matrix = flange_matrix @ self.tool_matrix
+        tcp_matrix[:3, 3] += self.world_offset
         return tcp_matrix
 
+    def forward_kinematics_batch(self, joint_array, tool_name=None, world_offset=True):
+        """
+        Vectorized FK: (N,6) active joint angles [rad] -> (N,4,4) TCP transforms,
+        including the active tool (or tool_name) and world_offset.
+        """
+        q = np.atleast_2d(np.asarray(joint_array, dtype=float))
+        if self.joint_origins is None:
+            return np.array([self.forward_kinematics(row) for row in q])
+
+        tool = self.tool_transform(tool_name) if tool_name else self.tool_matrix
+        tool_rot, tool_pos = tool[:3, :3], tool[:3, 3]
+
+        n = q.shape[0]
+        s, c = np.sin(q), np.cos(q)
+        # Rodrigues for every joint of every row at once: (N,6,3,3)
+        joint_rot = (np.eye(3) + s[:, :, None, None] * self._axes_cross
+                     + (1.0 - c)[:, :, None, None] * self._axes_cross_sq)
+
+        rot = np.broadcast_to(np.eye(3), (n, 3, 3))
+        pos = np.zeros((n, 3))
+        for j in range(q.shape[1]):
+            origin = self.joint_origins[j]
+            pos = pos + rot @ origin[:3, 3]
+            rot = (rot @ origin[:3, :3]) @ joint_rot[:, j]
+
+        pos = pos + rot @ self.flange_offset[:3, 3]
+        rot = rot @ self.flange_offset[:3, :3]
+
+        tcp = np.zeros((n, 4, 4))
+        tcp[:, :3, :3] = rot @ tool_rot
+        tcp[:, :3, 3] = pos + rot @ tool_pos
+        if world_offset:
+            tcp[:, :3, 3] += self.world_offset
+        tcp[:, 3, 3] = 1.0
+        return tcp
+
+    def link_frames(self, active_angles):
+        """
+        (7,4,4) world transforms of base_link and L1..L6 (the mesh frames),
+        world_offset included. Needs the compiled chain.
+        """
+        q = np.resize(np.asarray(active_angles, dtype=float).flatten(), len(self.joint_origins))
+        s, c = np.sin(q), np.cos(q)
+        joints = self._joint_A + s[:, None, None] * self._joint_B - c[:, None, None] * self._joint_C
+
+        frames = np.tile(np.eye(4), (len(q) + 1, 1, 1))
+        frames[0, :3, 3] = self.world_offset
+        rot, pos = np.eye(3), self.world_offset.astype(float)
+        for j in range(len(q)):
+            pos = pos + rot @ self._origin_pos[j]
+            rot = rot @ joints[j]
+            frames[j + 1, :3, :3] = rot
+            frames[j + 1, :3, 3] = pos
+        return frames
+
+    def jacobian(self, active_angles):
+        """
+        Geometric 6x6 Jacobian of the TCP in the base frame.
+        Rows 0-2 map joint rates to linear velocity, rows 3-5 to angular velocity.
+        """
+        q = np.resize(np.asarray(active_angles, dtype=float).flatten(), len(self.joint_origins))
+        s, c = np.sin(q), np.cos(q)
+        joints = self._joint_A + s[:, None, None] * self._joint_B - c[:, None, None] * self._joint_C
+
+        rot, pos = np.eye(3), np.zeros(3)
+        origins, axes = np.empty((len(q), 3)), np.empty((len(q), 3))
+        for j in range(len(q)):
+            pos = pos + rot @ self._origin_pos[j]
+            origins[j], axes[j] = pos, rot @ self._origin_axes[j]
+            rot = rot @ joints[j]
+        tcp = pos + rot @ self._flange_tool_pos
+
+        J = np.empty((6, len(q)))
+        J[:3] = np.cross(axes, tcp - origins).T
+        J[3:] = axes.T
+        return J
+
+    @staticmethod
+    def damped_least_squares(jacobian, twist, damping=0.01):
+        """Joint step dq = J^T (J J^T + lambda^2 I)^-1 * twist."""
+        JJt = jacobian @ jacobian.T
+        JJt[np.diag_indices_from(JJt)] += damping ** 2
+        return jacobian.T @ np.linalg.solve(JJt, twist)
+
+    # Scales the linear rows of the Jacobian so metres and radians weigh alike
+    CHARACTERISTIC_LENGTH = 0.25
+
+    def manipulability(self, active_angles):
+        """
+        (Yoshikawa measure sqrt(det(J J^T)), inverse condition number
+        sigma_min / sigma_max) of the length-normalized Jacobian. Both drop
+        to 0 at a singularity; the inverse condition number is scale free.
+        """
+        J = self.jacobian(active_angles)
+        J[:3] /= self.CHARACTERISTIC_LENGTH
+        s = np.linalg.svd(J, compute_uv=False)
+        return float(np.prod(s)), float(s[-1] / s[0]) if s[0] > 0 else 0.0
+
     def inverse_kinematics(self, target_position, target_orientation, initial_guess=None):
         if initial_guess is None: initial_guess = np.zeros(6)
-        
-        target_raw = target_position - self.world_offset
-        
-        target_rot_matrix = target_orientation 
-        flange_rot_matrix = target_rot_matrix @ np.linalg.inv(self.tool_rotation_matrix)
-        
-        offset_global = flange_rot_matrix @ self.tool_translation
-        target_pos_flange = target_raw - offset_global
-        
-        full_guess = self._active_to_full(initial_guess)
-        
+        guess = np.resize(np.array(initial_guess, dtype=float).flatten(), 6)
+
+        target_pos_flange, flange_rot_matrix = self._tcp_to_flange(target_position, target_orientation)
+        key = self._ik_cache_key(target_pos_flange, flange_rot_matrix)
+        cached = self._ik_cache_get(key)
+
+        self._ik_local.binding_joint = None
+
+        # Closed-form branches first (or the cached ones), the branch inside the
+        # joint limits nearest to the guess wins
+        if self.analytic_model is not None and (cached is None or cached[0]):
+            branches = cached[1] if cached is not None else self._analytic_ik_flange(target_pos_flange, flange_rot_matrix, guess)
+            if branches:
+                limits = np.array(self.joint_limits_rad)
+                stacked = np.array(branches)
+                distance = np.max(np.abs(self._wrap_angles(stacked - guess)), axis=1)
+                excess = np.max(np.maximum(limits[:, 0] - stacked, stacked - limits[:, 1]), axis=1)
+                inside = np.flatnonzero(excess <= 1e-6)
+                if not len(inside):
+                    # Every branch violates a limit: solve with the limits as bounds from
+                    # the nearest branch and report the joint that keeps it from the target
+                    nearest = branches[int(np.argmin(distance))]
+                    self._ik_local.binding_joint = self._limit_violation(nearest, limits)
+                    self._ik_cache_put(key, True, branches, hit=cached is not None)
+                    return self._refine_analytic(nearest, target_pos_flange, flange_rot_matrix, iterations=8, bounds=limits)
+
+                i = int(inside[np.argmin(distance[inside])])
+                solution = self._refine_analytic(branches[i], target_pos_flange, flange_rot_matrix)
+                branches = list(branches)
+                branches[i] = solution
+                self._ik_cache_put(key, True, branches, hit=cached is not None)
+                return solution
+
+        # ikpy, warm-started from a cached solution on the same branch as the guess
+        warm_start = None
+        if cached is not None and not cached[0]:
+            if np.max(np.abs(self._wrap_angles(cached[1][0] - guess))) < np.pi / 2:
+                warm_start = cached[1][0]
+
+        full_guess = self._active_to_full(warm_start if warm_start is not None else guess)
+
         full_sol = self.chain.inverse_kinematics(
             target_position=target_pos_flange,
-            target_orientation=flange_rot_matrix, 
-            orientation_mode='all', 
+            target_orientation=flange_rot_matrix,
+            orientation_mode='all',
             initial_position=full_guess
         )
-        
-        return self._full_to_active(full_sol)
+
+        solution = self._full_to_active(full_sol)
+        at_bound = [j for j, (q, (mn, mx)) in enumerate(zip(solution, self.joint_limits_rad))
+                    if q <= mn + 1e-6 or q >= mx - 1e-6]
+        self._ik_local.binding_joint = at_bound[0] if at_bound else None
+        self._ik_cache_put(key, False, [solution], hit=warm_start is not None)
+        return solution
+
+    def last_ik_binding_joint(self):
+        """
+        Joint index (0-5) whose limit was binding in this thread's last
+        inverse_kinematics() call, or None. Maps to the OOR1..OOR6 codes.
+        """
+        return getattr(self._ik_local, "binding_joint", None)
+
+    @staticmethod
+    def _limit_violation(q, limits, tol=1e-6):
+        """Index of the joint furthest outside its limits, None if all are inside."""
+        excess = np.maximum(limits[:, 0] - q, q - limits[:, 1])
+        j = int(np.argmax(excess))
+        return j if excess[j] > tol else None
+
+    # ================= BATCH IK =================
+
+    # Below this many waypoints the pool overhead outweighs the gain
+    BATCH_IK_MIN_PARALLEL = 64
+
+    def inverse_kinematics_batch(self, target_positions, target_orientations, initial_guess=None, processes=None):
+        """
+        IK for a list of TCP waypoints -> (N,6) joint trajectory [rad].
+        The closed-form branches of all waypoints are solved in a process pool
+        (consecutive chunks per worker), then one branch per waypoint is chosen
+        so the whole path from initial_guess moves the joints the least.
+        Without the analytic model the waypoints are solved in order, each one
+        warm-started from its predecessor.
+        Raises ValueError for the first waypoint without a solution.
+        """
+        positions = np.asarray(target_positions, dtype=float).reshape(-1, 3)
+        orientations = np.asarray(target_orientations, dtype=float)
+        if orientations.ndim == 2:
+            orientations = np.broadcast_to(orientations, (len(positions), 3, 3))
+        guess = np.zeros(6) if initial_guess is None else np.resize(np.asarray(initial_guess, dtype=float).flatten(), 6)
+
+        if self.analytic_model is None:
+            trajectory = np.empty((len(positions), 6))
+            for i in range(len(positions)):
+                trajectory[i] = guess = self.inverse_kinematics(positions[i], orientations[i], guess)
+            return trajectory
+
+        branches = self._batch_ik_branches(positions, orientations, processes)
+        return self._select_continuous_branches(branches, guess)
+
+    def shutdown_batch_ik_pool(self):
+        with self._ik_pool_lock:
+            if self._ik_pool is not None:
+                self._ik_pool.shutdown(wait=False, cancel_futures=True)
+            self._ik_pool = None
+            self._ik_pool_workers = 0
+
+    def _batch_ik_branches(self, positions, orientations, processes=None):
+        workers = processes or os.cpu_count() or 1
+        if workers > 1 and len(positions) >= self.BATCH_IK_MIN_PARALLEL:
+            try:
+                pool = self._get_batch_ik_pool(workers)
+                bounds = np.linspace(0, len(positions), workers + 1).astype(int)
+                futures = [
+                    pool.submit(_batch_ik_worker, self.current_tool, self.world_offset,
+                                positions[a:b], orientations[a:b])
+                    for a, b in zip(bounds[:-1], bounds[1:]) if b > a
+                ]
+                return [sols for f in futures for sols in f.result()]
+            except Exception:
+                self.shutdown_batch_ik_pool()
+        return self._solve_ik_branches(positions, orientations)
+
+    def _get_batch_ik_pool(self, workers):
+        with self._ik_pool_lock:
+            if self._ik_pool is None or self._ik_pool_workers != workers:
+                if self._ik_pool is not None:
+                    self._ik_pool.shutdown(wait=False)
+                self._ik_pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    initializer=_batch_ik_worker_init,
+                    initargs=(self.urdf_path,)
+                )
+                self._ik_pool_workers = workers
+            return self._ik_pool
+
+    def _solve_ik_branches(self, positions, orientations):
+        """All analytic branches per waypoint as (k,6) arrays; branches inside the joint limits are preferred."""
+        limits = np.array(self.joint_limits_rad)
+        result = []
+        for pos, rot in zip(positions, orientations):
+            sols = np.array(self.inverse_kinematics_analytic(pos, rot)).reshape(-1, 6)
+            inside = np.all((sols >= limits[:, 0]) & (sols <= limits[:, 1]), axis=1)
+            result.append(sols[inside] if inside.any() else sols)
+        return result
+
+    @staticmethod
+    def _select_continuous_branches(branches, initial_guess):
+        """Dynamic programming over the branches: minimal summed squared joint step."""
+        cost, back = None, []
+        prev = np.asarray(initial_guess, dtype=float)[None, :]
+        for i, sols in enumerate(branches):
+            if len(sols) == 0:
+                raise ValueError(f"No IK solution for waypoint {i}")
+            step = np.sum((sols[:, None, :] - prev[None, :, :]) ** 2, axis=2)
+            total = step if cost is None else step + cost[None, :]
+            best_prev = np.argmin(total, axis=1)
+            cost = total[np.arange(len(sols)), best_prev]
+            back.append(best_prev)
+            prev = sols
+
+        trajectory = np.empty((len(branches), 6))
+        j = int(np.argmin(cost)) if cost is not None else 0
+        for i in range(len(branches) - 1, -1, -1):
+            trajectory[i] = branches[i][j]
+            j = back[i][j]
+        return trajectory
+
+    # ================= LINEAR MOVES (MoveL) =================
+
+    # TCP limits of a MoveL at 100% speed [m/s, m/s^2, rad/s, rad/s^2]
+    MOVEL_LINEAR_SPEED = 0.25
+    MOVEL_LINEAR_ACCEL = 1.0
+    MOVEL_ANGULAR_SPEED = 1.5
+    MOVEL_ANGULAR_ACCEL = 6.0
+    # Joint step between two setpoints above this is a branch flip / singularity, not a path
+    MOVEL_MAX_JOINT_STEP = 0.15
+
+    def plan_linear_move(self, start_joints, target_position, target_orientation,
+                         speed_scale=1.0, rate_hz=50.0, profile=PROFILE_TRAPEZOID, dynamics=None):
+        """
+        MoveL: TCP position interpolated linearly and orientation with Slerp from
+        the pose at start_joints to the target, timed by a trapezoid/S-curve on
+        the TCP limits. The whole dense path is solved up front (batch IK,
+        branches chosen for continuity) and returned as a SampledTrajectory.
+        Where the path would exceed a joint VMAX it is slowed down as a whole.
+        Raises ValueError when a waypoint is unreachable, outside the joint
+        limits, or the joint path is discontinuous.
+        """
+        start_joints = np.resize(np.asarray(start_joints, dtype=float).flatten(), 6)
+        start_tcp = self.forward_kinematics(start_joints)
+        goal_pos = np.asarray(target_position, dtype=float)
+        goal_rot = np.asarray(target_orientation, dtype=float)
+
+        rotations = R.from_matrix(np.stack([start_tcp[:3, :3], goal_rot]))
+        slerp = Slerp([0.0, 1.0], rotations)
+        length = float(np.linalg.norm(goal_pos - start_tcp[:3, 3]))
+        angle = float((rotations[1] * rotations[0].inv()).magnitude())
+
+        vmax, _ = dynamics if dynamics is not None else load_joint_dynamics()
+        limits = np.array(self.joint_limits_rad)
+        scale = float(speed_scale)
+        for _ in range(3):
+            # Path parameter timed as one [length, angle] move on the TCP limits
+            timing = JointTrajectory(
+                [0.0, 0.0], [length, angle],
+                [self.MOVEL_LINEAR_SPEED, self.MOVEL_ANGULAR_SPEED],
+                [self.MOVEL_LINEAR_ACCEL, self.MOVEL_ANGULAR_ACCEL],
+                scale, profile
+            )
+            n = max(1, int(np.ceil(timing.duration * rate_hz)))
+            s = timing.progress(np.minimum(np.arange(1, n + 1) / rate_hz, timing.duration))
+
+            positions = start_tcp[:3, 3] + np.multiply.outer(s, goal_pos - start_tcp[:3, 3])
+            orientations = slerp(s).as_matrix()
+            path = self.inverse_kinematics_batch(positions, orientations, initial_guess=start_joints)
+
+            bad = np.flatnonzero(np.any((path < limits[:, 0] - 1e-6) | (path > limits[:, 1] + 1e-6), axis=1))
+            if len(bad):
+                raise ValueError(f"MoveL waypoint {bad[0]} violates the joint limits")
+
+            steps = np.abs(np.diff(np.vstack([start_joints, path]), axis=0))
+            if np.max(steps) > self.MOVEL_MAX_JOINT_STEP:
+                raise ValueError(f"MoveL joint path is discontinuous at waypoint {int(np.argmax(np.max(steps, axis=1)))}")
+
+            # Slow the whole move down where the joints cannot keep up
+            overload = float(np.max(steps * rate_hz / vmax))
+            if overload <= 1.0:
+                return SampledTrajectory(path, rate_hz)
+            scale /= overload * 1.05
+        return SampledTrajectory(path, rate_hz)
+
+    # ================= REACHABILITY =================
+
+    def is_reachable(self, target_position, target_orientation=None):
+        """
+        O(1) pre-check against the voxel map of the active tool. Maps are only
+        loaded here, never built: without a map file (python -m gui.reachability)
+        every target passes and IK decides.
+        """
+        rmap = self.reachability_maps.get(self.current_tool)
+        if rmap is None:
+            rmap = self.load_reachability_map(self.current_tool)
+            if rmap is None:
+                return True
+        return rmap.is_reachable(np.asarray(target_position) - self.world_offset, target_orientation)
+
+    def reachability_map(self, tool_name=None):
+        return self.reachability_maps.get(tool_name or self.current_tool)
+
+    def load_reachability_maps(self):
+        """Opens the cached map of every tool that has one."""
+        for name in self.tools:
+            self.load_reachability_map(name)
+
+    def load_reachability_map(self, tool_name):
+        """Opens the cached map of tool_name; None without one (a missing file costs one stat)."""
+        if self.joint_origins is None:
+            return None
+        path = self._reachability_path(tool_name)
+        if not os.path.exists(path):
+            return None
+        try:
+            rmap = ReachabilityMap.load(path)
+        except Exception:
+            return None
+        self.reachability_maps[tool_name] = rmap
+        return rmap
+
+    def build_reachability_map(self, tool_name, samples=2_000_000):
+        """Samples and saves the map of tool_name (seconds of batch FK; run offline via python -m gui.reachability)."""
+        path = self._reachability_path(tool_name)
+        rmap = ReachabilityMap.build(self, tool_name, self.reachability_resolution, samples)
+        try:
+            rmap.save(path)
+            rmap = ReachabilityMap.load(path)
+        except Exception:
+            pass
+        # A tool redefined during the build keeps waiting for its own map
+        if path == self._reachability_path(tool_name):
+            self.reachability_maps[tool_name] = rmap
+        return path
+
+    def _reachability_path(self, tool_name):
+        return ReachabilityMap.cache_path(
+            self.cache_dir, self.urdf_digest, tool_name,
+            self.tool_transform(tool_name), self.reachability_resolution
+        )
+
+    # ================= IK CACHE =================
+
+    def ik_cache_stats(self):
+        with self._ik_cache_lock:
+            total = self.ik_cache_hits + self.ik_cache_misses
+            return {
+                "hits": self.ik_cache_hits,
+                "misses": self.ik_cache_misses,
+                "hit_rate": self.ik_cache_hits / total if total else 0.0,
+                "size": len(self.ik_cache),
+                "capacity": self.ik_cache_size,
+            }
+
+    def clear_ik_cache(self):
+        with self._ik_cache_lock:
+            self.ik_cache.clear()
+            self.ik_cache_hits = 0
+            self.ik_cache_misses = 0
+
+    def _ik_cache_key(self, flange_position, flange_orientation):
+        # Keyed on the flange pose in the robot base frame, which the branches solve:
+        # a changed world_offset or tool gives a new key, never a stale entry.
+        # 0.05 mm / 1e-4 rotation-matrix quantum; hits are re-polished to the exact target
+        pos = np.round(np.asarray(flange_position, dtype=float) / 5e-5).astype(np.int64)
+        rot = np.round(np.asarray(flange_orientation, dtype=float) / 1e-4).astype(np.int64)
+        return (pos.tobytes(), rot.tobytes())
+
+    def _ik_cache_get(self, key):
+        """
+        Entry is (complete, solutions): complete entries hold every analytic
+        branch, the others a single ikpy solution used as a warm start.
+        """
+        with self._ik_cache_lock:
+            entry = self.ik_cache.get(key)
+            if entry is not None:
+                self.ik_cache.move_to_end(key)
+            return entry
+
+    def _ik_cache_put(self, key, complete, solutions, hit):
+        with self._ik_cache_lock:
+            if hit:
+                self.ik_cache_hits += 1
+            else:
+                self.ik_cache_misses += 1
+            self.ik_cache[key] = (complete, solutions)
+            self.ik_cache.move_to_end(key)
+            while len(self.ik_cache) > self.ik_cache_size:
+                self.ik_cache.popitem(last=False)
+
+    def inverse_kinematics_analytic(self, target_position, target_orientation, initial_guess=None):
+        """
+        Returns all closed-form IK branches (shoulder x elbow x wrist, up to 8)
+        reaching the TCP pose, as a list of 6-element arrays in radians.
+        Empty list if the pose is unreachable or the geometry is not supported.
+        """
+        if self.analytic_model is None:
+            return []
+        if initial_guess is None: initial_guess = np.zeros(6)
+        target_pos_flange, flange_rot_matrix = self._tcp_to_flange(target_position, target_orientation)
+        return [
+            self._refine_analytic(q, target_pos_flange, flange_rot_matrix)
+            for q in self._analytic_ik_flange(target_pos_flange, flange_rot_matrix, initial_guess)
+        ]
+
+    # ================= ANALYTIC IK =================
+
+    def _tcp_to_flange(self, target_position, target_orientation):
+        target_raw = np.asarray(target_position, dtype=float) - self.world_offset
+
+        # T_flange = T_tcp @ T_tool^-1, with the inverse precomposed by the tool
+        inv = self.tool_inverse
+        target_rot_matrix = np.asarray(target_orientation, dtype=float)
+        flange_rot_matrix = target_rot_matrix @ inv[:3, :3]
+        return target_raw + target_rot_matrix @ inv[:3, 3], flange_rot_matrix
+
+    def _build_analytic_model(self):
+        """
+        Extracts the fixed joint origins of the arm from the loaded chain.
+        Returns None when the chain is not a 6R arm with a spherical wrist
+        (J5/J6 centred on the J4 axis, ZYZ wrist), so that IK falls back to ikpy.
+        """
+        if self.joint_origins is None or len(self.joint_origins) != 6:
+            return None
+        if np.any(np.abs(np.abs(self.joint_axes[:, 2]) - 1.0) > 1e-6) or np.linalg.norm(self.flange_offset - np.eye(4)) > 1e-9:
+            return None
+
+        origins = list(self.joint_origins)
+        signs = np.sign(self.joint_axes[:, 2])
+
+        (R1, t1), (R2, t2), (R3, t3), (R4, t4), (R5, t5), (R6, t6) = [(o[:3, :3], o[:3, 3]) for o in origins]
+
+        # Spherical wrist: J5/J6 at the same point on the J4 axis, J5 axis along +/-Y of J4
+        if np.linalg.norm(t6) > 1e-6 or np.linalg.norm(t5[:2]) > 1e-6:
+            return None
+        if np.linalg.norm(R5 @ R6 - np.eye(3)) > 1e-3 or abs(abs(R5[1, 2]) - 1.0) > 1e-3:
+            return None
+
+        # Shoulder plane normal (J2 axis) must be horizontal in the J1 frame
+        n = R2[:, 2]
+        if abs(n[2]) > 1e-3:
+            return None
+
+        v = t4 + R4 @ t5      # wrist centre in the rotated J3 frame
+        b = R3.T @ t3         # J3 offset seen from the J3 frame
+        b_xy, v_xy = np.hypot(b[0], b[1]), np.hypot(v[0], v[1])
+        if b_xy < 1e-9 or v_xy < 1e-9:
+            return None
+
+        return {
+            "origins": origins,
+            "signs": signs,
+            "wrist_sign": float(np.sign(R5[1, 2])),
+            "psi": np.arctan2(n[1], n[0]),
+            "plane_offset": float(n @ t2 + t3[2] + R3[2, 2] * v[2]),
+            "v": v,
+            "b_xy": b_xy, "v_xy": v_xy,
+            "phi_b": np.arctan2(b[1], b[0]), "phi_v": np.arctan2(v[1], v[0]),
+            "len_const": float(t3 @ t3 + v @ v + 2.0 * b[2] * v[2]),
+        }
+
+    def _analytic_ik_flange(self, flange_pos, flange_rot, initial_guess):
+        g = self.analytic_model
+        (R1, t1), (R2, t2), (R3, t3), (R4, _), _, _ = [(o[:3, :3], o[:3, 3]) for o in g["origins"]]
+        signs = g["signs"]
+        guess = np.resize(np.array(initial_guess, dtype=float).flatten(), 6)
+
+        p1 = R1.T @ (np.asarray(flange_pos, dtype=float) - t1)
+        r = np.hypot(p1[0], p1[1])
+        d = g["plane_offset"]
+        if r < 1e-6 or abs(d) > r:
+            return []
+
+        solutions = []
+        base = np.arctan2(p1[1], p1[0]) - g["psi"]
+        delta = np.arccos(d / r)
+        for th1 in (base - delta, base + delta):
+            Rz1 = self._rot_z(th1)
+            w = R2.T @ (Rz1.T @ p1 - t2)
+
+            k = (w @ w - g["len_const"]) / (2.0 * g["b_xy"] * g["v_xy"])
+            if abs(k) > 1.0 + 1e-9:
+                continue
+            elbow = np.arccos(np.clip(k, -1.0, 1.0))
+
+            for th3 in (g["phi_b"] - g["phi_v"] + elbow, g["phi_b"] - g["phi_v"] - elbow):
+                Rz3 = self._rot_z(th3)
+                u = t3 + R3 @ Rz3 @ g["v"]
+                th2 = np.arctan2(w[1], w[0]) - np.arctan2(u[1], u[0])
+
+                R03 = R1 @ Rz1 @ R2 @ self._rot_z(th2) @ R3 @ Rz3 @ R4
+                M = R03.T @ flange_rot
+
+                # M = Rz(a) * Ry(b) * Rz(c)
+                sb = np.hypot(M[0, 2], M[1, 2])
+                if sb < 1e-6:
+                    a = signs[3] * guess[3]
+                    wrists = [(a, 0.0, np.arctan2(M[1, 0], M[0, 0]) - a)]
+                else:
+                    cb = M[2, 2]
+                    wrists = [
+                        (np.arctan2(M[1, 2], M[0, 2]), np.arctan2(sb, cb), np.arctan2(M[2, 1], -M[2, 0])),
+                        (np.arctan2(-M[1, 2], -M[0, 2]), np.arctan2(-sb, cb), np.arctan2(-M[2, 1], M[2, 0])),
+                    ]
+
+                for a, b, c in wrists:
+                    eff = np.array([th1, th2, th3, a, g["wrist_sign"] * b, c])
+                    solutions.append(self._wrap_angles(eff * signs))
+
+        return solutions
+
+    def _refine_analytic(self, q, flange_pos, flange_rot, iterations=2, bounds=None):
+        """
+        Newton polish of a closed-form branch. The URDF angles are rounded
+        (3.1416, 1.5708), so the ideal geometry is off by a few microradians,
+        which grows to ~1e-2 rad near the shoulder singularity.
+        With bounds ((6,2) array) the steps are damped and projected onto the
+        joint limits, giving the closest pose the limits allow.
+        """
+        g = self.analytic_model
+        q = np.array(q, dtype=float)
+        if bounds is not None:
+            q = np.clip(q, bounds[:, 0], bounds[:, 1])
+        origins_z = np.empty((6, 3))
+        axes = np.empty((6, 3))
+        for _ in range(iterations):
+            Rc, pc = np.eye(3), np.zeros(3)
+            for i, (origin, sign, angle) in enumerate(zip(g["origins"], g["signs"], q)):
+                pc = pc + Rc @ origin[:3, 3]
+                Rc = Rc @ origin[:3, :3]
+                origins_z[i], axes[i] = pc, sign * Rc[:, 2]
+                Rc = Rc @ self._rot_z(sign * angle)
+
+            # Small-angle rotation error, the branch is already within ~1e-2 rad
+            E = flange_rot @ Rc.T
+            err = np.concatenate([flange_pos - pc, 0.5 * np.array([E[2, 1] - E[1, 2], E[0, 2] - E[2, 0], E[1, 0] - E[0, 1]])])
+            if np.max(np.abs(err)) < 1e-9:
+                break
+
+            J = np.vstack([np.cross(axes, pc - origins_z).T, axes.T])
+            if bounds is not None:
+                q = np.clip(q + self.damped_least_squares(J, err, 0.01), bounds[:, 0], bounds[:, 1])
+                continue
+            try:
+                q = q + np.linalg.solve(J, err)
+            except np.linalg.LinAlgError:
+                q = q + np.linalg.lstsq(J, err, rcond=1e-6)[0]
+        return q if bounds is not None else self._wrap_angles(q)
+
+    @staticmethod
+    def _rot_z(theta):
+        c, s = np.cos(theta), np.sin(theta)
+        return np.array([[c, -s, 0.0], [s, c, 0.0], [0.0, 0.0, 1.0]])
+
+    @staticmethod
+    def _wrap_angles(angles):
+        return (np.asarray(angles, dtype=float) + np.pi) % (2 * np.pi) - np.pi
 
     # ================= HELPERS =================
 
@@ -127,14 +871,134 @@ class KinematicsEngine:
         if len(arr) == 7: arr = arr[1:] 
         if len(arr) != 6: arr = np.resize(arr, 6)
         
-        full = np.zeros(len(self.chain.links))
-        curr = 0
-        for i, act in enumerate(self.active_links_mask):
-            if act and curr < 6:
-                full[i] = arr[curr]
-                curr += 1
+        full = np.zeros(self.n_links)
+        full[self._active_indices[:6]] = arr[:len(self._active_indices[:6])]
         return full
 
+    def _load_chain(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            chain = Chain.from_urdf_file(self.urdf_path)
+
+        mask = [link.joint_type != 'fixed' for link in chain.links]
+        chain.active_links_mask = mask
+
+        # The solver bounds are the panel's joint limits, not the URDF ones
+        active = [link for link, act in zip(chain.links, mask) if act]
+        for link, bounds in zip(active, self.joint_limits_rad):
+            link.bounds = tuple(bounds)
+
+        # === INCREASED PRECISION ===
+        chain.max_iterations = 50
+        chain.convergence_limit = 1e-4
+        return chain
+
+    def _compile_chain(self):
+        """
+        Precomputes the fixed origin transform and rotation axis of every active
+        joint. Fixed links are folded into the next joint origin, trailing ones
+        into flange_offset.
+        """
+        chain = self.chain
+        self.active_links_mask = list(chain.active_links_mask)
+        self.n_links = len(chain.links)
+
+        origins, axes = [], []
+        pending = np.eye(4)
+        for link, act in zip(chain.links, self.active_links_mask):
+            if act:
+                origins.append(pending @ np.asarray(link.get_link_frame_matrix(0.0), dtype=float))
+                axes.append(np.asarray(link.rotation, dtype=float) / np.linalg.norm(link.rotation))
+                pending = np.eye(4)
+            else:
+                pending = pending @ np.asarray(link.get_link_frame_matrix(None), dtype=float)
+
+        self.joint_origins = np.array(origins)
+        self.joint_axes = np.array(axes)
+        self.flange_offset = pending
+
+    def _prepare_compiled_chain(self):
+        self._active_indices = np.flatnonzero(self.active_links_mask)
+        self._axes_cross = np.array([[[0.0, -z, y], [z, 0.0, -x], [-y, x, 0.0]] for x, y, z in self.joint_axes])
+        self._axes_cross_sq = self._axes_cross @ self._axes_cross
+
+        # Single-pose FK terms: origin_rot @ (I + sin*K + (1-cos)*K^2) = A + sin*B - cos*C
+        origin_rot = self.joint_origins[:, :3, :3]
+        self._origin_pos = np.ascontiguousarray(self.joint_origins[:, :3, 3])
+        self._joint_A = origin_rot @ (np.eye(3) + self._axes_cross_sq)
+        self._joint_B = origin_rot @ self._axes_cross
+        self._joint_C = origin_rot @ self._axes_cross_sq
+        self._origin_axes = np.einsum('nij,nj->ni', origin_rot, self.joint_axes)
+        self._eye3 = np.eye(3)
+        self._fk_local = threading.local()
+        self._update_flange_tool()
+
+    def _compiled_cache_path(self):
+        with open(self.urdf_path, "rb") as f:
+            self.urdf_digest = hashlib.sha1(f.read()).hexdigest()[:16]
+        name = os.path.splitext(os.path.basename(self.urdf_path))[0]
+        return os.path.join(self.cache_dir, f"{name}_{self.urdf_digest}.npz")
+
+    def _load_compiled_cache(self):
+        try:
+            with np.load(self._compiled_cache_path(), allow_pickle=False) as data:
+                if int(data["version"]) != KINEMATICS_CACHE_VERSION:
+                    return False
+                self.joint_origins = data["joint_origins"]
+                self.joint_axes = data["joint_axes"]
+                self.flange_offset = data["flange_offset"]
+                self.active_links_mask = [bool(a) for a in data["active_links_mask"]]
+                self.n_links = len(self.active_links_mask)
+                self.visual_origins = {
+                    str(name): (xyz.tolist(), rpy.tolist())
+                    for name, xyz, rpy in zip(data["visual_names"], data["visual_xyz"], data["visual_rpy"])
+                }
+            return True
+        except Exception:
+            return False
+
+    def _save_compiled_cache(self):
+        try:
+            path = self._compiled_cache_path()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            names = list(self.visual_origins.keys())
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    version=KINEMATICS_CACHE_VERSION,
+                    joint_origins=self.joint_origins,
+                    joint_axes=self.joint_axes,
+                    flange_offset=self.flange_offset,
+                    active_links_mask=np.array(self.active_links_mask, dtype=bool),
+                    visual_names=np.array(names, dtype=str),
+                    visual_xyz=np.array([self.visual_origins[n][0] for n in names], dtype=float).reshape(-1, 3),
+                    visual_rpy=np.array([self.visual_origins[n][1] for n in names], dtype=float).reshape(-1, 3),
+                )
+            os.replace(tmp_path, path)
+        except Exception:
+            pass
+
+    def _update_flange_tool(self):
+        """Composes flange_offset with the active tool so FK applies one transform."""
+        flange_tool = self.flange_offset @ self.tool_matrix
+        self._flange_tool_rot = np.ascontiguousarray(flange_tool[:3, :3])
+        self._flange_tool_pos = np.ascontiguousarray(flange_tool[:3, 3])
+
+    def _fk_buffers(self):
+        buf = getattr(self._fk_local, "buffers", None)
+        if buf is None:
+            n = len(self.joint_origins)
+            buf = type("FKBuffers", (object,), {})()
+            buf.q, buf.sin, buf.cos = np.zeros(n), np.zeros((n, 1, 1)), np.zeros((n, 1, 1))
+            buf.sin_flat, buf.cos_flat = buf.sin.reshape(n), buf.cos.reshape(n)
+            buf.joints, buf.joints_tmp = np.zeros((n, 3, 3)), np.zeros((n, 3, 3))
+            buf.rot, buf.tmp = np.eye(3), np.zeros((3, 3))
+            buf.pos, buf.vec = np.zeros(3), np.zeros(3)
+            buf.tcp = np.eye(4)
+            self._fk_local.buffers = buf
+        return buf
+
     def _full_to_active(self, full_vector):
         if self.active_links_mask: return np.compress(self.active_links_mask, full_vector)
         return np.zeros(6)
@@ -166,6 +1030,8 @@ class KinematicsEngine:
         return origins
 
     def _setup_mock_chain(self):
+        self.joint_origins = None
+        self.analytic_model = None
         self.chain = type('Mock', (object,), {
             'links': [], 
             'active_links_mask': [], 
@@ -179,11 +1045,45 @@ class KinematicsEngine:
 # 2. CARTESIAN VIEW
 # ==============================================================================
 class CartesianView(flet.Container):
+    WORKSPACE_LIMITS = {
+        'x': (-0.500, 0.600),
+        'y': (-0.550, 0.550),
+        'z': (0.000, 0.600)
+    }
+
+    # Resolved-rate jog
+    RATE_JOG_HZ = 25.0
+    RATE_JOG_DAMPING = 0.02
+
+    # Step jog: one Cartesian step per tick
+    STEP_JOG_TICK = 0.10
+
+    # Singularity slowdown on the inverse condition number of the Jacobian:
+    # full speed above SLOW, linearly down to MIN_SCALE at STOP and below
+    SINGULARITY_SLOW_ICN = 0.03
+    SINGULARITY_STOP_ICN = 0.002
+    SINGULARITY_MIN_SCALE = 0.15
+
+    # Animated moves (SAFETY / STANDBY / MoveL): velocity profile
+    MOVE_PROFILE = PROFILE_TRAPEZOID
+
+    # Program taught and played with the TEACH / RUN / CLEAR buttons
+    PROGRAM_NAME = "main"
+
     def __init__(self, uart_communicator, urdf_path, active_links_mask=None, on_error=None):
         super().__init__()
         self.uart = uart_communicator
-        self.ik = KinematicsEngine(urdf_path, active_links_mask)
+        self.ik = get_kinematics_engine(urdf_path)
+        self.streamer = get_motion_streamer(uart_communicator)
+        self.trajectory_cache = get_trajectory_cache(self.ik.cache_dir)
+        self.program_runner = None
+        self.program = self._load_program()
         self.on_error = on_error
+
+        # Every streamed setpoint is checked against the link meshes and obstacles
+        if self.ik.joint_origins is not None:
+            self.streamer.validator = setpoint_validator(self.ik)
+            self.streamer.on_rejected = self._report_collision
         
         self.is_jogging = False
         self.is_jogging = False
@@ -197,6 +1097,7 @@ class CartesianView(flet.Container):
         
         self.gripper_states = {"pneumatic": False, "electric": False}
         self.jog_speed_percent = 50.0
+        self.jog_mode = "RATE" if self.ik.joint_origins is not None else "STEP"
         
         self.last_jog_time = 0.0
 
@@ -275,14 +1176,31 @@ class CartesianView(flet.Container):
         )
 
         TOOL_BTN_H = 40
+        program_style = flet.ButtonStyle(bgcolor="#444444", color="white", shape=flet.RoundedRectangleBorder(radius=8), padding=2)
+        self.btn_program_run = flet.ElevatedButton(f"RUN ({len(self.program.points)})", icon=flet.icons.PLAY_ARROW, style=program_style, on_click=self.on_program_run_click, expand=True)
+        program_row = flet.Row([
+            flet.ElevatedButton("TEACH", icon=flet.icons.ADD_LOCATION, style=program_style, on_click=self.on_teach_click, expand=True),
+            self.btn_program_run,
+            flet.IconButton(flet.icons.DELETE, icon_color="white", bgcolor="#444", tooltip="Clear program", on_click=self.on_program_clear_click),
+        ], spacing=5, height=TOOL_BTN_H)
+        self.btn_jog_mode = flet.ElevatedButton(
+            f"MODE: {self.jog_mode}",
+            icon=flet.icons.SPEED,
+            style=flet.ButtonStyle(bgcolor="#444444", color="white", shape=flet.RoundedRectangleBorder(radius=8)),
+            on_click=self.on_jog_mode_click,
+            height=TOOL_BTN_H,
+            width=10000
+        )
         tools_column = flet.Column([
             speed_panel, 
+            self.btn_jog_mode,
             flet.Container(height=5),
             flet.ElevatedButton("HOME", icon=flet.icons.HOME, style=flet.ButtonStyle(bgcolor=flet.colors.BLUE_GREY_700, color="white", shape=flet.RoundedRectangleBorder(radius=8)), on_click=self.on_home_click, expand=True, width=10000),
             flet.ElevatedButton("SAFETY", icon=flet.icons.SHIELD, style=flet.ButtonStyle(bgcolor=flet.colors.TEAL_700, color="white", shape=flet.RoundedRectangleBorder(radius=8)), on_click=self.on_safety_click, expand=True, width=10000),
             flet.ElevatedButton("GRIPPER CHANGE", icon=flet.icons.HANDYMAN, style=flet.ButtonStyle(bgcolor=flet.colors.PURPLE_700, color="white", shape=flet.RoundedRectangleBorder(radius=8)), on_click=self.on_change_tool_click, expand=True, width=10000),
             flet.ElevatedButton("STOP", icon=flet.icons.STOP_CIRCLE, style=flet.ButtonStyle(bgcolor=flet.colors.RED_700, color="white", shape=flet.RoundedRectangleBorder(radius=8)), on_click=self.on_stop_click, expand=True, width=10000),
             flet.ElevatedButton("STANDBY", icon=flet.icons.ACCESSIBILITY, style=flet.ButtonStyle(bgcolor=flet.colors.ORANGE_900, color="white", shape=flet.RoundedRectangleBorder(radius=8)), on_click=self.on_standby_click, expand=True, width=10000),
+            program_row,
 
         ], spacing=5, expand=True)
 
@@ -336,6 +1254,16 @@ class CartesianView(flet.Container):
         self.lbl_speed.update()
     
     
+    def on_jog_mode_click(self, e):
+        """Toggles between resolved-rate (Jacobian) and IK step jogging."""
+        if self.is_jogging: return
+        if self.jog_mode == "STEP" and self.ik.joint_origins is not None:
+            self.jog_mode = "RATE"
+        else:
+            self.jog_mode = "STEP"
+        self.btn_jog_mode.text = f"MODE: {self.jog_mode}"
+        self.btn_jog_mode.update()
+
     def did_mount(self):
         try:
             self._update_labels_logic()
@@ -415,7 +1343,12 @@ class CartesianView(flet.Container):
         e.control.content.border = flet.border.all(1, "cyan")
         e.control.content.update()
         
-        threading.Thread(target=self._jog_thread, args=(axis, direction), daemon=True).start()
+        jog_target = self._rate_jog_thread if self.jog_mode == "RATE" else self._jog_thread
+        threading.Thread(target=self._streamed_jog, args=(jog_target, axis, direction), daemon=True).start()
+
+    def _streamed_jog(self, jog_target, axis, direction):
+        with self.streamer.session():
+            jog_target(axis, direction)
 
     def on_jog_stop(self, e):
         if e.control != self.active_jog_control: return
@@ -516,26 +1449,18 @@ class CartesianView(flet.Container):
         self.is_jogging = True
         
         def run():
-            current_local = np.array(list(self.commanded_joints))
-            target = np.array(target_joints_rad)
-            
+            # Synchronized time-optimal profile from the motor VMAX/AMAX, cached per move
+            start, speed = list(self.commanded_joints), self.jog_speed_percent
+            key = self.trajectory_cache.key(start, target_joints_rad, self.ik.current_tool, speed,
+                                            self.streamer.rate_hz, "rad", self.MOVE_PROFILE)
+            traj = self.trajectory_cache.get_or_plan(key, self.streamer.rate_hz, lambda: plan_joint_move(
+                start, target_joints_rad, speed / 100.0, self.MOVE_PROFILE))
+
+            def emit(q):
+                self.commanded_joints = q.tolist()
+
             try:
-                while self.is_jogging and self.alive:
-                    diff = target - current_local
-                    dist = np.linalg.norm(diff)
-                    
-                    if dist < 0.005:
-                        self.commanded_joints = target.tolist()
-                        self.send_current_pose()
-                        break
-                    
-                    factor = self.jog_speed_percent / 100.0
-                    step_size = min(dist, 0.075 * factor)
-                    
-                    current_local = current_local + (diff / dist) * step_size
-                    self.commanded_joints = current_local.tolist()
-                    self.send_current_pose()
-                    time.sleep(0.1)
+                self.streamer.play(traj, emit, lambda: self.is_jogging and self.alive, degrees=False)
             finally:
                 self.is_jogging = False
                 self.last_jog_time = time.time()
@@ -546,8 +1471,14 @@ class CartesianView(flet.Container):
         if self.on_error:
             self.on_error("W1")
         self.is_jogging = False
+        if self.program_runner: self.program_runner.stop()
         if self.uart: self.uart.send_message("EGRIP_STOP")
 
+        # Drop the queued setpoints and hold where the arm was last sent
+        last_sent = self.streamer.clear()
+        if last_sent is not None:
+            self.commanded_joints = np.radians(last_sent).tolist()
+
     def on_change_tool_click(self, e):
         if not self.page: return
         
@@ -680,11 +1611,11 @@ class CartesianView(flet.Container):
             time.sleep(0.10) 
 
     def _update_labels_logic(self):
-        if not self.ik.chain: 
+        if not self.ik.is_ready: 
             return
         
         try:
-            tcp_matrix = self.ik.forward_kinematics(self.commanded_joints)
+            tcp_matrix = self.ik.forward_kinematics(self.commanded_joints, copy=False)
             pos = tcp_matrix[:3, 3]
             rot = tcp_matrix[:3, :3]
             
@@ -710,24 +1641,24 @@ class CartesianView(flet.Container):
     def _jog_thread(self, axis, direction):
         BASE_STEP_MM = 5.0
         BASE_STEP_RAD = 0.02
-        
-        WORKSPACE_LIMITS = {
-            'x': (-0.500, 0.600),
-            'y': (-0.550, 0.550),
-            'z': (0.000, 0.600)
-        }
 
         sign = 1 if direction == "plus" else -1
+        # Shrinks after a rejected (too large) joint step, recovers on accepted ones
+        step_backoff = 1.0
         
         while self.is_jogging:
-            loop_start = time.time()
+            q_prev = np.degrees(self.commanded_joints)
             
             factor = self.jog_speed_percent / 100.0
             step_mm = max(0.2, BASE_STEP_MM * factor)
             step_rad = max(0.002, BASE_STEP_RAD * factor)
             
-            if self.ik.chain:
+            if self.ik.is_ready:
                 current_raw = list(self.commanded_joints)
+
+                slowdown = self._singularity_scale(current_raw) * step_backoff
+                step_mm *= slowdown
+                step_rad *= slowdown
                 
                 current_tcp_matrix = self.ik.forward_kinematics(current_raw)
                 current_pos = current_tcp_matrix[:3, 3]
@@ -744,21 +1675,7 @@ class CartesianView(flet.Container):
                 elif axis == 'rz': drz = step_rad * sign
                 
                 proposed_pos = current_pos + np.array([dx, dy, dz]) / 1000.0
-                target_pos = np.copy(proposed_pos)
-
-                for i, ax_key in enumerate(['x', 'y', 'z']):
-                    mn, mx = WORKSPACE_LIMITS[ax_key]
-                    curr = current_pos[i]
-                    prop = proposed_pos[i]
-                    
-                    if curr < mn:
-                        if prop > curr: target_pos[i] = min(prop, mn) 
-                        else: target_pos[i] = curr
-                    elif curr > mx:
-                        if prop < curr: target_pos[i] = max(prop, mx) 
-                        else: target_pos[i] = curr
-                    else:
-                        target_pos[i] = np.clip(prop, mn, mx)
+                target_pos = self._clamp_to_workspace(current_pos, proposed_pos)
                 
                 if axis == 'rx':  
                     delta_rot = R.from_euler('x', drx).as_matrix()
@@ -775,44 +1692,291 @@ class CartesianView(flet.Container):
                 else:
                     target_rot = current_rot
                 
-                try:
-                    nj_model = self.ik.inverse_kinematics(target_pos, target_rot, current_raw)
+                if not self.ik.is_reachable(target_pos, target_rot):
+                    self._report_out_of_reach()
+                else:
+                    try:
+                        nj_model = self.ik.inverse_kinematics(target_pos, target_rot, current_raw)
                     
-                    # --- STRICT VALIDATION ---
-                    test_tcp = self.ik.forward_kinematics(nj_model)
-                    test_pos = test_tcp[:3, 3]
+                        # --- STRICT VALIDATION ---
+                        test_tcp = self.ik.forward_kinematics(nj_model)
+                        test_pos = test_tcp[:3, 3]
                     
-                    deviation = np.linalg.norm(test_pos - target_pos)
+                        deviation = np.linalg.norm(test_pos - target_pos)
                     
-                    if deviation > 0.001: 
-                        if self.on_error:
-                            if not hasattr(self, 'last_reach_warn') or (time.time() - self.last_reach_warn > 2.0):
-                                self.on_error("OOR") 
-                                self.last_reach_warn = time.time()
-                        continue
+                        if deviation > 0.001: 
+                            self._report_out_of_reach(self.ik.last_ik_binding_joint())
+                            continue
                         
-                    nj_model = [(q + np.pi) % (2*np.pi) - np.pi for q in nj_model]
+                        nj_model = [(q + np.pi) % (2*np.pi) - np.pi for q in nj_model]
                     
-                    diffs = [abs(nj_model[i] - current_raw[i]) for i in range(6)]
-                    max_diff = max(diffs)
+                        diffs = [abs(nj_model[i] - current_raw[i]) for i in range(6)]
+                        max_diff = max(diffs)
                     
-                    if max_diff < 0.15:  
-                        self.commanded_joints = nj_model
+                        if max_diff < 0.15:  
+                            self.commanded_joints = nj_model
+                            step_backoff = min(1.0, step_backoff * 1.25)
+                        else:
+                            # Too close to a singularity for this step: retry smaller
+                            step_backoff = max(0.125, step_backoff * 0.5)
+                            self._report_speed_limited()
                         
-                except:
-                    pass  
+                    except:
+                        pass  
+
+            # The streamer paces the loop: this blocks while the lookahead is full.
+            # A colliding setpoint is not sent; hold at the last one that was
+            if not self.streamer.push_segment(q_prev, np.degrees(self.commanded_joints), self.STEP_JOG_TICK):
+                held = self.streamer.last_queued
+                self.commanded_joints = np.radians(q_prev if held is None else held).tolist()
+
+    def move_linear(self, target_position, target_orientation):
+        """
+        MoveL to a TCP pose: the joint path is solved completely before the
+        first setpoint is queued, then played by the streamer.
+        """
+        if self.is_jogging: return
+        self.is_jogging = True
+
+        def run():
+            start, speed = list(self.commanded_joints), self.jog_speed_percent
+            goal = np.concatenate([np.ravel(target_position), np.ravel(target_orientation)])
+            # The MoveL path also depends on the tool geometry and the arm model
+            tool_digest = hashlib.sha1(np.round(self.ik.tool_matrix, 9).tobytes()).hexdigest()[:12]
+            key = self.trajectory_cache.key(start, goal, self.ik.current_tool, speed, self.streamer.rate_hz,
+                                            "m", f"L|{self.MOVE_PROFILE}|{tool_digest}|{self.ik.urdf_digest}")
+            try:
+                traj = self.trajectory_cache.get_or_plan(key, self.streamer.rate_hz, lambda: self.ik.plan_linear_move(
+                    start, target_position, target_orientation,
+                    speed / 100.0, self.streamer.rate_hz, self.MOVE_PROFILE
+                ))
+            except ValueError:
+                self.is_jogging = False
+                self._report_out_of_reach()
+                return
+
+            def emit(q):
+                self.commanded_joints = q.tolist()
+
+            try:
+                self.streamer.play(traj, emit, lambda: self.is_jogging and self.alive, degrees=False)
+            finally:
+                self.is_jogging = False
+                self.last_jog_time = time.time()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    # ================= PROGRAMS =================
+
+    def _load_program(self):
+        try:
+            return Program.load(self.PROGRAM_NAME)
+        except ProgramError:
+            return Program(self.PROGRAM_NAME)
+
+    def _show_program_status(self, msg, color):
+        self.btn_program_run.text = f"RUN ({len(self.program.points)})"
+        if self.page:
+            self.page.snack_bar = flet.SnackBar(flet.Text(msg), bgcolor=color)
+            self.page.snack_bar.open = True
+            self.page.update()
+
+    def on_teach_click(self, e):
+        if self.is_jogging: return
+        self.teach_point(self.program)
+        try:
+            self.program.save()
+        except OSError:
+            pass
+        self._show_program_status(f"Point {len(self.program.points)} taught ({self.ik.current_tool})", flet.colors.BLUE)
+
+    def on_program_clear_click(self, e):
+        if self.is_jogging: return
+        self.program.points.clear()
+        try:
+            self.program.save()
+        except OSError:
+            pass
+        self._show_program_status("Program cleared", flet.colors.BLUE_GREY)
+
+    def on_program_run_click(self, e):
+        if len(self.program.points) < 2:
+            self._show_program_status("Teach at least two points first", flet.colors.ORANGE)
+            return
+
+        def on_progress(progress):
+            self.btn_program_run.text = f"RUN {int(progress * 100)}%"
+            if self.page: self.page.update()
+
+        if self.run_program(self.program, on_progress):
+            self.btn_program_run.text = "RUN 0%"
+            if self.page: self.page.update()
+
+    def teach_point(self, program, move=MOVE_JOINT, index=None, blend=0.0):
+        """Records the commanded pose (with the active tool and jog speed) into program."""
+        return program.teach(self.ik, self.commanded_joints, move, self.jog_speed_percent, index, blend)
+
+    def run_program(self, program, on_progress=None):
+        """Compiles (cached per segment) and plays program from the commanded pose."""
+        if self.is_jogging: return False
+        if self.program_runner is None:
+            def set_tool(tool_name):
+                if getattr(self, 'on_global_set_tool', None):
+                    self.on_global_set_tool(tool_name)
+                else:
+                    self.ik.set_tool(tool_name)
+
+            def on_setpoint(q):
+                self.commanded_joints = q.tolist()
+
+            self.program_runner = ProgramRunner(self.ik, self.streamer, on_error=self.on_error,
+                                                on_setpoint=on_setpoint, on_tool_change=set_tool)
+        self.program_runner.on_progress = on_progress
+        self.is_jogging = True
+
+        def run():
+            try:
+                self.program_runner.run(program, list(self.commanded_joints))
+            finally:
+                self.is_jogging = False
+                self.last_jog_time = time.time()
+                if program is self.program:
+                    self.btn_program_run.text = f"RUN ({len(program.points)})"
+                    if self.page: self.page.update()
 
-            self.send_current_pose()
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+    def _clamp_to_workspace(self, current_pos, proposed_pos):
+        """
+        Clamps a proposed TCP position to WORKSPACE_LIMITS. Outside the box
+        only motion back towards it is allowed.
+        """
+        target_pos = np.copy(proposed_pos)
+
+        for i, ax_key in enumerate(['x', 'y', 'z']):
+            mn, mx = self.WORKSPACE_LIMITS[ax_key]
+            curr = current_pos[i]
+            prop = proposed_pos[i]
             
-            elapsed = time.time() - loop_start
-            sleep_time = max(0.01, 0.10 - elapsed)
-            time.sleep(sleep_time)
+            if curr < mn:
+                if prop > curr: target_pos[i] = min(prop, mn) 
+                else: target_pos[i] = curr
+            elif curr > mx:
+                if prop < curr: target_pos[i] = max(prop, mx) 
+                else: target_pos[i] = curr
+            else:
+                target_pos[i] = np.clip(prop, mn, mx)
+        return target_pos
+
+    def _singularity_scale(self, joints):
+        """Cartesian speed factor (SINGULARITY_MIN_SCALE - 1.0) from the Jacobian conditioning; raises SPD when < 1."""
+        try:
+            _, icn = self.ik.manipulability(joints)
+        except Exception:
+            return 1.0
+        if icn >= self.SINGULARITY_SLOW_ICN:
+            return 1.0
+        ratio = (icn - self.SINGULARITY_STOP_ICN) / (self.SINGULARITY_SLOW_ICN - self.SINGULARITY_STOP_ICN)
+        self._report_speed_limited()
+        return max(self.SINGULARITY_MIN_SCALE, ratio)
+
+    def _report_speed_limited(self):
+        if self.on_error:
+            if not hasattr(self, 'last_speed_warn') or (time.time() - self.last_speed_warn > 2.0):
+                self.on_error("SPD")
+                self.last_speed_warn = time.time()
+
+    def _report_collision(self, setpoint_deg=None):
+        if self.on_error:
+            if not hasattr(self, 'last_collision_warn') or (time.time() - self.last_collision_warn > 2.0):
+                # CCF: rejected because the collision checker failed to load
+                self.on_error("CCF" if collision_checker_error(self.ik) is not None else "COL")
+                self.last_collision_warn = time.time()
+
+    def _report_out_of_reach(self, joint=None):
+        """Reports OOR1..OOR6 when a joint limit is binding, plain OOR for the reach boundary."""
+        if self.on_error:
+            if not hasattr(self, 'last_reach_warn') or (time.time() - self.last_reach_warn > 2.0):
+                self.on_error("OOR" if joint is None else f"OOR{joint + 1}")
+                self.last_reach_warn = time.time()
+
+    def _rate_jog_thread(self, axis, direction):
+        """
+        Resolved-rate jog. The commanded Cartesian velocity is integrated into a
+        reference pose every tick and the pose error is mapped to a joint step
+        with damped least squares on the analytic Jacobian, so the arm slows
+        down near singularities instead of stalling.
+        """
+        BASE_SPEED_MM_S = 50.0
+        BASE_SPEED_RAD_S = 0.2
+        MAX_JOINT_SPEED = 1.5  # rad/s
+
+        tick = 1.0 / self.RATE_JOG_HZ
+        sign = 1 if direction == "plus" else -1
+        axis_index = {'x': 0, 'y': 1, 'z': 2, 'rx': 0, 'ry': 1, 'rz': 2}[axis]
+        limits = np.array(self.ik.joint_limits_rad)
+
+        start_tcp = self.ik.forward_kinematics(self.commanded_joints)
+        ref_pos, ref_rot = start_tcp[:3, 3].copy(), start_tcp[:3, :3].copy()
+
+        while self.is_jogging:
+            q = np.array(self.commanded_joints, dtype=float)
+            factor = self.jog_speed_percent / 100.0 * self._singularity_scale(q)
+
+            # Advance the reference pose (rotations about the tool axes, like STEP mode)
+            prev_pos, prev_rot = ref_pos, ref_rot
+            if axis.startswith('r'):
+                delta = np.zeros(3)
+                delta[axis_index] = sign * max(0.02, BASE_SPEED_RAD_S * factor) * tick
+                ref_rot = ref_rot @ R.from_rotvec(delta).as_matrix()
+            else:
+                proposed = ref_pos.copy()
+                proposed[axis_index] += sign * max(2.0, BASE_SPEED_MM_S * factor) / 1000.0 * tick
+                ref_pos = self._clamp_to_workspace(ref_pos, proposed)
+
+            if not self.ik.is_reachable(ref_pos, ref_rot):
+                # Known to be out of reach: don't advance, don't spend a solve
+                self._report_out_of_reach()
+                ref_pos, ref_rot = prev_pos, prev_rot
+
+            try:
+                tcp = self.ik.forward_kinematics(q)
+                twist = np.concatenate([
+                    ref_pos - tcp[:3, 3],
+                    R.from_matrix(ref_rot @ tcp[:3, :3].T).as_rotvec()
+                ])
+                dq = self.ik.damped_least_squares(self.ik.jacobian(q), twist, self.RATE_JOG_DAMPING)
+
+                peak = np.max(np.abs(dq))
+                if peak > MAX_JOINT_SPEED * tick:
+                    dq *= MAX_JOINT_SPEED * tick / peak
+                binding = self.ik._limit_violation(q + dq, limits)
+                q_new = np.clip(q + dq, limits[:, 0], limits[:, 1])
+
+                reached = self.ik.forward_kinematics(q_new)
+                rot_dev = R.from_matrix(ref_rot @ reached[:3, :3].T).magnitude()
+                if np.linalg.norm(reached[:3, 3] - ref_pos) > 0.001 or rot_dev > 0.01:
+                    # Joint limit or reach boundary: hold still and re-anchor the
+                    # reference so it does not run away from the arm
+                    self._report_out_of_reach(binding)
+                    ref_pos, ref_rot = tcp[:3, 3].copy(), tcp[:3, :3].copy()
+                else:
+                    self.commanded_joints = q_new.tolist()
+            except Exception:
+                pass
+
+            # One tick of motion; the streamer's lookahead paces this loop
+            if not self.streamer.push_segment(np.degrees(q), np.degrees(self.commanded_joints), tick):
+                # Collision: hold at the last accepted setpoint and re-anchor the reference there
+                held = self.streamer.last_queued
+                self.commanded_joints = q.tolist() if held is None else np.radians(held).tolist()
+                tcp = self.ik.forward_kinematics(self.commanded_joints)
+                ref_pos, ref_rot = tcp[:3, 3].copy(), tcp[:3, :3].copy()
 
     def send_current_pose(self):
-        if self.uart and self.uart.is_open():
-            vals_deg = [np.degrees(r) for r in self.commanded_joints]
-            data_str = ",".join([f"{v:.2f}" for v in vals_deg])
-            self.uart.send_message(f"J_{data_str}")
+        """Queues the commanded pose as one J_ frame on the shared streamer."""
+        self.streamer.push(np.degrees(self.commanded_joints))
 
     def on_gripper_toggle_click(self, e):
         g_type = e.control.data 
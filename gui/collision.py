@@ -0,0 +1,703 @@
+import hashlib
+import heapq
+import json
+import os
+import threading
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+
+# Link meshes in their URDF link frames [m]. The PLY exports are used where they
+# exist, L6 only ships as STL
+LINK_NAMES = ["base_link", "L1", "L2", "L3", "L4", "L5", "L6"]
+LINK_MESH_FILES = {
+    "base_link": "PLY_FILES/base_link_p.ply",
+    "L1": "PLY_FILES/L1_p.ply",
+    "L2": "PLY_FILES/L2_p.ply",
+    "L3": "PLY_FILES/L3_p.ply",
+    "L4": "PLY_FILES/L4_p.ply",
+    "L5": "PLY_FILES/L5_p.ply",
+    "L6": "PAROL6_URDF/PAROL6/meshes/L6.STL",
+}
+
+# Static obstacles: {name: {"size": [m], "position": [m], "orientation": xyz euler [deg]}}
+# boxes in the TCP/world frame
+OBSTACLE_FILE = "obstacles.json"
+
+BVH_LEAF_SIZE = 8
+# Clearance every check keeps between two bodies [m]
+DEFAULT_MARGIN = 0.002
+# Leaf pairs and triangle pairs are tested in batches: the first one is small
+# so a deep contact stops early, later ones double up to the cap (which bounds
+# the temporary arrays)
+_LEAF_FIRST_BATCH = 64
+_LEAF_BATCH = 1_024
+_TRI_FIRST_BATCH = 128
+_TRI_BATCH = 2_000
+# How long a setpoint waits for the checker being built before it is rejected [s]
+CHECKER_WAIT_S = 10.0
+
+# Sphere proxies: fine spheres of at most PROXY_MAX_RADIUS [m] (or as small as
+# PROXY_MAX_SPHERES allows), grouped under PROXY_COARSE_SPHERES coarse ones
+PROXY_MAX_RADIUS = 0.025
+PROXY_MAX_SPHERES = 64
+PROXY_COARSE_SPHERES = 8
+PROXY_CACHE_VERSION = 1
+
+_PLY_TYPES = {
+    "char": "i1", "uchar": "u1", "short": "<i2", "ushort": "<u2", "int": "<i4", "uint": "<u4",
+    "float": "<f4", "double": "<f8", "int8": "i1", "uint8": "u1", "int16": "<i2", "uint16": "<u2",
+    "int32": "<i4", "uint32": "<u4", "float32": "<f4", "float64": "<f8",
+}
+
+
+# ================= MESH FILES =================
+
+def load_mesh(path):
+    """(vertices (n,3) float, faces (m,3) int) from a binary PLY or STL file."""
+    if path.lower().endswith(".ply"):
+        return load_ply(path)
+    return load_stl(path)
+
+
+def load_ply(path):
+    """Binary little-endian PLY with a vertex element (x, y, z, ...) and triangle faces."""
+    with open(path, "rb") as f:
+        data = f.read()
+    end = data.index(b"end_header")
+    end = data.index(b"\n", end) + 1
+    lines = data[:end].decode("ascii", "replace").splitlines()
+    if not any(l.strip() == "format binary_little_endian 1.0" for l in lines):
+        raise ValueError(f"{path}: only binary_little_endian PLY is supported")
+
+    elements, current = [], None
+    for line in lines:
+        parts = line.split()
+        if parts[:1] == ["element"]:
+            current = [parts[1], int(parts[2]), []]
+            elements.append(current)
+        elif parts[:1] == ["property"] and current is not None:
+            current[2].append(parts[1:])
+
+    offset = end
+    vertices = faces = None
+    for name, count, props in elements:
+        if name == "vertex":
+            dtype = np.dtype([(p[-1], _PLY_TYPES[p[0]]) for p in props])
+            v = np.frombuffer(data, dtype, count, offset)
+            vertices = np.stack([v["x"], v["y"], v["z"]], axis=1).astype(float)
+            offset += dtype.itemsize * count
+        elif name == "face":
+            _, count_type, index_type, _ = props[0]
+            dtype = np.dtype([("n", _PLY_TYPES[count_type]), ("i", _PLY_TYPES[index_type], 3)])
+            f = np.frombuffer(data, dtype, count, offset)
+            if np.any(f["n"] != 3):
+                raise ValueError(f"{path}: only triangle faces are supported")
+            faces = f["i"].astype(np.int64)
+            offset += dtype.itemsize * count
+        else:
+            raise ValueError(f"{path}: unexpected element {name}")
+    if vertices is None or faces is None:
+        raise ValueError(f"{path}: no vertex/face data")
+    return vertices, faces
+
+
+def load_stl(path):
+    """Binary STL; every triangle gets its own three vertices."""
+    with open(path, "rb") as f:
+        data = f.read()
+    count = int(np.frombuffer(data, "<u4", 1, 80)[0])
+    dtype = np.dtype([("normal", "<f4", 3), ("v", "<f4", (3, 3)), ("attr", "<u2")])
+    tris = np.frombuffer(data, dtype, count, 84)["v"]
+    return tris.reshape(-1, 3).astype(float), np.arange(3 * count, dtype=np.int64).reshape(-1, 3)
+
+
+def box_mesh(size):
+    """Triangle mesh of an axis-aligned box of the given size, centred on the origin."""
+    hx, hy, hz = np.asarray(size, dtype=float) / 2.0
+    vertices = np.array([[sx * hx, sy * hy, sz * hz] for sx in (-1, 1) for sy in (-1, 1) for sz in (-1, 1)])
+    faces = np.array([
+        [0, 1, 3], [0, 3, 2], [4, 6, 7], [4, 7, 5], [0, 4, 5], [0, 5, 1],
+        [2, 3, 7], [2, 7, 6], [0, 2, 6], [0, 6, 4], [1, 5, 7], [1, 7, 3],
+    ])
+    return vertices, faces
+
+
+# ================= BVH =================
+
+class MeshBVH:
+    """
+    Axis-aligned bounding-box tree over the triangles of one mesh, in the
+    mesh's own frame. Nodes are flat arrays (centre, half extents, children);
+    every leaf lists up to leaf_size triangles in leaf_slots (padded by repeating
+    its first triangle), so leaf pairs expand to triangle pairs without loops.
+    """
+
+    def __init__(self, vertices, faces, leaf_size=BVH_LEAF_SIZE):
+        tris = np.asarray(vertices, dtype=float)[np.asarray(faces)]
+        self.n_triangles = len(tris)
+        self.leaf_size = leaf_size
+        tmin, tmax = tris.min(axis=1), tris.max(axis=1)
+        centroids = (tmin + tmax) / 2.0
+
+        order = np.arange(len(tris))
+        lo, hi, left, right, slots = [], [], [], [], []
+        stack = [(0, len(tris), -1, False)]
+        while stack:
+            start, end, parent, is_right = stack.pop()
+            node = len(lo)
+            if parent >= 0:
+                (right if is_right else left)[parent] = node
+            idx = order[start:end]
+            lo.append(tmin[idx].min(axis=0))
+            hi.append(tmax[idx].max(axis=0))
+            left.append(-1)
+            right.append(-1)
+
+            if end - start <= leaf_size:
+                slot = np.full(leaf_size, idx[0])
+                slot[:len(idx)] = idx
+                slots.append(slot)
+                continue
+            slots.append(np.full(leaf_size, -1))
+
+            # Median split along the longest axis of the centroid bounds
+            c = centroids[idx]
+            axis = int(np.argmax(c.max(axis=0) - c.min(axis=0)))
+            mid = (end - start) // 2
+            part = np.argpartition(c[:, axis], mid)
+            order[start:end] = idx[part]
+            stack.append((start + mid, end, node, True))
+            stack.append((start, start + mid, node, False))
+
+        lo, hi = np.array(lo), np.array(hi)
+        self.center = (lo + hi) / 2.0
+        self.half = (hi - lo) / 2.0
+        self.size = self.half.sum(axis=1)
+        self.left = np.array(left)
+        self.right = np.array(right)
+        self.leaf_slots = np.array(slots)
+        self.triangles = tris
+        self.triangle_lo = tmin
+        self.triangle_hi = tmax
+
+    @classmethod
+    def from_file(cls, path, leaf_size=BVH_LEAF_SIZE):
+        return cls(*load_mesh(path), leaf_size=leaf_size)
+
+
+def _box_axes(R, absR):
+    """
+    The 15 SAT axes between boxes of frame A and boxes rotated by R into it, as
+    matrices: a pair is apart when |t @ P| > ha @ HA + hb @ HB on any column
+    (A's faces, B's faces, then the 9 edge-edge axes).
+    """
+    P, HA, HB = np.zeros((3, 15)), np.zeros((3, 15)), np.zeros((3, 15))
+    P[:, :3], HA[:, :3], HB[:, :3] = np.eye(3), np.eye(3), absR.T
+    P[:, 3:6], HA[:, 3:6], HB[:, 3:6] = R, absR, np.eye(3)
+    for i in range(3):
+        i1, i2 = (i + 1) % 3, (i + 2) % 3
+        for j in range(3):
+            j1, j2 = (j + 1) % 3, (j + 2) % 3
+            k = 6 + 3 * i + j
+            P[i2, k], P[i1, k] = R[i1, j], -R[i2, j]
+            HA[i1, k], HA[i2, k] = absR[i2, j], absR[i1, j]
+            HB[j1, k], HB[j2, k] = absR[i, j2], absR[i, j1]
+    return P, HA, HB
+
+
+def _boxes_overlap(ca, ha, cb, hb, axes):
+    """
+    SAT between A boxes (axis-aligned in frame A) and B boxes already centred
+    in frame A, on the axes of _box_axes. Vectorized over rows.
+    """
+    P, HA, HB = axes
+    return np.all(np.abs((cb - ca) @ P) <= ha @ HA + hb @ HB, axis=1)
+
+
+def _triangles_overlap(A, B, margin):
+    """
+    SAT between triangle pairs A[k], B[k] ((N,3,3), same frame): face normals,
+    9 edge-edge axes and the 6 in-plane edge normals (coplanar case). Pairs
+    closer than margin along every axis count as overlapping.
+    """
+    eA = np.roll(A, -1, axis=1) - A
+    eB = np.roll(B, -1, axis=1) - B
+    nA = np.cross(eA[:, 0], eA[:, 1])
+    nB = np.cross(eB[:, 0], eB[:, 1])
+    axes = np.concatenate([
+        nA[:, None], nB[:, None],
+        np.cross(eA[:, :, None, :], eB[:, None, :, :]).reshape(-1, 9, 3),
+        np.cross(nA[:, None, :], eA), np.cross(nB[:, None, :], eB),
+    ], axis=1)
+
+    pa = np.einsum("nkd,nvd->nkv", axes, A)
+    pb = np.einsum("nkd,nvd->nkv", axes, B)
+    gap = np.maximum(pb.min(axis=2) - pa.max(axis=2), pa.min(axis=2) - pb.max(axis=2))
+    tol = margin * np.linalg.norm(axes, axis=2) + 1e-15
+    return ~np.any(gap > tol, axis=1)
+
+
+def _batches(n, first, cap):
+    """Slices over range(n), first long, each next one twice as long up to cap."""
+    start, size = 0, first
+    while start < n:
+        yield slice(start, start + size)
+        start, size = start + size, min(2 * size, cap)
+
+
+def _leaves_overlap(a, b, leaves_a, leaves_b, R, p, margin):
+    """
+    Triangle tests for pairs of leaves whose boxes overlap. Triangle bounding
+    boxes reject most pairs before the exact SAT, which runs in batches so a
+    deep interpenetration stops at the first hit.
+    """
+    ub, inverse = np.unique(leaves_b, return_inverse=True)
+    tris_b = b.triangles[b.leaf_slots[ub]] @ R.T + p
+    lo_b, hi_b = tris_b.min(axis=2)[inverse], tris_b.max(axis=2)[inverse]
+    slots_a = a.leaf_slots[leaves_a]
+    lo_a, hi_a = a.triangle_lo[slots_a] - margin, a.triangle_hi[slots_a] + margin
+
+    hit = np.all((lo_a[:, :, None] <= hi_b[:, None, :]) & (lo_b[:, None, :] <= hi_a[:, :, None]), axis=3)
+    pair, ka, kb = np.nonzero(hit)
+    if not len(pair):
+        return False
+    ta = slots_a[pair, ka]
+    tb = inverse[pair], kb
+    for batch in _batches(len(ta), _TRI_FIRST_BATCH, _TRI_BATCH):
+        A = a.triangles[ta[batch]]
+        B = tris_b[tb[0][batch], tb[1][batch]]
+        if np.any(_triangles_overlap(A, B, margin)):
+            return True
+    return False
+
+
+def bvh_collide(a, b, T_ab, margin=DEFAULT_MARGIN):
+    """
+    True when mesh b, placed in a's frame by T_ab (b -> a), comes closer than
+    margin to mesh a. Breadth-first over node pairs, all pairs of one level
+    tested at once; stops at the first overlapping triangle pair.
+    """
+    R, p = T_ab[:3, :3], T_ab[:3, 3]
+    axes = _box_axes(R, np.abs(R) + 1e-12)
+    ia = np.zeros(1, dtype=np.int64)
+    ib = np.zeros(1, dtype=np.int64)
+    while len(ia):
+        keep = _boxes_overlap(a.center[ia], a.half[ia] + margin, b.center[ib] @ R.T + p, b.half[ib], axes)
+        ia, ib = ia[keep], ib[keep]
+        if not len(ia):
+            return False
+
+        leaf_a, leaf_b = a.left[ia] < 0, b.left[ib] < 0
+        both = leaf_a & leaf_b
+        if np.any(both):
+            leaves_a, leaves_b = ia[both], ib[both]
+            for batch in _batches(len(leaves_a), _LEAF_FIRST_BATCH, _LEAF_BATCH):
+                if _leaves_overlap(a, b, leaves_a[batch], leaves_b[batch], R, p, margin):
+                    return True
+
+        # Internal pairs descend on both sides at once (4 child pairs), half the levels
+        split_ab = ~leaf_a & ~leaf_b
+        split_a = ~leaf_a & leaf_b
+        split_b = leaf_a & ~leaf_b
+        ja, jb = ia[split_ab], ib[split_ab]
+        ia, ib = (
+            np.concatenate([a.left[ja], a.left[ja], a.right[ja], a.right[ja],
+                            a.left[ia[split_a]], a.right[ia[split_a]], ia[split_b], ia[split_b]]),
+            np.concatenate([b.left[jb], b.right[jb], b.left[jb], b.right[jb],
+                            ib[split_a], ib[split_a], b.left[ib[split_b]], b.right[ib[split_b]]]),
+        )
+    return False
+
+
+# ================= PROXIES =================
+
+def _subdivide(triangles, max_edge):
+    """Splits triangles into 4 at their edge midpoints until no edge is longer than max_edge."""
+    done = []
+    while len(triangles):
+        edges = np.linalg.norm(np.roll(triangles, -1, axis=1) - triangles, axis=2).max(axis=1)
+        big = edges > max_edge
+        done.append(triangles[~big])
+        t = triangles[big]
+        a, b, c = t[:, 0], t[:, 1], t[:, 2]
+        ab, bc, ca = (a + b) / 2.0, (b + c) / 2.0, (c + a) / 2.0
+        triangles = np.concatenate([np.stack(corners, axis=1) for corners in
+                                    ((a, ab, ca), (ab, b, bc), (ca, bc, c), (ab, bc, ca))])
+    return np.concatenate(done)
+
+
+def _bounding_sphere(triangles):
+    points = triangles.reshape(-1, 3)
+    centre = (points.min(axis=0) + points.max(axis=0)) / 2.0
+    return centre, float(np.sqrt(np.max(np.sum((points - centre) ** 2, axis=1))))
+
+
+def _split_spheres(triangles, centroids, indices, max_radius, max_spheres):
+    """
+    Splits a set of triangles at the centroid median along its longest axis,
+    largest bounding sphere first, until every sphere is at most max_radius or
+    there are max_spheres. Returns [(centre, radius, triangle indices)].
+    """
+    centre, radius = _bounding_sphere(triangles[indices])
+    heap, final, count = [(-radius, 0, centre, indices)], [], 1
+    while heap and len(heap) + len(final) < max_spheres:
+        neg_radius, _, centre, idx = heap[0]
+        if -neg_radius <= max_radius:
+            break
+        heapq.heappop(heap)
+        if len(idx) < 2:
+            final.append((centre, -neg_radius, idx))
+            continue
+        c = centroids[idx]
+        axis = int(np.argmax(c.max(axis=0) - c.min(axis=0)))
+        mid = len(idx) // 2
+        part = np.argpartition(c[:, axis], mid)
+        for sub in (idx[part[:mid]], idx[part[mid:]]):
+            centre, radius = _bounding_sphere(triangles[sub])
+            heapq.heappush(heap, (-radius, count, centre, sub))
+            count += 1
+    return final + [(c, -r, idx) for r, _, c, idx in heap]
+
+
+class SphereProxy:
+    """
+    Conservative two-level sphere set of a mesh in its own frame: every triangle
+    lies inside a fine sphere, and every fine sphere inside its coarse parent.
+    A point of a fine sphere is at most 2 * radius from the mesh, so 2 * error
+    bounds how far the proxy overstates the mesh. children lists the fine
+    spheres of each coarse one (padded by repeating the first child).
+    Spheres are rows of (x, y, z, radius).
+    """
+
+    def __init__(self, coarse, fine, children):
+        self.coarse = np.asarray(coarse, dtype=float).reshape(-1, 4)
+        self.fine = np.asarray(fine, dtype=float).reshape(-1, 4)
+        self.children = np.asarray(children, dtype=np.int64)
+        self.error = float(self.fine[:, 3].max())
+
+    @classmethod
+    def build(cls, triangles, max_radius=None, max_spheres=None, n_coarse=None):
+        max_radius = PROXY_MAX_RADIUS if max_radius is None else max_radius
+        max_spheres = PROXY_MAX_SPHERES if max_spheres is None else max_spheres
+        n_coarse = PROXY_COARSE_SPHERES if n_coarse is None else n_coarse
+        # Large triangles are subdivided first, else a single one caps the sphere size
+        tris = _subdivide(np.asarray(triangles, dtype=float), max_radius)
+        centroids = tris.mean(axis=1)
+
+        groups = _split_spheres(tris, centroids, np.arange(len(tris)), 0.0, n_coarse)
+        per_group = max(1, max_spheres // len(groups))
+        coarse, fine, children = [], [], []
+        for centre, radius, idx in groups:
+            coarse.append([*centre, radius])
+            parts = _split_spheres(tris, centroids, idx, max_radius, per_group)
+            ids = list(range(len(fine), len(fine) + len(parts)))
+            fine.extend([*c, r] for c, r, _ in parts)
+            children.append(ids + [ids[0]] * (per_group - len(ids)))
+        return cls(coarse, fine, children)
+
+    @staticmethod
+    def cache_path(cache_dir, mesh_digest):
+        key = hashlib.sha1(mesh_digest.encode())
+        key.update(f"{PROXY_MAX_RADIUS:.6f}|{PROXY_MAX_SPHERES}|{PROXY_COARSE_SPHERES}|{PROXY_CACHE_VERSION}".encode())
+        return os.path.join(cache_dir, f"proxy_{key.hexdigest()[:20]}.npz")
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != PROXY_CACHE_VERSION:
+                raise ValueError(f"Sphere proxy version {int(data['version'])} is outdated")
+            return cls(data["coarse"], data["fine"], data["children"])
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, version=PROXY_CACHE_VERSION, coarse=self.coarse, fine=self.fine, children=self.children)
+        os.replace(tmp_path, path)
+
+
+def load_sphere_proxy(mesh_path, triangles, cache_dir):
+    """
+    SphereProxy of a mesh file: from the cache, keyed by the hash of the file and
+    the proxy settings, or built from its triangles and cached.
+    """
+    with open(mesh_path, "rb") as f:
+        path = SphereProxy.cache_path(cache_dir, hashlib.sha1(f.read()).hexdigest())
+    try:
+        return SphereProxy.load(path)
+    except Exception:
+        pass
+    proxy = SphereProxy.build(triangles)
+    try:
+        proxy.save(path)
+    except Exception:
+        pass
+    return proxy
+
+
+def _place(frames, frame_index, spheres):
+    """World centres of spheres given in the link frames frames[frame_index]."""
+    return np.einsum('nij,nj->ni', frames[frame_index, :3, :3], spheres[:, :3]) + frames[frame_index, :3, 3]
+
+
+# ================= CHECKER =================
+
+class CollisionChecker:
+    """
+    Self-collision and static-obstacle checks on the link meshes, placed with
+    the FK link frames of a KinematicsEngine. Link pairs that are adjacent, or
+    already touch in the zero pose, are never checked against each other.
+    Obstacles are meshes with a fixed pose in the TCP/world frame.
+
+    Queries run on the cached sphere proxies first (coarse, then fine spheres,
+    obstacles by their bounding box); only pairs whose proxies overlap are
+    confirmed on the mesh BVHs.
+    """
+
+    def __init__(self, engine, root=".", margin=DEFAULT_MARGIN, obstacle_file=OBSTACLE_FILE, cache_dir=None):
+        self.engine = engine
+        self.margin = margin
+        self.links, self.proxies = {}, {}
+        for name in LINK_NAMES:
+            path = os.path.join(root, LINK_MESH_FILES[name])
+            if os.path.exists(path):
+                bvh = MeshBVH.from_file(path)
+                self.links[name] = bvh
+                self.proxies[name] = load_sphere_proxy(path, bvh.triangles, cache_dir or engine.cache_dir)
+        self.obstacles = {}
+        self._lock = threading.Lock()
+        self.load_obstacles(os.path.join(root, obstacle_file))
+
+        self.ignored_pairs = {(LINK_NAMES[i], LINK_NAMES[i + 1]) for i in range(len(LINK_NAMES) - 1)}
+        pairs = [
+            (a, b) for i, a in enumerate(LINK_NAMES) for b in LINK_NAMES[i + 1:]
+            if a in self.links and b in self.links and (a, b) not in self.ignored_pairs
+        ]
+        home = self.engine.link_frames(np.zeros(6))
+        touching = {pair for pair in pairs if self._meshes_collide(*pair, home)}
+        self.ignored_pairs.update(touching)
+        self.self_pairs = [pair for pair in pairs if pair not in touching]
+        self._stack_proxies()
+
+        self.proxy_queries = 0
+        self.mesh_confirmations = 0
+
+    def _stack_proxies(self):
+        """All link proxies in one set of arrays, plus the coarse sphere pairs of self_pairs."""
+        coarse, coarse_frame, fine, fine_frame, children, first_coarse = [], [], [], [], [], {}
+        width = max(p.children.shape[1] for p in self.proxies.values())
+        for name, proxy in self.proxies.items():
+            first_coarse[name] = sum(len(c) for c in coarse)
+            frame = LINK_NAMES.index(name)
+            kids = proxy.children + sum(len(f) for f in fine)
+            children.append(np.concatenate([kids, np.repeat(kids[:, :1], width - kids.shape[1], axis=1)], axis=1))
+            coarse.append(proxy.coarse)
+            coarse_frame.append(np.full(len(proxy.coarse), frame))
+            fine.append(proxy.fine)
+            fine_frame.append(np.full(len(proxy.fine), frame))
+        self._coarse, self._coarse_frame = np.concatenate(coarse), np.concatenate(coarse_frame)
+        self._fine, self._fine_frame = np.concatenate(fine), np.concatenate(fine_frame)
+        self._children = np.concatenate(children)
+
+        ci, cj, pair_id = [], [], []
+        for k, (a, b) in enumerate(self.self_pairs):
+            ia = first_coarse[a] + np.arange(len(self.proxies[a].coarse))
+            ib = first_coarse[b] + np.arange(len(self.proxies[b].coarse))
+            ia, ib = np.meshgrid(ia, ib, indexing="ij")
+            ci.append(ia.ravel())
+            cj.append(ib.ravel())
+            pair_id.append(np.full(ia.size, k))
+        self._ci = np.concatenate(ci) if ci else np.zeros(0, dtype=np.int64)
+        self._cj = np.concatenate(cj) if cj else np.zeros(0, dtype=np.int64)
+        self._pair_id = np.concatenate(pair_id) if pair_id else np.zeros(0, dtype=np.int64)
+        self._coarse_limit = (self._coarse[self._ci, 3] + self._coarse[self._cj, 3] + self.margin) ** 2
+        self._obstacle_fine = self._fine_frame != LINK_NAMES.index("base_link")
+
+    # ================= OBSTACLES =================
+
+    def add_obstacle(self, name, vertices, faces, pose=None):
+        bvh = MeshBVH(vertices, faces)
+        with self._lock:
+            self.obstacles = {**self.obstacles, name: (bvh, np.eye(4) if pose is None else np.asarray(pose, dtype=float))}
+
+    def add_box(self, name, size, pose=None):
+        self.add_obstacle(name, *box_mesh(size), pose=pose)
+
+    def load_obstacles(self, path):
+        """Adds the boxes of an obstacle file; a missing or unreadable file adds none."""
+        try:
+            with open(path, "r") as f:
+                table = json.load(f)
+        except Exception:
+            return
+        for name, data in table.items():
+            try:
+                pose = np.eye(4)
+                pose[:3, :3] = R.from_euler('xyz', data.get("orientation", [0, 0, 0]), degrees=True).as_matrix()
+                pose[:3, 3] = data.get("position", [0, 0, 0])
+                self.add_box(name, data["size"], pose)
+            except Exception:
+                pass
+
+    def remove_obstacle(self, name):
+        with self._lock:
+            self.obstacles = {n: o for n, o in self.obstacles.items() if n != name}
+
+    # ================= QUERIES =================
+
+    def link_frames(self, joints):
+        return dict(zip(LINK_NAMES, self.engine.link_frames(joints)))
+
+    def _meshes_collide(self, a, b, frames):
+        T_ab = np.linalg.inv(frames[LINK_NAMES.index(a)]) @ frames[LINK_NAMES.index(b)]
+        return bvh_collide(self.links[a], self.links[b], T_ab, self.margin)
+
+    def _proxy_self_pairs(self, frames):
+        """Indices into self_pairs whose sphere proxies overlap."""
+        coarse = _place(frames, self._coarse_frame, self._coarse)
+        d = coarse[self._ci] - coarse[self._cj]
+        near = np.flatnonzero(np.einsum('ij,ij->i', d, d) <= self._coarse_limit)
+        if not len(near):
+            return []
+        fine = _place(frames, self._fine_frame, self._fine)
+        fi = self._children[self._ci[near]][:, :, None]
+        fj = self._children[self._cj[near]][:, None, :]
+        d = fine[fi] - fine[fj]
+        limit = (self._fine[fi, 3] + self._fine[fj, 3] + self.margin) ** 2
+        hit = np.any(np.einsum('...i,...i->...', d, d) <= limit, axis=(1, 2))
+        return np.unique(self._pair_id[near[hit]]).tolist()
+
+    def _proxy_obstacle_links(self, frames, bvh, pose):
+        """Links whose fine spheres reach into the bounding box of an obstacle."""
+        fine = _place(frames, self._fine_frame, self._fine)
+        local = (fine - pose[:3, 3]) @ pose[:3, :3] - bvh.center[0]
+        excess = np.maximum(np.abs(local) - bvh.half[0], 0.0)
+        hit = (np.einsum('ij,ij->i', excess, excess) <= (self._fine[:, 3] + self.margin) ** 2) & self._obstacle_fine
+        return [LINK_NAMES[i] for i in np.unique(self._fine_frame[hit])]
+
+    def self_collisions(self, joints, first_only=False, frames=None):
+        """Colliding (link, link) pairs for joints [rad]."""
+        if frames is None:
+            frames = self.engine.link_frames(joints)
+        self.proxy_queries += 1
+        hits = []
+        for k in self._proxy_self_pairs(frames):
+            self.mesh_confirmations += 1
+            if self._meshes_collide(*self.self_pairs[k], frames):
+                hits.append(self.self_pairs[k])
+                if first_only:
+                    break
+        return hits
+
+    def obstacle_collisions(self, joints, first_only=False, frames=None):
+        """Colliding (link, obstacle) pairs for joints [rad]."""
+        obstacles = self.obstacles
+        if not obstacles:
+            return []
+        if frames is None:
+            frames = self.engine.link_frames(joints)
+        hits = []
+        for obstacle, (bvh, pose) in obstacles.items():
+            inv_pose = np.linalg.inv(pose)
+            for link in self._proxy_obstacle_links(frames, bvh, pose):
+                self.mesh_confirmations += 1
+                if bvh_collide(bvh, self.links[link], inv_pose @ frames[LINK_NAMES.index(link)], self.margin):
+                    hits.append((link, obstacle))
+                    if first_only:
+                        return hits
+        return hits
+
+    def in_collision(self, joints):
+        frames = self.engine.link_frames(joints)
+        return bool(self.self_collisions(joints, True, frames) or self.obstacle_collisions(joints, True, frames))
+
+    def check_path(self, joint_path):
+        """Index of the first colliding configuration in an (N,6) path [rad], or None."""
+        for i, q in enumerate(np.asarray(joint_path, dtype=float)):
+            if self.in_collision(q):
+                return i
+        return None
+
+    def is_free_deg(self, joints_deg):
+        """Streamer validator: True when the setpoint [deg] is collision free."""
+        return not self.in_collision(np.radians(joints_deg))
+
+
+_CHECKERS = {}
+_CHECKERS_READY = {}
+_CHECKER_ERRORS = {}
+_CHECKERS_LOCK = threading.Lock()
+
+def has_link_meshes(root="."):
+    return any(os.path.exists(os.path.join(root, LINK_MESH_FILES[name])) for name in LINK_NAMES)
+
+
+def get_collision_checker(engine, build=True):
+    """
+    Returns the CollisionChecker of engine. The meshes take a moment to load,
+    so the first call starts a background build (build=True) and returns None
+    until it is done; wait_collision_checker() waits for it. A build that
+    fails keeps returning None, with collision_checker_error() telling why.
+    """
+    key = id(engine)
+    with _CHECKERS_LOCK:
+        if key in _CHECKERS:
+            return _CHECKERS[key]
+        if not build or engine.joint_origins is None:
+            return None
+        _CHECKERS[key] = None
+        ready = _CHECKERS_READY[key] = threading.Event()
+
+    def run():
+        checker = None
+        if has_link_meshes():
+            try:
+                checker = CollisionChecker(engine)
+            except Exception as error:
+                _CHECKER_ERRORS[key] = error
+        with _CHECKERS_LOCK:
+            _CHECKERS[key] = checker
+        ready.set()
+
+    threading.Thread(target=run, daemon=True).start()
+    return None
+
+
+def collision_checker_error(engine):
+    """The exception the checker build of engine failed with, or None."""
+    return _CHECKER_ERRORS.get(id(engine))
+
+
+def wait_collision_checker(engine, timeout=None):
+    """
+    Waits up to timeout [s] for the build get_collision_checker() started.
+    Returns (done, checker): done is False while it is still building, and
+    checker is None when the build failed or there is none to build (no
+    meshes or link frames).
+    """
+    ready = _CHECKERS_READY.get(id(engine))
+    if ready is None:
+        return True, get_collision_checker(engine, build=False)
+    if not ready.wait(timeout):
+        return False, None
+    return True, get_collision_checker(engine, build=False)
+
+
+def setpoint_validator(engine):
+    """
+    MotionStreamer validator for engine: rejects setpoints [deg] that collide.
+    Starts the mesh build; until it is done a setpoint waits for it (at most
+    CHECKER_WAIT_S, then it is rejected). After a failed build every setpoint
+    is rejected (see collision_checker_error()). Only without meshes or link
+    frames to build from is nothing checked.
+    """
+    get_collision_checker(engine)
+
+    def validate(setpoint_deg):
+        checker = get_collision_checker(engine, build=False)
+        if checker is None:
+            done, checker = wait_collision_checker(engine, CHECKER_WAIT_S)
+            if not done or collision_checker_error(engine) is not None:
+                return False
+        return checker is None or checker.is_free_deg(setpoint_deg)
+    return validate
@@ -1,17 +1,451 @@
+import asyncio
+import binascii
+import numpy as np
 import serial
 import serial.tools.list_ports
+import struct
 import threading
 import time
+from collections import deque
+
+# Upper bound of one read() call [bytes]
+DEFAULT_READ_SIZE = 4096
+# Longest line the framer holds [bytes]; anything longer is dropped as overflow
+MAX_LINE_LENGTH = 1024
+
+# Handler thread (start_handler_thread): feedback with one of these prefixes
+# (or the frames standing for it) keeps only its newest pending message; the
+# other messages wait in order, at most HANDLER_QUEUE_SIZE, the oldest dropped
+MERGED_PREFIXES = ("A_", "PROT_")
+HANDLER_QUEUE_SIZE = 256
+
+# Write lanes: urgent commands first, everything else in the order it was queued
+LANE_URGENT = 0
+LANE_ORDERED = 1
+LANE_NAMES = ("urgent", "ordered")
+
+# Sent ahead of everything else
+URGENT_PREFIXES = ("ESTOP", "STOP", "ROBOT_OK", "EGRIP_STOP", "JVS_")
+# Stop commands also drop the motion frames still waiting behind them
+STOP_PREFIXES = ("ESTOP", "STOP", "EGRIP_STOP", "JVS_")
+# Motion traffic; a newer frame replaces the one just before it with the same key
+MOTION_PREFIXES = ("J_", "JV_", "JK")
+
+# Velocity jog (JV_ / JK / JVS_) is only used once the controller answers
+# VELOCITY_REQUEST with VELOCITY_ACK; firmware without it never does
+VELOCITY_REQUEST = "JV_ON"
+VELOCITY_ACK = "JV_OK"
+
+# ================= BINARY FRAMES =================
+# Optional compact mode, negotiated after connect: the host sends BIN_ON, a
+# controller that supports it answers BIN_OK and from then on sends joint
+# feedback (A_) and PROT_ telemetry as binary frames and accepts J_ setpoints
+# as frames. Everything else (events, error codes, settings) stays ASCII. A
+# controller that never answers keeps the whole link ASCII.
+#
+# Frame, little-endian:  A5 5A | type u8 | seq u8 | payload | CRC16 u16
+# The CRC is CRC16-CCITT (poly 0x1021, init 0xFFFF) over type, seq and
+# payload. The payload size is fixed by the type. 0xA5 never occurs in the
+# ASCII traffic, so frames and whole lines can share the stream.
+BINARY_REQUEST = "BIN_ON"
+BINARY_ACK = "BIN_OK"
+BINARY_OFF = "BIN_OFF"
+
+FRAME_SYNC = b"\xa5\x5a"
+# A_: six joint positions, int16 [0.01 deg]
+FRAME_JOINTS = 0x01
+# PROT_: power flags (bit0 3V3, bit1 5V, bit2 OK), pstat u8, four temperatures int16 [0.1 degC]
+FRAME_PROT = 0x02
+# J_: six joint setpoints, int16 [0.01 deg]
+FRAME_SETPOINT = 0x81
+
+_FRAME_HEADER = struct.Struct("<2sBB")
+_FRAME_CRC = struct.Struct("<H")
+FRAME_PAYLOADS = {
+    FRAME_JOINTS: struct.Struct("<6h"),
+    FRAME_PROT: struct.Struct("<BB4h"),
+    FRAME_SETPOINT: struct.Struct("<6h"),
+}
+FRAME_SIZES = {t: _FRAME_HEADER.size + p.size + _FRAME_CRC.size for t, p in FRAME_PAYLOADS.items()}
+
+# Back-to-back joint frames are decoded as one numpy array once a read holds this many
+BULK_MIN_FRAMES = 4
+_JOINT_FRAME_DTYPE = np.dtype([("sync", "<u2"), ("type", "u1"), ("seq", "u1"), ("q", "<i2", (6,)), ("crc", "<u2")])
+_SYNC_WORD = int.from_bytes(FRAME_SYNC, "little")
+
+
+def crc16(data):
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def encode_frame(frame_type, seq, values):
+    """Packs one frame; values in the units of the ASCII message (deg, degC, 0/1 flags)."""
+    if frame_type == FRAME_PROT:
+        p3v3, p5v, pok, pstat = values[:4]
+        fields = (bool(p3v3) | bool(p5v) << 1 | bool(pok) << 2, int(pstat),
+                  *(_clamp16(t * 10.0) for t in values[4:8]))
+    else:
+        fields = [_clamp16(v * 100.0) for v in values]
+    body = _FRAME_HEADER.pack(FRAME_SYNC, frame_type, seq & 0xFF) + FRAME_PAYLOADS[frame_type].pack(*fields)
+    return body + _FRAME_CRC.pack(crc16(body[2:]))
+
+
+def _clamp16(value):
+    return max(-32768, min(32767, int(round(value))))
+
+
+def _frame_values(frame_type, fields):
+    if frame_type == FRAME_PROT:
+        flags, pstat = fields[0], fields[1]
+        return (flags & 1, flags >> 1 & 1, flags >> 2 & 1, pstat, *[t * 0.1 for t in fields[2:]])
+    return [v * 0.01 for v in fields]
+
+
+def frame_to_line(frame_type, values):
+    """The ASCII line a decoded frame stands for, for consumers that only take lines."""
+    if frame_type == FRAME_JOINTS:
+        return "A_" + "_".join(f"{v:.2f}" for v in values)
+    if frame_type == FRAME_PROT:
+        return "PROT_" + ",".join(str(v) for v in values[:4]) + "," + ",".join(f"{t:.1f}" for t in values[4:])
+    if frame_type == FRAME_SETPOINT:
+        return "J_" + ",".join(f"{v:.2f}" for v in values)
+    return None
+
+
+class LineFramer:
+    """
+    Splits the byte stream into '\n' terminated lines. Reads are appended to
+    one bytearray and a line that spans reads stays there until its
+    terminator arrives. Terminators are found in place with find(), lines are
+    decoded straight from a memoryview, and only the unterminated tail is
+    moved to the front after each read.
+
+    A line that is not valid UTF-8 is dropped and counted as a framing error.
+    A line longer than max_line is dropped up to its terminator and counted
+    as an overflow.
+    """
+
+    def __init__(self, max_line=MAX_LINE_LENGTH):
+        self.max_line = max_line
+        self._buffer = bytearray()
+        self._discarding = False
+        self.lines = 0
+        self.carried = 0
+        self.framing_errors = 0
+        self.overflows = 0
+
+    def reset(self):
+        self._buffer.clear()
+        self._discarding = False
+
+    def drop_partial(self):
+        """Drops an unterminated line; True if there was one."""
+        dropped = bool(self._buffer) and not self._discarding
+        self.reset()
+        return dropped
+
+    def feed(self, data):
+        """Appends data and returns the complete lines in it (str, stripped, non-empty)."""
+        buffer = self._buffer
+        scan_from = len(buffer)
+        if scan_from:
+            self.carried += 1
+        buffer += data
+
+        lines = []
+        start = 0
+        view = memoryview(buffer)
+        try:
+            while True:
+                end = buffer.find(b"\n", scan_from)
+                if end < 0:
+                    break
+                if self._discarding:
+                    self._discarding = False
+                elif end > start:
+                    try:
+                        line = str(view[start:end], "utf-8").strip()
+                    except UnicodeDecodeError:
+                        self.framing_errors += 1
+                        line = ""
+                    if line:
+                        lines.append(line)
+                start = scan_from = end + 1
+
+            # Unterminated tail: keep it for the next read unless it is already too long
+            if len(buffer) - start > self.max_line:
+                if not self._discarding:
+                    self.overflows += 1
+                self._discarding = True
+                start = len(buffer)
+        finally:
+            view.release()
+
+        if start:
+            del buffer[:start]
+        self.lines += len(lines)
+        return lines
+
+    def stats(self):
+        return {
+            "lines": self.lines,
+            "carried": self.carried,
+            "framing_errors": self.framing_errors,
+            "overflows": self.overflows,
+            "pending": len(self._buffer),
+        }
+
+
+class FrameDecoder:
+    """
+    Splits a stream of ASCII lines and binary frames. Text goes through a
+    LineFramer. A frame is sized from its type byte, CRC-checked in place and
+    unpacked with struct.unpack_from straight from the receive buffer, so a
+    feedback frame costs no split() and no float() per field. A read holding
+    several joint frames back to back is decoded as one numpy.frombuffer view.
+
+    The controller only sends a frame between whole lines, so a partial line
+    in front of a sync marker is dropped as a framing error. A frame with a
+    bad CRC or an unknown type is dropped and the decoder skips ahead to the
+    next sync marker or line end. Gaps in the sequence number count as lost
+    frames.
+
+    Until the controller's BIN_OK line has been seen the stream is handed to
+    the LineFramer as it is. While an answer to BIN_ON is awaited (awaiting
+    set), the lines are split off one by one so the bytes right after BIN_OK
+    are already decoded as frames.
+    """
+
+    def __init__(self, max_line=MAX_LINE_LENGTH):
+        self.lines = LineFramer(max_line)
+        self.binary = False
+        self.awaiting = False
+        self._buffer = bytearray()
+        self._seq = None
+        self.frames = 0
+        self.crc_errors = 0
+        self.unknown_frames = 0
+        self.lost_frames = 0
+        self.skipped_bytes = 0
+
+    def reset(self):
+        self.lines.reset()
+        self._buffer.clear()
+        self._seq = None
+        self.binary = False
+        self.awaiting = False
+
+    def feed(self, data):
+        """
+        Returns what data completes, in stream order: lines as str and frames
+        as (frame_type, values) tuples.
+        """
+        if self.awaiting and not self.binary:
+            return self._feed_until_ack(data)
+        if not self.binary and not self._buffer:
+            return self.lines.feed(data)
+
+        buffer = self._buffer
+        buffer += data
+        items = []
+        view = memoryview(buffer)
+        try:
+            pos = self._decode(buffer, view, items)
+        finally:
+            view.release()
+        if pos:
+            del buffer[:pos]
+        return items
+
+    def _feed_until_ack(self, data):
+        items = []
+        start = 0
+        while True:
+            end = data.find(b"\n", start)
+            if end < 0:
+                return items + self.lines.feed(data[start:])
+            lines = self.lines.feed(data[start:end + 1])
+            items += lines
+            start = end + 1
+            if BINARY_ACK in lines:
+                self.binary = True
+                self.awaiting = False
+                return items + self.feed(data[start:])
+
+    def _decode(self, buffer, view, items):
+        """Appends what buffer holds to items; returns how many bytes were used."""
+        pos = 0
+        end = len(buffer)
+        # The line framer may still hold a partial line from the last read
+        text = True
+        while pos < end:
+            sync = buffer.find(FRAME_SYNC, pos)
+            if sync < 0:
+                # A trailing A5 may be the first half of the next marker
+                text_end = end - 1 if buffer[-1] == FRAME_SYNC[0] else end
+                if text_end > pos:
+                    items += self.lines.feed(view[pos:text_end])
+                pos = text_end
+                break
+            if sync > pos:
+                items += self.lines.feed(view[pos:sync])
+                text = True
+            pos = sync
+            if text:
+                text = False
+                if self.lines.drop_partial():
+                    self.lines.framing_errors += 1
+
+            if end - pos < _FRAME_HEADER.size:
+                break
+            _, frame_type, seq = _FRAME_HEADER.unpack_from(buffer, pos)
+            size = FRAME_SIZES.get(frame_type)
+            if size is None:
+                self.unknown_frames += 1
+                pos = self._resync(pos)
+                continue
+            if end - pos < size:
+                break
+            if frame_type == FRAME_JOINTS and end - pos >= BULK_MIN_FRAMES * size:
+                used = self._decode_joint_run(buffer, view, pos, end, items)
+                if used:
+                    pos += used
+                    continue
+            crc_at = pos + size - _FRAME_CRC.size
+            if crc16(view[pos + 2:crc_at]) != _FRAME_CRC.unpack_from(buffer, crc_at)[0]:
+                self.crc_errors += 1
+                pos = self._resync(pos)
+                continue
+
+            fields = FRAME_PAYLOADS[frame_type].unpack_from(buffer, pos + _FRAME_HEADER.size)
+            items.append((frame_type, _frame_values(frame_type, fields)))
+            if self._seq is not None:
+                self.lost_frames += (seq - self._seq - 1) & 0xFF
+            self._seq = seq
+            self.frames += 1
+            pos += size
+        return pos
+
+    def _decode_joint_run(self, buffer, view, pos, end, items):
+        """
+        Decodes the run of intact joint frames starting at pos in one go:
+        marker, type and sequence checks and the scaling are numpy operations
+        over the whole run. Returns the bytes used (0 if the first frame is bad).
+        """
+        size = FRAME_SIZES[FRAME_JOINTS]
+        frames = np.frombuffer(buffer, dtype=_JOINT_FRAME_DTYPE, count=(end - pos) // size, offset=pos)
+        valid = (frames["sync"] == _SYNC_WORD) & (frames["type"] == FRAME_JOINTS)
+        count = len(valid) if valid.all() else int(valid.argmin())
+        crcs = np.fromiter((crc16(view[i:i + size - 4]) for i in range(pos + 2, pos + 2 + count * size, size)),
+                           dtype=np.uint16, count=count)
+        intact = crcs == frames["crc"][:count]
+        if not intact.all():
+            # The frame-by-frame path reports the bad one
+            count = int(intact.argmin())
+        if not count:
+            return 0
+
+        run = frames[:count]
+        seq = run["seq"].astype(np.int64)
+        if self._seq is not None:
+            self.lost_frames += (int(seq[0]) - self._seq - 1) & 0xFF
+        self.lost_frames += int(((np.diff(seq) - 1) & 0xFF).sum())
+        self._seq = int(seq[-1])
+        items.extend((FRAME_JOINTS, q) for q in (run["q"] * 0.01).tolist())
+        self.frames += count
+        return count * size
+
+    def _resync(self, pos):
+        """Position of the next sync marker or line start after a bad frame at pos."""
+        buffer = self._buffer
+        candidates = [i for i in (buffer.find(FRAME_SYNC, pos + 1), buffer.find(b"\n", pos + 1) + 1) if i > 0]
+        # Nothing yet: skip what is here, keeping a possible first marker byte
+        skip_to = min(candidates) if candidates else len(buffer) - (buffer[-1] == FRAME_SYNC[0])
+        skip_to = max(skip_to, pos + 1)
+        self.skipped_bytes += skip_to - pos
+        return skip_to
+
+    def stats(self):
+        lines = self.lines.stats()
+        return {
+            **lines,
+            "pending": lines["pending"] + len(self._buffer),
+            "frames": self.frames,
+            "crc_errors": self.crc_errors,
+            "unknown_frames": self.unknown_frames,
+            "lost_frames": self.lost_frames,
+            "skipped_bytes": self.skipped_bytes,
+        }
+
 
 class UARTCommunicator:
-    def __init__(self, baudrate=115200, timeout=0.1):
+    """
+    Serial link to the controller. The reader thread blocks in read() (select
+    on the port on POSIX, overlapped wait on Windows) until bytes arrive, so it
+    neither polls nor adds a sleep to every line; timeout only bounds how long
+    a disconnect takes to notice. With an event loop attached (see
+    AsyncTransport) the loop watches the port's fd instead and there is no
+    reader thread. Read-to-dispatch latency (from read() returning to
+    on_data_received being called) is measured per line.
+
+    start_handler_thread() moves the handlers off the reading thread: slow
+    handlers (UI updates) then never hold up reading. Joint and PROT
+    feedback keep only their newest pending message, so a handler slower
+    than the feedback rate skips stale positions instead of falling behind;
+    the dispatch latency then includes the wait for the handler thread.
+
+    send_message() only queues: one writer thread owns the port and always
+    takes the urgent lane first (ESTOP / STOP / ROBOT_OK ...). All other
+    commands and motion share one FIFO, so a grip queued after a move is
+    never sent before it. A J_ setpoint (or JK, or JV_ of the same joint)
+    waiting at the end of the queue is replaced by a newer one, so a
+    saturated link sends the newest setpoint instead of a backlog. Stop
+    commands drop the motion still queued.
+
+    With binary set (off by default: firmware without the protocol answers
+    BIN_ON with an error; main.py sets it from the binary_link global
+    setting), BIN_ON is sent after connect. Once the controller
+    answers BIN_OK, feedback frames go to on_frame_received(frame_type, values) (or,
+    without that callback, to on_data_received as the equivalent ASCII line)
+    and send_joints() sends J_ setpoints as frames. Until then, and with
+    controllers that never answer, the link stays ASCII.
+
+    With velocity_jog set (the velocity_jog global setting), JV_ON is sent
+    after connect and velocity_active turns on when the controller answers
+    JV_OK.
+    """
+
+    def __init__(self, baudrate=115200, timeout=0.1, read_size=DEFAULT_READ_SIZE, max_line=MAX_LINE_LENGTH,
+                 binary=False, velocity_jog=False):
         self.port = None
         self.baudrate = baudrate
         self.timeout = timeout
+        self.read_size = read_size
         self.serial_connection = None
         self.is_running = False
         self.read_thread = None
+        self.write_thread = None
         self.on_data_received = None 
+        self.on_frame_received = None
+        self.read_loop = None
+        self._watched_fd = None
+        self._listeners = []
+        self.handler_thread = None
+        self._handler_cond = threading.Condition()
+        self._handler_queue = deque()
+        self._handler_pending = {}
+        self.framer = FrameDecoder(max_line)
+        self.binary = binary
+        self.binary_active = False
+        self.velocity_jog = velocity_jog
+        self.velocity_active = False
+        self._tx_seq = 0
+
+        self._write_cond = threading.Condition()
+        self._lanes = (deque(), deque())
+
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
 
     def find_port(self):
         ports = serial.tools.list_ports.comports()
@@ -38,9 +472,21 @@ class UARTCommunicator:
                 self.port, self.baudrate, timeout=self.timeout
             )
             self.is_running = True
+            self.framer.reset()
+            self.binary_active = False
+            self.velocity_active = False
+            with self._write_cond:
+                for lane in self._lanes:
+                    lane.clear()
             
-            self.read_thread = threading.Thread(target=self._read_loop, daemon=True)
-            self.read_thread.start()
+            self._start_reader()
+            self.write_thread = threading.Thread(target=self._write_loop, daemon=True)
+            self.write_thread.start()
+
+            if self.binary:
+                self.request_binary()
+            if self.velocity_jog:
+                self.request_velocity_jog()
             
             return True
         except serial.SerialException as e:
@@ -49,54 +495,539 @@ class UARTCommunicator:
 
     def disconnect(self):
         self.is_running = False
+        self._unwatch_port()
         if self.serial_connection:
             try:
                 self.serial_connection.close()
             except:
                 pass
         self.serial_connection = None
+        with self._write_cond:
+            self._write_cond.notify_all()
 
     def is_open(self):
         return self.serial_connection is not None and self.serial_connection.is_open
 
+    def request_binary(self):
+        """Asks the controller for binary frames; they are decoded and sent once it answers BIN_OK."""
+        self.framer.awaiting = True
+        return self.send_message(BINARY_REQUEST)
+
+    def request_velocity_jog(self):
+        """Asks whether the controller runs velocity jogs; velocity_active is set by its JV_OK."""
+        return self.send_message(VELOCITY_REQUEST)
+
+    def disable_binary(self):
+        """Back to ASCII setpoints; frames still in flight are decoded."""
+        self.binary_active = False
+        return self.send_message(BINARY_OFF)
+
+    # ================= STATISTICS =================
+
+    def stats(self):
+        with self._stats_lock:
+            lines = self.lines_dispatched
+            return {
+                "reads": self.reads,
+                "bytes": self.bytes_read,
+                "lines": lines,
+                "latency_avg_ms": self._latency_total / lines * 1000.0 if lines else 0.0,
+                "latency_max_ms": self.latency_max * 1000.0,
+                "latency_last_ms": self.latency_last * 1000.0,
+                **{f"framer_{k}": v for k, v in self.framer.stats().items()},
+                **self._handler_stats(),
+                **self._write_stats(),
+            }
+
+    def _handler_stats(self):
+        with self._handler_cond:
+            return {
+                "queued_handlers": len(self._handler_queue),
+                "handler_merged": self.handler_merged,
+                "handler_dropped": self.handler_dropped,
+            }
+
+    def _write_stats(self):
+        with self._write_cond:
+            writes = self.writes
+            return {
+                **{f"queued_{name}": len(lane) for name, lane in zip(LANE_NAMES, self._lanes)},
+                "queued_motion": sum(1 for key, _, _ in self._lanes[LANE_ORDERED] if key is not None),
+                "queue_max_depth": self.queue_max_depth,
+                "writes": writes,
+                "write_latency_avg_ms": self._write_latency_total / writes * 1000.0 if writes else 0.0,
+                "write_latency_max_ms": self.write_latency_max * 1000.0,
+                "coalesced": self.coalesced,
+                "flushed": self.flushed,
+                "write_errors": self.write_errors,
+            }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.reads = 0
+            self.bytes_read = 0
+            self.lines_dispatched = 0
+            self._latency_total = 0.0
+            self.latency_max = 0.0
+            self.latency_last = 0.0
+        with self._handler_cond:
+            self.handler_merged = 0
+            self.handler_dropped = 0
+        with self._write_cond:
+            self.writes = 0
+            self.queue_max_depth = 0
+            self._write_latency_total = 0.0
+            self.write_latency_max = 0.0
+            self.coalesced = 0
+            self.flushed = 0
+            self.write_errors = 0
+
+    # ================= READER =================
+
+    def attach_loop(self, loop):
+        """From the next connect on, loop reads the port (loop.add_reader) instead of the reader thread."""
+        self.read_loop = loop
+
+    def add_listener(self, listener):
+        """listener(message) gets every line and decoded frame, on the thread that read it."""
+        self._listeners.append(listener)
+
+    def _start_reader(self):
+        connection = self.serial_connection
+        if self.read_loop is not None and hasattr(connection, "fileno"):
+            self.read_loop.call_soon_threadsafe(self._watch_port, connection)
+        else:
+            self.read_thread = threading.Thread(target=self._read_loop, daemon=True)
+            self.read_thread.start()
+
+    def _watch_port(self, connection):
+        """Runs on read_loop; falls back to the reader thread where the loop cannot watch the port."""
+        if not self.is_running or self.serial_connection is not connection:
+            return
+        try:
+            fd = connection.fileno()
+            self.read_loop.add_reader(fd, self._read_ready, connection)
+            self._watched_fd = fd
+        except (AttributeError, NotImplementedError, OSError, ValueError):
+            self.read_thread = threading.Thread(target=self._read_loop, daemon=True)
+            self.read_thread.start()
+
+    def _unwatch_port(self):
+        """
+        Takes the port off read_loop and waits for it, so the loop never
+        selects on the fd after close() (or on another file reusing it).
+        """
+        loop = self.read_loop
+        if loop is None:
+            return
+
+        def unwatch():
+            if self._watched_fd is not None:
+                loop.remove_reader(self._watched_fd)
+                self._watched_fd = None
+
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop or not loop.is_running():
+            unwatch()
+            return
+
+        async def unwatch_on_loop():
+            unwatch()
+
+        try:
+            # Also runs after a _watch_port still queued from connect
+            asyncio.run_coroutine_threadsafe(unwatch_on_loop(), loop).result(UNWATCH_TIMEOUT)
+        except Exception:
+            pass
+
+    def _read_ready(self, connection):
+        """The port is readable: takes what is buffered and dispatches it on the loop."""
+        try:
+            raw_data = connection.read(min(max(connection.in_waiting, 1), self.read_size))
+        except Exception:
+            raw_data = None
+        if not raw_data:
+            # Closed or unplugged: a dead fd would report readable forever
+            if raw_data is None and self._watched_fd is not None:
+                self.read_loop.remove_reader(self._watched_fd)
+                self._watched_fd = None
+            return
+        self._dispatch(raw_data, time.perf_counter())
+
     def _read_loop(self):
         """
-        Reads data in a loop. Changed to more reliable reading.
+        Blocks until at least one byte arrives, then takes whatever else is
+        already buffered (up to read_size) and dispatches the lines.
         """
-        while self.is_running:
-            if not self.is_open():
-                time.sleep(0.5)
+        connection = self.serial_connection
+        # A reconnect starts a new reader; this one ends with its own connection
+        while self.is_running and self.serial_connection is connection:
+            if connection is None or not connection.is_open:
+                break
+
+            try:
+                raw_data = connection.read(1)
+                if not raw_data:
+                    continue
+                waiting = connection.in_waiting
+                if waiting:
+                    raw_data += connection.read(min(waiting, self.read_size - 1))
+            except Exception:
+                # Port closed under us (disconnect) or unplugged
+                if not self.is_running:
+                    break
+                time.sleep(self.timeout)
                 continue
-                
+
+            self._dispatch(raw_data, time.perf_counter())
+
+    def _dispatch(self, raw_data, read_at):
+        with self._stats_lock:
+            self.reads += 1
+            self.bytes_read += len(raw_data)
+
+        for item in self.framer.feed(raw_data):
+            for listener in self._listeners:
+                try:
+                    listener(item)
+                except Exception:
+                    pass
+            if item.__class__ is str:
+                if item == BINARY_ACK:
+                    self.binary_active = True
+                    continue
+                if item == VELOCITY_ACK:
+                    self.velocity_active = True
+                    continue
+                handler, args = self.on_data_received, (item,)
+            elif self.on_frame_received:
+                handler, args = self.on_frame_received, item
+            else:
+                handler, args = self.on_data_received, (frame_to_line(*item),)
+            if not handler:
+                continue
+            if self.handler_thread is not None:
+                self._hand_off(item, handler, args, read_at)
+                continue
+            self._record_latency(time.perf_counter() - read_at)
             try:
-              
-                if self.serial_connection.in_waiting > 0:
-                
-                    raw_data = self.serial_connection.read(self.serial_connection.in_waiting)
-                    
-                    if raw_data:
-                        try:
-                            decoded_chunk = raw_data.decode('utf-8', errors='ignore')
-                            
-                            lines = decoded_chunk.split('\n')
-                            for line in lines:
-                                line = line.strip()
-                                if line and self.on_data_received:
-                                    self.on_data_received(line)
-                                    
-                        except Exception as decode_error:
-                            pass
-
-            except Exception as e:
-                time.sleep(0.1)
-            
-            time.sleep(0.01)
+                handler(*args)
+            except Exception:
+                pass
+
+    def _record_latency(self, latency):
+        with self._stats_lock:
+            self.lines_dispatched += 1
+            self._latency_total += latency
+            self.latency_last = latency
+            if latency > self.latency_max:
+                self.latency_max = latency
+
+    # ================= HANDLER THREAD =================
+
+    def start_handler_thread(self):
+        """Runs on_data_received / on_frame_received on their own thread from now on."""
+        if self.handler_thread is None:
+            self.handler_thread = threading.Thread(target=self._handler_loop, daemon=True)
+            self.handler_thread.start()
+
+    @staticmethod
+    def _merge_key(item):
+        if item.__class__ is str:
+            for prefix in MERGED_PREFIXES:
+                if item.startswith(prefix):
+                    return prefix
+            return None
+        return FRAME_PREFIXES.get(item[0])
+
+    def _hand_off(self, item, handler, args, read_at):
+        key = self._merge_key(item)
+        with self._handler_cond:
+            entry = self._handler_pending.get(key) if key is not None else None
+            if entry is not None:
+                # Keeps its place in the queue, with the newest value
+                entry[1:] = handler, args, read_at
+                self.handler_merged += 1
+                return
+            if len(self._handler_queue) >= HANDLER_QUEUE_SIZE:
+                dropped = self._handler_queue.popleft()
+                if dropped[0] is not None:
+                    del self._handler_pending[dropped[0]]
+                self.handler_dropped += 1
+            entry = [key, handler, args, read_at]
+            self._handler_queue.append(entry)
+            if key is not None:
+                self._handler_pending[key] = entry
+            self._handler_cond.notify()
+
+    def _handler_loop(self):
+        while True:
+            with self._handler_cond:
+                while not self._handler_queue:
+                    self._handler_cond.wait()
+                key, handler, args, read_at = entry = self._handler_queue.popleft()
+                if key is not None and self._handler_pending.get(key) is entry:
+                    del self._handler_pending[key]
+            self._record_latency(time.perf_counter() - read_at)
+            try:
+                handler(*args)
+            except Exception:
+                pass
+
+    # ================= WRITER =================
 
     def send_message(self, message):
+        """Queues one line for the writer thread; False when the port is closed."""
+        if not self.is_open(): return False
+        clean_message = message.strip()
+        return self._queue(clean_message, (clean_message + '\n').encode('utf-8'))
+
+    def send_joints(self, q_deg):
+        """Queues a J_ setpoint [deg]: a binary frame once BIN_OK came back, an ASCII line otherwise."""
         if not self.is_open(): return False
+        if not self.binary_active:
+            return self.send_message("J_" + ",".join(f"{v:.2f}" for v in q_deg))
+        with self._write_cond:
+            seq = self._tx_seq
+            self._tx_seq = (seq + 1) & 0xFF
+        # A sequence gap seen by the controller is a setpoint coalesced here, not a lost one
+        return self._queue("J_", encode_frame(FRAME_SETPOINT, seq, q_deg))
+
+    def _queue(self, clean_message, data):
+        now = time.perf_counter()
+
+        with self._write_cond:
+            urgent, ordered = self._lanes
+            if clean_message.startswith(URGENT_PREFIXES):
+                if clean_message.startswith(STOP_PREFIXES):
+                    kept = [entry for entry in ordered if entry[0] is None]
+                    self.flushed += len(ordered) - len(kept)
+                    ordered.clear()
+                    ordered.extend(kept)
+                urgent.append((None, data, now))
+            elif clean_message.startswith(MOTION_PREFIXES):
+                # J_ and JK coalesce as a whole, JV_ per joint; only with the
+                # entry right before, so nothing moves past a normal command
+                key = clean_message.split(",", 1)[0] if clean_message.startswith("JV_") else clean_message[:2]
+                if ordered and ordered[-1][0] == key:
+                    ordered[-1] = (key, data, now)
+                    self.coalesced += 1
+                else:
+                    ordered.append((key, data, now))
+            else:
+                ordered.append((None, data, now))
+
+            depth = sum(len(lane) for lane in self._lanes)
+            if depth > self.queue_max_depth:
+                self.queue_max_depth = depth
+            self._write_cond.notify_all()
+        return True
+
+    def _next_message(self):
+        urgent, ordered = self._lanes
+        _, data, queued_at = urgent.popleft() if urgent else ordered.popleft()
+        return data, queued_at
+
+    def _write_loop(self):
+        connection = self.serial_connection
+        while True:
+            with self._write_cond:
+                while (self.is_running and self.serial_connection is connection
+                       and not any(self._lanes)):
+                    self._write_cond.wait()
+                if not self.is_running or self.serial_connection is not connection:
+                    return
+                data, queued_at = self._next_message()
+
+            try:
+                connection.write(data)
+                ok = True
+            except Exception:
+                ok = False
+
+            latency = time.perf_counter() - queued_at
+            with self._write_cond:
+                if ok:
+                    self.writes += 1
+                    self._write_latency_total += latency
+                    if latency > self.write_latency_max:
+                        self.write_latency_max = latency
+                else:
+                    self.write_errors += 1
+
+
+# ================= ASYNC TRANSPORT =================
+# Messages an async iterator keeps for a slow consumer; older ones are dropped
+SUBSCRIBER_QUEUE_SIZE = 256
+# Frames standing for an ASCII message, so one prefix matches both forms
+FRAME_PREFIXES = {FRAME_JOINTS: "A_", FRAME_PROT: "PROT_"}
+# How long disconnect() waits for the loop to stop watching the port [s]
+UNWATCH_TIMEOUT = 1.0
+
+
+def _matcher(match):
+    """
+    Predicate for a message (a line, or a (frame_type, values) frame) from a
+    line prefix (which also matches the frames standing for it, e.g. "A_"
+    and joint feedback frames), a frame type or a callable.
+    """
+    if callable(match):
+        return match
+    if isinstance(match, int):
+        return lambda message: message.__class__ is tuple and message[0] == match
+    frame_types = tuple(t for t, prefix in FRAME_PREFIXES.items() if prefix.startswith(match))
+
+    def matches(message):
+        if message.__class__ is str:
+            return message.startswith(match)
+        return message[0] in frame_types
+    return matches
+
+
+def parse_joint_feedback(message):
+    """Joint positions [deg] from an A_ line or a joint feedback frame; None for anything else."""
+    if message.__class__ is tuple:
+        return list(message[1]) if message[0] == FRAME_JOINTS else None
+    if not message.startswith("A_"):
+        return None
+    try:
+        values = [float(p) for p in message[2:].split('_') if p.strip()]
+    except ValueError:
+        return None
+    return values if len(values) == 6 else None
+
+
+class AsyncTransport:
+    """
+    asyncio front end of a UARTCommunicator, on its own event loop thread.
+    From the next connect on the loop reads the port itself (loop.add_reader
+    on the port's fd); where the port has no fd or the loop cannot watch one,
+    the reader thread keeps reading and hands every message to the loop.
+    Waiting for a reply is a future that the dispatch resolves, so it costs
+    nothing until the reply arrives. The communicator's on_data_received and
+    on_frame_received handlers then run on the loop thread too, so they must
+    hand slow work (UI updates) to another thread.
+
+    Messages are lines (str) or decoded binary frames ((frame_type, values)).
+    A match is a line prefix, which also matches the frames standing for it
+    (A_ joint feedback, PROT_), a frame type, or a callable taking the message.
+
+    Coroutines run on self.loop: await them from code already on it, or
+    hand them over from other threads with submit() / run().
+    """
+
+    def __init__(self, uart):
+        self.uart = uart
+        self.loop = asyncio.new_event_loop()
+        self.dropped = 0
+        self._waiters = []
+        self._subscribers = []
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        uart.add_listener(self._on_message)
+        uart.attach_loop(self.loop)
+
+    def submit(self, coro):
+        """Schedules coro on the transport's loop; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Runs coro on the transport's loop and blocks the calling (non-loop) thread for its result."""
+        return self.submit(coro).result(timeout)
+
+    async def send_and_wait(self, command, match, timeout=1.0):
+        """Sends command and returns the first message after it that matches; TimeoutError after timeout [s]."""
+        future = self.loop.create_future()
+        waiter = (_matcher(match), future)
+        # Registered before sending so a fast reply is not missed
+        self._waiters.append(waiter)
         try:
-            clean_message = message.strip() + '\n'
-            self.serial_connection.write(clean_message.encode('utf-8'))
-            return True
-        except Exception as e:
-            return False
\ No newline at end of file
+            if not self.uart.send_message(command):
+                raise ConnectionError("Serial port is not open")
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    async def wait_for(self, match, timeout=1.0):
+        """Returns the next message that matches; TimeoutError after timeout [s]."""
+        future = self.loop.create_future()
+        waiter = (_matcher(match), future)
+        self._waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    async def messages(self, match, timeout=None):
+        """
+        Async iterator over the messages that match, from now on. With a
+        timeout [s], TimeoutError is raised when none arrives for that long.
+        """
+        queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        subscriber = (_matcher(match), queue)
+        self._subscribers.append(subscriber)
+        try:
+            while True:
+                if timeout is None:
+                    yield await queue.get()
+                else:
+                    yield await asyncio.wait_for(queue.get(), timeout)
+        finally:
+            self._subscribers.remove(subscriber)
+
+    async def joint_feedback(self, timeout=None):
+        """Async iterator over joint positions [deg], from A_ lines and binary feedback frames alike."""
+        messages = self.messages("A_", timeout)
+        try:
+            async for message in messages:
+                joints = parse_joint_feedback(message)
+                if joints is not None:
+                    yield joints
+        finally:
+            # Unsubscribes now rather than whenever the generator is collected
+            await messages.aclose()
+
+    def _on_message(self, message):
+        if threading.get_ident() == self.thread.ident:
+            self._deliver(message)
+        else:
+            self.loop.call_soon_threadsafe(self._deliver, message)
+
+    def _deliver(self, message):
+        """Runs on the loop: resolves the waiters and feeds the iterators that match."""
+        if self._waiters:
+            for predicate, future in self._waiters:
+                if not future.done() and self._matches(predicate, message):
+                    future.set_result(message)
+        for predicate, queue in self._subscribers:
+            if self._matches(predicate, message):
+                if queue.full():
+                    queue.get_nowait()
+                    self.dropped += 1
+                queue.put_nowait(message)
+
+    @staticmethod
+    def _matches(predicate, message):
+        try:
+            return predicate(message)
+        except Exception:
+            return False
+
+
+_TRANSPORTS = {}
+_TRANSPORTS_LOCK = threading.Lock()
+
+
+def get_async_transport(uart):
+    """Returns the AsyncTransport for uart, starting its event loop on first use."""
+    with _TRANSPORTS_LOCK:
+        transport = _TRANSPORTS.get(id(uart))
+        if transport is None:
+            transport = AsyncTransport(uart)
+            _TRANSPORTS[id(uart)] = transport
+        return transport
@@ -0,0 +1,10 @@
+# Drive train of the joints, shared by the settings view and the trajectory
+# planner so the two never disagree
+
+# Full steps of the steppers and the TMC5160 microstep resolution (MRES = 0)
+FULL_STEPS_PER_MOTOR_REV = 200
+MICROSTEPS = 256
+MICROSTEPS_PER_MOTOR_REV = FULL_STEPS_PER_MOTOR_REV * MICROSTEPS
+
+# Motor revolutions per joint revolution, J1 to J6
+JOINT_GEAR_RATIOS = (6.4, 20.0, 18.0952381, 4.0, 4.0, 10.0)
@@ -41,6 +41,7 @@ class ErrorsView(flet.Container):
         # Communication & Safety errors
         "COM": ("ERROR", "Communication Timeout - No response from controller"),
         "COL": ("ERROR", "Collision Detected - Unexpected resistance"),
+        "CCF": ("ERROR", "Collision Check Failed - Collision model did not load, motion blocked"),
         "OVL": ("ERROR", "Overload Detected - Motor current too high"),
         "GRE": ("ERROR", "Gripper Error - Gripper malfunction"),
         # Near limit warnings (joints 1-6)
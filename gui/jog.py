@@ -6,23 +6,42 @@ import numpy as np
 from scipy.spatial.transform import Rotation as R
 
 try:
-    from gui.cartesian import KinematicsEngine
+    from gui.cartesian import get_kinematics_engine
+    from gui.collision import setpoint_validator, collision_checker_error
 except ImportError:
-    KinematicsEngine = None
+    get_kinematics_engine = None
+
+from gui.trajectory import plan_joint_move, get_trajectory_cache, PROFILE_TRAPEZOID
+from gui.streaming import get_motion_streamer, get_velocity_jogger
 
 class JogView(flet.Container):
 
+    # Animated moves (SAFETY / STANDBY): velocity profile and label refresh rate
+    MOVE_PROFILE = PROFILE_TRAPEZOID
+    MOVE_UI_HZ = 10.0
+
+    # JOG_SPEED [deg/s] is the 100 % speed of a velocity jog
+    JOG_SPEED = 25.0
+
     def __init__(self, uart_communicator, on_status_update=None, on_error=None):
         super().__init__()
         
         self.uart = uart_communicator
+        self.streamer = get_motion_streamer(uart_communicator)
+        self.velocity_jogger = get_velocity_jogger(uart_communicator)
+        self.trajectory_cache = get_trajectory_cache()
         self.on_status_update = on_status_update
         self.on_error = on_error 
         
-        if KinematicsEngine:
-            self.ik = KinematicsEngine("resources/PAROL6.urdf")
+        if get_kinematics_engine:
+            self.ik = get_kinematics_engine("resources/PAROL6.urdf")
         else:
             self.ik = None
+
+        # Every streamed setpoint is checked against the link meshes and obstacles
+        if self.ik is not None and self.ik.joint_origins is not None:
+            self.streamer.validator = setpoint_validator(self.ik)
+            self.streamer.on_rejected = self._report_collision
         
         # --- STATE VARIABLES ---
         self.is_jogging = False
@@ -122,18 +141,9 @@ class JogView(flet.Container):
         except: pass
 
     def send_all_joints(self):
-
-        if self.uart and self.uart.is_open():
-            try:
-             
-                vals = [self.internal_target_values.get(f"J{i}", 0.0) for i in range(1, 7)]
-
-                data_str = ",".join([f"{v:.2f}" for v in vals])
-                cmd = f"J_{data_str}"
-
-                self.uart.send_message(cmd)
-            except Exception:
-                pass
+        """Queues the internal targets as one J_ frame on the shared streamer."""
+        vals = [self.internal_target_values.get(f"J{i}", 0.0) for i in range(1, 7)]
+        self.streamer.push(vals)
 
     def update_joints_and_fk(self, joint_values: dict):
     
@@ -159,30 +169,84 @@ class JogView(flet.Container):
         self._calculate_forward_kinematics()
         if self.page: self.page.update()
 
+    def _velocity_jog_thread(self, joint_code, button_type):
+        """
+        Holds a velocity jog while the button is pressed: feeds the jogger's
+        watchdog, follows speed changes and shows the estimated position.
+        """
+        TICK = 0.1
+        joint = int(joint_code[1:]) - 1
+        button_dir = 1 if button_type == "plus" else -1
+        speed = lambda: button_dir * max(1.0, self.JOG_SPEED * self.speed_percent / 100.0)
+
+        start = [self.internal_target_values.get(f"J{i}", 0.0) for i in range(1, 7)]
+        limits = self.joint_limits.get(joint_code, (-180.0, 180.0))
+        jogger = self.velocity_jogger
+        if not jogger.start(joint, speed(), start, limits):
+            return
+
+        while self.is_jogging and jogger.active:
+            jogger.feed()
+            jogger.set_velocity(speed())
+            for i, val in enumerate(jogger.estimate()):
+                self.internal_target_values[f"J{i+1}"] = float(val)
+            self.update_joints_and_fk(self.internal_target_values)
+            time.sleep(TICK)
+
+        # Rest position estimate until the feedback takes over again
+        for i, val in enumerate(jogger.stop()):
+            self.internal_target_values[f"J{i+1}"] = float(val)
+        self.last_jog_time = time.time()
+        self.update_joints_and_fk(self.internal_target_values)
+
+    @property
+    def jog_mode(self):
+        """
+        Joint jog mode. "STEP" streams J_ position steps. "VELOCITY" (the
+        velocity_jog global setting, which makes the communicator send JV_ON)
+        runs the joint on the controller (JV_ / JK / JVS_); until the
+        controller answers JV_OK, and with controllers that never do, the
+        joint still jogs in steps.
+        """
+        return "VELOCITY" if getattr(self.uart, "velocity_jog", False) else "STEP"
+
     def _jog_thread(self, joint_code, button_type):
+        if (self.jog_mode == "VELOCITY" and joint_code in self.joint_limits
+                and getattr(self.uart, "velocity_active", False)):
+            self._velocity_jog_thread(joint_code, button_type)
+            return
+
         BASE_INCREMENT = 2.5 
+        TICK = 0.1
         
-        while self.is_jogging:
-            current_target = self.internal_target_values.get(joint_code, 0.0)
-            button_dir = 1 if button_type == "plus" else -1
-            
-            factor = self.speed_percent / 100.0
-            step = max(0.1, BASE_INCREMENT * factor)
-            
-            delta = step * button_dir
-            new_target = current_target + delta
-            
-            if joint_code in self.joint_limits:
-                min_limit, max_limit = self.joint_limits[joint_code]
-                if new_target < min_limit: new_target = min_limit
-                elif new_target > max_limit: new_target = max_limit
-
-            self.internal_target_values[joint_code] = new_target
-                 
-            self.send_all_joints()
-                       
-            self.update_joints_and_fk(self.internal_target_values)                     
-            time.sleep(0.1) 
+        with self.streamer.session():
+            while self.is_jogging:
+                current_target = self.internal_target_values.get(joint_code, 0.0)
+                button_dir = 1 if button_type == "plus" else -1
+                
+                factor = self.speed_percent / 100.0
+                step = max(0.1, BASE_INCREMENT * factor)
+                
+                delta = step * button_dir
+                new_target = current_target + delta
+                
+                if joint_code in self.joint_limits:
+                    min_limit, max_limit = self.joint_limits[joint_code]
+                    if new_target < min_limit: new_target = min_limit
+                    elif new_target > max_limit: new_target = max_limit
+
+                start = [self.internal_target_values.get(f"J{i}", 0.0) for i in range(1, 7)]
+                self.internal_target_values[joint_code] = new_target
+                end = [self.internal_target_values.get(f"J{i}", 0.0) for i in range(1, 7)]
+
+                # One TICK of motion, spread over the stream frames (blocks while the lookahead is full).
+                # A colliding setpoint is not sent; hold at the last one that was
+                if not self.streamer.push_segment(start, end, TICK):
+                    held = self.streamer.last_queued
+                    for i, val in enumerate(start if held is None else held):
+                        self.internal_target_values[f"J{i+1}"] = float(val)
+                           
+                self.update_joints_and_fk(self.internal_target_values)                     
 
     def on_jog_start(self, e, joint_code, direction, btn):
         if not self.is_robot_homed:
@@ -319,11 +383,25 @@ class JogView(flet.Container):
         dlg.open = True
         self.page.update()
 
+    def _report_collision(self, setpoint_deg=None):
+        if self.on_error:
+            if not hasattr(self, 'last_collision_warn') or (time.time() - self.last_collision_warn > 2.0):
+                # CCF: rejected because the collision checker failed to load
+                self.on_error("CCF" if collision_checker_error(self.ik) is not None else "COL")
+                self.last_collision_warn = time.time()
+
     def on_stop_click(self, e):
         # Trigger W1 warning
         if self.on_error:
             self.on_error("W1")
         if self.uart: self.uart.send_message("EGRIP_STOP"); self.is_jogging = False
+        if self.velocity_jogger.active: self.velocity_jogger.stop("stop")
+
+        # Drop the queued setpoints and hold where the arm was last sent
+        last_sent = self.streamer.clear()
+        if last_sent is not None:
+            for i, val in enumerate(last_sent):
+                self.internal_target_values[f"J{i+1}"] = float(val)
 
         
     def on_change_tool_click(self, e):
@@ -476,32 +554,31 @@ class JogView(flet.Container):
         self.is_jogging = True
         
         def run():
-
-            while self.is_jogging:
-                current = np.array([self.internal_target_values[f"J{i}"] for i in range(1, 7)])
-                target = np.array(target_joints_deg)
-                diff = target - current
-                dist = np.linalg.norm(diff)
-                
-                if dist < 0.1:
-                    for i, val in enumerate(target_joints_deg):
-                        self.internal_target_values[f"J{i+1}"] = val
-                    self.send_all_joints()
+            # Synchronized time-optimal profile from the motor VMAX/AMAX, played by
+            # the streamer; the labels and FK are refreshed at MOVE_UI_HZ only
+            # Repeated moves come from the trajectory cache instead of being planned
+            start = [self.internal_target_values[f"J{i}"] for i in range(1, 7)]
+            speed = self.speed_percent
+            tool = self.ik.current_tool if self.ik else ""
+            key = self.trajectory_cache.key(start, target_joints_deg, tool, speed,
+                                            self.streamer.rate_hz, "deg", self.MOVE_PROFILE)
+            traj = self.trajectory_cache.get_or_plan(key, self.streamer.rate_hz, lambda: plan_joint_move(
+                start, target_joints_deg, speed / 100.0, self.MOVE_PROFILE, degrees=True))
+            ui_every = max(1, int(round(self.streamer.rate_hz / self.MOVE_UI_HZ)))
+            tick = [0]
+
+            def emit(q):
+                for i, val in enumerate(q):
+                    self.internal_target_values[f"J{i+1}"] = float(val)
+                tick[0] += 1
+                if tick[0] % ui_every == 0:
                     self.update_joints_and_fk(self.internal_target_values)
-                    break
-                
-                factor = self.speed_percent / 100.0
-                step_size = min(dist, 4.5 * factor)
-                
-                new_pos = current + (diff / dist) * step_size
-                for i, val in enumerate(new_pos):
-                    self.internal_target_values[f"J{i+1}"] = val
-                
-                self.send_all_joints()
+
+            try:
+                self.streamer.play(traj, emit, lambda: self.is_jogging)
                 self.update_joints_and_fk(self.internal_target_values)
-                time.sleep(0.1)
-            
-            self.is_jogging = False
+            finally:
+                self.is_jogging = False
             
         threading.Thread(target=run, daemon=True).start()
     
@@ -547,14 +624,14 @@ class JogView(flet.Container):
         Use URDF-based FK from KinematicsEngine (same as CartesianView).
         This ensures X,Y,Z,A,B,C values are identical in both tabs.
         """
-        if not self.ik or not self.ik.chain:
+        if not self.ik or not self.ik.is_ready:
             return
             
         try:
 
             joints_rad = [np.radians(self.current_raw_values.get(f"J{i+1}", 0.0)) for i in range(6)]
             
-            tcp_matrix = self.ik.forward_kinematics(joints_rad)
+            tcp_matrix = self.ik.forward_kinematics(joints_rad, copy=False)
             pos = tcp_matrix[:3, 3]  
             rot = tcp_matrix[:3, :3]
             
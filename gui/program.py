@@ -0,0 +1,359 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+
+from gui.trajectory import plan_joint_move, plan_blended_path, load_joint_dynamics, SampledTrajectory, PROFILE_TRAPEZOID
+
+# Taught programs are stored here as <name>.json
+PROGRAM_DIR = "programs"
+# Bumped whenever segment planning changes, so old compiled segments are ignored
+PROGRAM_CACHE_VERSION = 3
+# Segment keys of each compiled program, kept in the cache dir; segment files
+# no saved program lists are removed after a compile
+PROGRAM_SEGMENT_INDEX = "prog_segments.json"
+_SEGMENT_INDEX_LOCK = threading.Lock()
+
+MOVE_JOINT = "J"
+MOVE_LINEAR = "L"
+
+
+class ProgramError(ValueError):
+    """Invalid program or a segment that cannot be planned (reported as E3)."""
+
+    def __init__(self, message, index=None):
+        super().__init__(message if index is None else f"Point {index}: {message}")
+        self.index = index
+
+
+class ProgramPoint:
+    """
+    One taught point: joints [rad] plus the TCP pose they gave with the tool
+    active at teach time, and how to reach it (MOVE_JOINT / MOVE_LINEAR) at
+    which speed [%]. A blend radius [rad] > 0 lets a joint move pass the point
+    without stopping, at most that far from it. Stored in degrees / metres
+    like the tool table.
+    """
+
+    __slots__ = ("move", "joints", "position", "orientation", "tool", "speed", "blend")
+
+    def __init__(self, move, joints, position, orientation, tool, speed=50.0, blend=0.0):
+        self.move = move
+        self.joints = np.asarray(joints, dtype=float).reshape(6)
+        self.position = np.asarray(position, dtype=float).reshape(3)
+        self.orientation = np.asarray(orientation, dtype=float).reshape(3, 3)
+        self.tool = tool
+        self.speed = float(speed)
+        self.blend = float(blend)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["move"],
+            np.radians(data["joints"]),
+            data["position"],
+            R.from_euler('xyz', data["orientation"], degrees=True).as_matrix(),
+            data["tool"],
+            data.get("speed", 50.0),
+            np.radians(data.get("blend", 0.0))
+        )
+
+    def to_dict(self):
+        return {
+            "move": self.move,
+            "joints": [round(float(v), 6) for v in np.degrees(self.joints)],
+            "position": [round(float(v), 7) for v in self.position],
+            "orientation": [round(float(v), 6) for v in R.from_matrix(self.orientation).as_euler('xyz', degrees=True)],
+            "tool": self.tool,
+            "speed": self.speed,
+            "blend": round(float(np.degrees(self.blend)), 6)
+        }
+
+
+class Program:
+    def __init__(self, name, points=None):
+        self.name = name
+        self.points = list(points or [])
+
+    def teach(self, engine, joints, move=MOVE_JOINT, speed=50.0, index=None, blend=0.0):
+        """Records joints [rad] and the TCP pose of the active tool; appends or inserts at index."""
+        tcp = engine.forward_kinematics(joints)
+        point = ProgramPoint(move, joints, tcp[:3, 3], tcp[:3, :3], engine.current_tool, speed, blend)
+        if index is None:
+            self.points.append(point)
+        else:
+            self.points.insert(index, point)
+        return point
+
+    @classmethod
+    def load(cls, name, directory=PROGRAM_DIR):
+        try:
+            with open(os.path.join(directory, f"{name}.json"), "r") as f:
+                data = json.load(f)
+            return cls(data.get("name", name), [ProgramPoint.from_dict(p) for p in data["points"]])
+        except (OSError, KeyError, TypeError, ValueError) as e:
+            raise ProgramError(f"Cannot read program {name}: {e}")
+
+    def save(self, directory=PROGRAM_DIR):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.name}.json")
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump({"name": self.name, "points": [p.to_dict() for p in self.points]}, f, indent=4)
+        os.replace(tmp_path, path)
+
+
+class CompiledProgram:
+    """
+    Planned joint paths [rad] at rate_hz, one per segment: point i-1 -> i, or
+    a whole run of blended joint moves that is played without stopping.
+    """
+
+    def __init__(self, digest, rate_hz, segments, tools):
+        self.digest = digest
+        self.rate_hz = rate_hz
+        self.segments = segments
+        self.tools = tools
+        self.n_frames = sum(len(s) for s in segments)
+
+
+class ProgramCompiler:
+    """
+    Plans every segment of a program up front. Each segment is cached on disk
+    by the hash of everything it depends on (start joints, target point, tool
+    transform, joint dynamics, rate, URDF), so after an edit only the changed
+    segments, and the ones whose start moved with them, are planned again.
+
+    Consecutive joint moves through points with a blend radius, all with the
+    same tool, are planned as one blended segment.
+
+    After a compile the segments of the program are recorded in the segment
+    index, and segment files that no saved program (or this one) uses any
+    more are deleted, so edits do not pile up old segments on disk.
+    """
+
+    def __init__(self, engine, rate_hz, profile=PROFILE_TRAPEZOID, cache_dir=None, program_dir=PROGRAM_DIR):
+        self.engine = engine
+        self.rate_hz = float(rate_hz)
+        self.profile = profile
+        self.cache_dir = cache_dir or engine.cache_dir
+        self.program_dir = program_dir
+        self.segments_planned = 0
+        self.segments_cached = 0
+        self.segments_removed = 0
+        self._tool_engines = {}
+
+    def compile(self, program):
+        if len(program.points) < 2:
+            raise ProgramError("A program needs at least two points")
+        dynamics = load_joint_dynamics()
+        # Tool engines copy the world offset and tool table as they are now
+        self._tool_engines = {}
+
+        points = program.points
+        for i, point in enumerate(points[1:], 1):
+            if point.move not in (MOVE_JOINT, MOVE_LINEAR):
+                raise ProgramError(f"Unknown move type {point.move!r}", i)
+            if point.tool not in self.engine.tools:
+                raise ProgramError(f"Unknown tool {point.tool!r}", i)
+
+        segments, tools, keys = [], [], []
+        start = points[0].joints
+        i = 1
+        while i < len(points):
+            j = i
+            while (j + 1 < len(points) and points[j].move == MOVE_JOINT and points[j].blend > 0.0
+                   and points[j + 1].move == MOVE_JOINT and points[j + 1].tool == points[j].tool):
+                j += 1
+            group = points[i:j + 1]
+
+            key = self._segment_key(start, group, dynamics)
+            path = self._load_segment(key)
+            if path is None:
+                path = self._plan_segment(i, start, group, dynamics)
+                self._save_segment(key, path)
+                self.segments_planned += 1
+            else:
+                self.segments_cached += 1
+
+            segments.append(path)
+            tools.append(group[-1].tool)
+            keys.append(key)
+            start = path[-1]
+            i = j + 1
+
+        self._collect_segments(program.name, keys)
+        digest = hashlib.sha1("".join(keys).encode()).hexdigest()
+        return CompiledProgram(digest, self.rate_hz, segments, tools)
+
+    def _plan_segment(self, index, start, group, dynamics):
+        point = group[-1]
+        scale = point.speed / 100.0
+        if len(group) > 1:
+            waypoints = [start] + [p.joints for p in group]
+            return plan_blended_path(waypoints, [p.speed / 100.0 for p in group],
+                                     [p.blend for p in group[:-1]], dynamics).sample(self.rate_hz)
+        if point.move == MOVE_JOINT:
+            return plan_joint_move(start, point.joints, scale, self.profile, dynamics).sample(self.rate_hz)
+
+        # MoveL targets are TCP poses of the taught tool; they are solved on a
+        # private copy of the engine so the shared one keeps the UI's tool
+        engine = self._tool_engines.get(point.tool)
+        if engine is None:
+            engine = self._tool_engines[point.tool] = self.engine.for_tool(point.tool)
+        try:
+            traj = engine.plan_linear_move(start, point.position, point.orientation,
+                                           scale, self.rate_hz, self.profile, dynamics)
+        except ValueError as e:
+            raise ProgramError(str(e), index)
+        return traj.setpoints
+
+    def _segment_key(self, start, group, dynamics):
+        key = hashlib.sha1()
+        key.update(np.round(np.asarray(start, dtype=float), 6).tobytes())
+        for point in group:
+            key.update(json.dumps(point.to_dict(), sort_keys=True).encode())
+            key.update(np.round(self.engine.tool_transform(point.tool), 9).tobytes())
+        key.update(np.round(np.concatenate(dynamics), 6).tobytes())
+        key.update(np.round(np.array(self.engine.joint_limits_rad), 9).tobytes())
+        key.update(f"{self.rate_hz:.6f}|{self.profile}|{self.engine.urdf_digest}|{PROGRAM_CACHE_VERSION}".encode())
+        return key.hexdigest()
+
+    def _segment_path(self, key):
+        return os.path.join(self.cache_dir, f"prog_seg_{key[:20]}.npy")
+
+    def _collect_segments(self, name, keys):
+        """Records the segments of program name and deletes the files no saved program uses."""
+        index_path = os.path.join(self.cache_dir, PROGRAM_SEGMENT_INDEX)
+        with _SEGMENT_INDEX_LOCK:
+            try:
+                with open(index_path, "r") as f:
+                    index = json.load(f)
+                if not isinstance(index, dict):
+                    index = {}
+            except (OSError, ValueError):
+                index = {}
+            index[name] = [os.path.basename(self._segment_path(k)) for k in keys]
+            # Entries of deleted programs are dropped along with their segments
+            index = {n: files for n, files in index.items()
+                     if n == name or os.path.exists(os.path.join(self.program_dir, f"{n}.json"))}
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{index_path}.tmp{os.getpid()}"
+                with open(tmp_path, "w") as f:
+                    json.dump(index, f)
+                os.replace(tmp_path, index_path)
+                names = os.listdir(self.cache_dir)
+            except Exception:
+                return
+            used = {f for files in index.values() for f in files}
+            for file_name in names:
+                if file_name.startswith("prog_seg_") and file_name.endswith(".npy") and file_name not in used:
+                    try:
+                        os.remove(os.path.join(self.cache_dir, file_name))
+                        self.segments_removed += 1
+                    except OSError:
+                        pass
+
+    def _load_segment(self, key):
+        try:
+            path = np.load(self._segment_path(key))
+            return path if path.ndim == 2 and path.shape[1] == 6 else None
+        except Exception:
+            return None
+
+    def _save_segment(self, key, path):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            target = self._segment_path(key)
+            tmp_path = f"{target}.tmp{os.getpid()}.npy"
+            np.save(tmp_path, np.asarray(path, dtype=float))
+            os.replace(tmp_path, target)
+        except Exception:
+            pass
+
+
+class ProgramRunner:
+    """
+    Compiles and plays a program through the motion streamer: a joint move to
+    the first point, then the compiled segments, switching tools at segment
+    boundaries. Reports progress (0.0 - 1.0), E3 for a program that does not
+    compile and PRG when it completes.
+    """
+
+    def __init__(self, engine, streamer, on_progress=None, on_error=None, on_setpoint=None, on_tool_change=None):
+        self.engine = engine
+        self.streamer = streamer
+        self.compiler = ProgramCompiler(engine, streamer.rate_hz)
+        self.on_progress = on_progress
+        self.on_error = on_error
+        self.on_setpoint = on_setpoint
+        self.on_tool_change = on_tool_change
+        self.is_running = False
+        self.last_error = None
+
+    def start(self, program, start_joints):
+        if self.is_running:
+            return False
+        self.is_running = True
+        threading.Thread(target=self.run, args=(program, start_joints), daemon=True).start()
+        return True
+
+    def stop(self):
+        self.is_running = False
+
+    def run(self, program, start_joints):
+        self.is_running = True
+        self.last_error = None
+        try:
+            compiled = self.compiler.compile(program)
+        except ProgramError as e:
+            self.last_error = e
+            self.is_running = False
+            self._report("E3")
+            return False
+
+        keep_running = lambda: self.is_running
+        try:
+            first = program.points[0]
+            self._set_tool(first.tool)
+            approach = plan_joint_move(start_joints, first.joints, first.speed / 100.0, self.compiler.profile)
+            if not self.streamer.play(approach, self.on_setpoint, keep_running, degrees=False):
+                return False
+
+            done = 0
+            for path, tool in zip(compiled.segments, compiled.tools):
+                self._set_tool(tool)
+
+                def emit(q, base=done):
+                    emit.count += 1
+                    if self.on_setpoint:
+                        self.on_setpoint(q)
+                    if self.on_progress and emit.count % 10 == 0:
+                        self.on_progress((base + emit.count) / compiled.n_frames)
+                emit.count = 0
+
+                if not self.streamer.play(SampledTrajectory(path, compiled.rate_hz), emit, keep_running, degrees=False):
+                    return False
+                done += len(path)
+
+            if self.on_progress:
+                self.on_progress(1.0)
+            self._report("PRG")
+            return True
+        finally:
+            self.is_running = False
+
+    def _set_tool(self, tool_name):
+        if tool_name == self.engine.current_tool:
+            return
+        if self.on_tool_change:
+            self.on_tool_change(tool_name)
+        else:
+            self.engine.set_tool(tool_name)
+
+    def _report(self, code):
+        if self.on_error:
+            self.on_error(code)
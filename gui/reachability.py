@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+# Bumped whenever the grid layout or sampling changes, so old maps get rebuilt
+REACHABILITY_MAP_VERSION = 2
+
+# Orientation coverage: the TCP approach axis (z) is binned on a cube map,
+# 6 faces x 2 x 2 cells = 24 bits per voxel
+_FACE_CELLS = 2
+_N_BINS = 6 * _FACE_CELLS * _FACE_CELLS
+
+# Every sample also marks the bins of its approach axis tilted by this much,
+# so sparse sampling does not leave holes in the orientation coverage
+_DIRECTION_MARGIN_RAD = 0.35
+
+# Voxels the sampled grid is grown by; the second one also carries direction
+# bits into sparsely sampled neighbours
+_DILATE_VOXELS = 2
+
+
+class ReachabilityMap:
+    """
+    Voxel grid of TCP positions reachable with one tool, built offline by sampling
+    the joint space with batch FK. Each voxel holds a bitmask of the approach
+    directions seen there (0 = unreachable). The grid is stored as .npy and opened
+    memory-mapped, so a lookup is one index computation.
+
+    The grid is dilated by two voxels after sampling, so it accepts some targets
+    IK cannot reach. It is a prefilter built from samples, not a proof: a
+    reachable target can still be rejected where the sampling missed a whole
+    region, though none of 1M random in-limit poses was.
+    """
+
+    def __init__(self, grid, origin, resolution, tool_name=""):
+        self.grid = grid
+        self.origin = np.asarray(origin, dtype=float)
+        self.resolution = float(resolution)
+        self.inv_resolution = 1.0 / self.resolution
+        self.shape = tuple(int(n) for n in grid.shape)
+        self._origin_xyz = tuple(float(o) for o in self.origin)
+        self.tool_name = tool_name
+
+    # ================= QUERIES =================
+
+    def is_reachable(self, position, rotation=None):
+        idx = self._voxel_index(position)
+        if idx is None:
+            return False
+        mask = self.grid.item(idx)
+        if not mask:
+            return False
+        if rotation is None:
+            return True
+        x, y, z = np.asarray(rotation)[:3, 2].tolist()
+        return bool(mask & (1 << self._direction_bin_scalar(x, y, z)))
+
+    def coverage(self, position):
+        """Fraction of approach-direction bins reachable at position (0.0 - 1.0)."""
+        idx = self._voxel_index(position)
+        if idx is None:
+            return 0.0
+        return bin(self.grid.item(idx)).count("1") / _N_BINS
+
+    def _voxel_index(self, position):
+        ox, oy, oz = self._origin_xyz
+        px, py, pz = np.asarray(position, dtype=float).tolist()[:3]
+        fx = (px - ox) * self.inv_resolution
+        fy = (py - oy) * self.inv_resolution
+        fz = (pz - oz) * self.inv_resolution
+        if fx < 0.0 or fy < 0.0 or fz < 0.0:
+            return None
+        x, y, z = int(fx), int(fy), int(fz)
+        if x >= self.shape[0] or y >= self.shape[1] or z >= self.shape[2]:
+            return None
+        return (x, y, z)
+
+    @staticmethod
+    def _direction_bin_scalar(x, y, z):
+        """direction_bin() for a single vector, without numpy overhead."""
+        ax, ay, az = abs(x), abs(y), abs(z)
+        if ax >= ay and ax >= az: major, m, u, v = 0, x, y, z
+        elif ay >= az: major, m, u, v = 1, y, z, x
+        else: major, m, u, v = 2, z, x, y
+        scale = abs(m) or 1.0
+        cu = min(max(int((u / scale + 1.0) * 0.5 * _FACE_CELLS), 0), _FACE_CELLS - 1)
+        cv = min(max(int((v / scale + 1.0) * 0.5 * _FACE_CELLS), 0), _FACE_CELLS - 1)
+        return (major * 2 + (m < 0)) * _FACE_CELLS * _FACE_CELLS + cu * _FACE_CELLS + cv
+
+    @staticmethod
+    def direction_bin(directions):
+        """Cube-map bin of unit vector(s): (..., 3) -> (...,) int in [0, 24)."""
+        d = np.asarray(directions, dtype=float)
+        major = np.argmax(np.abs(d), axis=-1)
+        major_val = np.take_along_axis(d, major[..., None], axis=-1)[..., 0]
+        face = major * 2 + (major_val < 0)
+
+        # The two remaining components, projected onto the face, mapped to cells
+        u_axis, v_axis = (major + 1) % 3, (major + 2) % 3
+        scale = np.where(major_val == 0, 1.0, np.abs(major_val))
+        u = np.take_along_axis(d, u_axis[..., None], axis=-1)[..., 0] / scale
+        v = np.take_along_axis(d, v_axis[..., None], axis=-1)[..., 0] / scale
+        cu = np.clip(((u + 1.0) * 0.5 * _FACE_CELLS).astype(int), 0, _FACE_CELLS - 1)
+        cv = np.clip(((v + 1.0) * 0.5 * _FACE_CELLS).astype(int), 0, _FACE_CELLS - 1)
+        return face * _FACE_CELLS * _FACE_CELLS + cu * _FACE_CELLS + cv
+
+    # ================= BUILD / STORAGE =================
+
+    @classmethod
+    def build(cls, engine, tool_name, resolution=0.02, samples=2_000_000, batch_size=50_000, seed=0):
+        """Samples the joint space inside engine.joint_limits_rad and voxelizes the TCP positions."""
+        reach = (np.sum(np.linalg.norm(engine.joint_origins[:, :3, 3], axis=1))
+                 + np.linalg.norm(engine.flange_offset[:3, 3])
+                 + np.linalg.norm(engine.tool_transform(tool_name)[:3, 3]) + 2 * resolution)
+        n_cells = int(np.ceil(2 * reach / resolution))
+        origin = np.full(3, -reach)
+        occupied = np.zeros((n_cells ** 3, _N_BINS), dtype=bool)
+
+        limits = np.array(engine.joint_limits_rad)
+        rng = np.random.default_rng(seed)
+        for start in range(0, samples, batch_size):
+            n = min(batch_size, samples - start)
+            q = rng.uniform(limits[:, 0], limits[:, 1], (n, len(limits)))
+            tcp = engine.forward_kinematics_batch(q, tool_name=tool_name, world_offset=False)
+            idx = np.clip(((tcp[:, :3, 3] - origin) / resolution).astype(int), 0, n_cells - 1)
+            flat = np.ravel_multi_index(idx.T, (n_cells, n_cells, n_cells))
+
+            # Approach axis plus the same axis tilted towards the tool x/y axes
+            approach, tangents = tcp[:, :3, 2], (tcp[:, :3, 0], tcp[:, :3, 1])
+            occupied[flat, cls.direction_bin(approach)] = True
+            for t in tangents:
+                for sign in (1.0, -1.0):
+                    tilted = approach * np.cos(_DIRECTION_MARGIN_RAD) + sign * t * np.sin(_DIRECTION_MARGIN_RAD)
+                    occupied[flat, cls.direction_bin(tilted)] = True
+
+        bits = np.uint32(1) << np.arange(_N_BINS, dtype=np.uint32)
+        grid = (occupied.astype(np.uint32) @ bits).astype(np.uint32).reshape(n_cells, n_cells, n_cells)
+        for _ in range(_DILATE_VOXELS):
+            grid = cls._dilate(grid)
+        return cls(grid, origin, resolution, tool_name)
+
+    @staticmethod
+    def _dilate(grid):
+        """ORs every voxel with its 26 neighbours."""
+        out = grid.copy()
+        for axis in range(3):
+            src = out.copy()
+            lo = [slice(None)] * 3; hi = [slice(None)] * 3
+            lo[axis] = slice(0, -1); hi[axis] = slice(1, None)
+            out[tuple(lo)] |= src[tuple(hi)]
+            out[tuple(hi)] |= src[tuple(lo)]
+        return out
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp.npy"
+        np.save(tmp_path, np.ascontiguousarray(self.grid))
+        os.replace(tmp_path, path)
+        with open(os.path.splitext(path)[0] + ".json", "w") as f:
+            json.dump({
+                "version": REACHABILITY_MAP_VERSION,
+                "tool": self.tool_name,
+                "origin": self.origin.tolist(),
+                "resolution": self.resolution,
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.splitext(path)[0] + ".json", "r") as f:
+            meta = json.load(f)
+        if meta.get("version") != REACHABILITY_MAP_VERSION:
+            raise ValueError(f"Reachability map version {meta.get('version')} is outdated")
+        grid = np.load(path, mmap_mode="r")
+        return cls(grid, meta["origin"], meta["resolution"], meta.get("tool", ""))
+
+    @staticmethod
+    def cache_path(cache_dir, urdf_digest, tool_name, tool_transform, resolution):
+        key = hashlib.sha1()
+        key.update(urdf_digest.encode())
+        key.update(np.round(np.asarray(tool_transform, dtype=float), 9).tobytes())
+        key.update(f"{resolution:.6f}|{REACHABILITY_MAP_VERSION}".encode())
+        return os.path.join(cache_dir, f"reach_{tool_name}_{key.hexdigest()[:16]}.npy")
+
+
+if __name__ == "__main__":
+    # Offline build: python -m gui.reachability [--force]
+    # The GUI only loads maps; tools without one are not pre-checked
+    import sys
+    from gui.cartesian import KinematicsEngine
+    engine = KinematicsEngine("resources/PAROL6.urdf")
+    force = "--force" in sys.argv[1:]
+    for name in engine.tools:
+        if not force and engine.load_reachability_map(name) is not None:
+            print(f"{name}: up to date")
+            continue
+        path = engine.build_reachability_map(name)
+        print(f"{name}: {path}")
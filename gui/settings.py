@@ -1,10 +1,28 @@
 import flet
 import flet as ft
 from flet import Column, Row, Container, ElevatedButton, Slider, Text, Image, alignment, ScrollMode, MainAxisAlignment, colors, AlertDialog, ProgressRing, IconButton, icons
+import asyncio
 import json
 import time
 import threading
 
+from gui.communication import get_async_transport
+from gui.drive import JOINT_GEAR_RATIOS
+
+# Temperature limits, solenoid time and the link options
+GLOBAL_SETTINGS_FILE = "global_settings.json"
+
+
+def load_global_settings(path=GLOBAL_SETTINGS_FILE):
+    """Saved global settings, {} without a readable file (main.py reads the link options before the views exist)."""
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
 class SettingsView(flet.Container):
     """
     Settings View - FINAL LAYOUT
@@ -27,11 +45,8 @@ class SettingsView(flet.Container):
         
         self.comm = uart_communicator
         
-        # --- GEAR RATIOS (J1 to J6) ---
-        self.gear_ratios = {
-            1: 6.4, 2: 20.0, 3: 18.0952381, 
-            4: 4.0, 5: 4.0, 6: 10.0
-        }
+        # --- GEAR RATIOS (J1 to J6, see gui/drive.py) ---
+        self.gear_ratios = {i: ratio for i, ratio in enumerate(JOINT_GEAR_RATIOS, 1)}
 
         # --- STATE VARIABLES ---
         self.selected_motor_index = 1 
@@ -347,58 +362,72 @@ class SettingsView(flet.Container):
 
     # --- STRICT TEST MOTION ---
     def _run_test_motion(self, e):
-        def move_and_wait_strict(motor, target_angle):
-            if self.comm: self.comm.send_message(f"J{motor}_{target_angle}\r\n")
-            
-            time.sleep(0.5)
-            
-            strict_tolerance = 0.5 
-            last_position = -9999.0
-            stuck_counter = 0       
-            
-            while True:
-                current = self.current_test_pos
-                diff = abs(current - target_angle)
-                
-                if diff <= strict_tolerance:
+        if not self.comm: return
+        get_async_transport(self.comm).submit(self._test_motion_sequence())
+
+    def _test_pos_from_feedback(self, joints):
+        # Same sign convention as current_test_pos (J1-J5 are reported inverted)
+        raw_val = joints[self.selected_motor_index - 1]
+        return raw_val if self.selected_motor_index == 6 else -raw_val
+
+    async def _show_test_result(self, message, color):
+        # The sequence runs on the serial loop; page updates go to a worker thread
+        await asyncio.get_running_loop().run_in_executor(None, self._show_snack_bar, message, color)
+
+    def _show_snack_bar(self, message, color):
+        if self.page:
+            self.page.snack_bar = ft.SnackBar(ft.Text(message), bgcolor=color)
+            self.page.snack_bar.open = True
+            self.page.update()
+
+    async def _move_and_wait_strict(self, motor, target_angle):
+        """Waits on the joint feedback itself: nothing runs until a new position arrives."""
+        self.comm.send_message(f"J{motor}_{target_angle}\r\n")
+
+        await asyncio.sleep(0.5)
+
+        strict_tolerance = 0.5
+        stuck_after = 3.0
+        current = self.current_test_pos
+        if abs(current - target_angle) <= strict_tolerance:
+            return True
+
+        last_position = -9999.0
+        last_change = time.monotonic()
+        feedback = get_async_transport(self.comm).joint_feedback(timeout=stuck_after)
+        try:
+            async for joints in feedback:
+                current = self._test_pos_from_feedback(joints)
+                if abs(current - target_angle) <= strict_tolerance:
                     return True
-                
-                if abs(current - last_position) < 0.01:
-                    stuck_counter += 1
-                else:
-                    stuck_counter = 0
-                    
-                last_position = current
-                
-                if stuck_counter > 30:
-                    err_msg = f"ERROR: Robot stuck at {current}° (Target: {target_angle}°)"
-                    
-                    if self.page: 
-                        self.page.snack_bar = ft.SnackBar(ft.Text(err_msg), bgcolor=ft.colors.RED)
-                        self.page.snack_bar.open = True
-                        self.page.update()
-                    return False 
-                
-                time.sleep(0.1)
 
-        def motion_sequence():
-            motor = self.selected_motor_index
-            self._reset_stall_status(None)
-            
-            if not move_and_wait_strict(motor, 30): return
-            time.sleep(1.0)
-            
-            if not move_and_wait_strict(motor, -30): return
-            time.sleep(1.0)
-            
-            if not move_and_wait_strict(motor, 0): return
-            
-            if self.page: 
-                self.page.snack_bar = ft.SnackBar(ft.Text("Test Complete: Perfect Accuracy"), bgcolor=ft.colors.GREEN)
-                self.page.snack_bar.open = True
-                self.page.update()
+                now = time.monotonic()
+                if abs(current - last_position) >= 0.01:
+                    last_position, last_change = current, now
+                elif now - last_change > stuck_after:
+                    break
+        except asyncio.TimeoutError:
+            # No feedback at all for stuck_after
+            pass
+        finally:
+            await feedback.aclose()
+
+        await self._show_test_result(f"ERROR: Robot stuck at {current}° (Target: {target_angle}°)", ft.colors.RED)
+        return False
+
+    async def _test_motion_sequence(self):
+        motor = self.selected_motor_index
+        await asyncio.get_running_loop().run_in_executor(None, self._reset_stall_status, None)
+
+        if not await self._move_and_wait_strict(motor, 30): return
+        await asyncio.sleep(1.0)
+
+        if not await self._move_and_wait_strict(motor, -30): return
+        await asyncio.sleep(1.0)
 
-        threading.Thread(target=motion_sequence, daemon=True).start()
+        if not await self._move_and_wait_strict(motor, 0): return
+
+        await self._show_test_result("Test Complete: Perfect Accuracy", ft.colors.GREEN)
 
     # --- GRIPPER TUNING ---
     def _open_egrip_tuning(self, e):
@@ -751,7 +780,7 @@ class SettingsView(flet.Container):
 
     def _load_global_settings(self):
         try:
-            with open("global_settings.json", "r") as f:
+            with open(GLOBAL_SETTINGS_FILE, "r") as f:
                 self.global_settings_data = json.load(f)
         except:
             self.global_settings_data = self._get_default_global_settings()
@@ -759,7 +788,7 @@ class SettingsView(flet.Container):
 
     def _save_global_settings(self):
         try:
-            with open("global_settings.json", "w") as f:
+            with open(GLOBAL_SETTINGS_FILE, "w") as f:
                 json.dump(self.global_settings_data, f, indent=4)
         except Exception:
             pass
@@ -770,7 +799,9 @@ class SettingsView(flet.Container):
             "sensor_2_ot": 50, "sensor_2_ct": 70,
             "sensor_3_ot": 50, "sensor_3_ct": 70,
             "sensor_4_ot": 50, "sensor_4_ct": 70,
-            "mag_time": 2528
+            "mag_time": 2528,
+            "binary_link": False,
+            "velocity_jog": False
         }
 
     def _load_gripper_settings(self):
@@ -797,9 +828,29 @@ class SettingsView(flet.Container):
     def _restore_global_defaults(self, e):
         self.global_settings_data = self._get_default_global_settings()
         self._save_global_settings()
+        self._apply_link_settings()
         self.content = self._create_detail_view("global_settings")
         if self.page: self.update()
 
+    def _apply_link_settings(self):
+        """Hands the link options to the communicator: used by the next connect, negotiated now when open."""
+        if not self.comm or not hasattr(self.comm, "binary"):
+            return
+        binary = bool(self.global_settings_data.get("binary_link", False))
+        if binary != self.comm.binary:
+            self.comm.binary = binary
+            if self.comm.is_open():
+                if binary:
+                    self.comm.request_binary()
+                else:
+                    self.comm.disable_binary()
+        # Velocity jogs wait for JV_OK; the jog view steps until then
+        velocity_jog = bool(self.global_settings_data.get("velocity_jog", False))
+        if velocity_jog != self.comm.velocity_jog:
+            self.comm.velocity_jog = velocity_jog
+            if velocity_jog and self.comm.is_open():
+                self.comm.request_velocity_jog()
+
     def _send_global_settings(self, e=None):
         self._save_global_settings()
         
@@ -999,6 +1050,23 @@ class SettingsView(flet.Container):
                              border_radius=5, border=flet.border.all(1, colors.BLUE_GREY_600), alignment=alignment.center)
                 ], spacing=10, height=40))
             
+            # Link options: saved at once and handed to the communicator
+            link_switches = []
+            for label, key in [
+                ("BINARY LINK (BIN_ON)", "binary_link"),
+                ("VELOCITY JOG (JV_ON)", "velocity_jog")
+            ]:
+                def on_switch(e, setting_key=key):
+                    self.global_settings_data[setting_key] = bool(e.control.value)
+                    self._save_global_settings()
+                    self._apply_link_settings()
+
+                link_switches.append(Row(controls=[
+                    Text(label, color="white", size=13, weight="bold", width=150),
+                    flet.Switch(value=bool(self.global_settings_data.get(key, False)),
+                                active_color=colors.CYAN_400, on_change=on_switch)
+                ], spacing=10, height=40))
+
             other_settings_container = Container(
                 content=Column([
                     Row([
@@ -1006,6 +1074,7 @@ class SettingsView(flet.Container):
                         Text("Other Settings", size=14, weight="bold", color=colors.CYAN_400)
                     ], spacing=8),
                     Column(controls=other_sliders, spacing=10),
+                    Row(controls=link_switches, spacing=30),
                 ], spacing=10),
                 bgcolor="#252525",
                 border_radius=8,
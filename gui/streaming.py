@@ -0,0 +1,426 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+from gui.trajectory import load_joint_dynamics
+
+# J_ frame rate and how far (in time) producers may run ahead of the wire
+DEFAULT_STREAM_HZ = 50.0
+DEFAULT_LOOKAHEAD_S = 0.1
+
+# A frame sent more than this fraction of a period after its deadline counts as late
+LATE_FRACTION = 0.5
+# After a stall longer than this many periods the schedule restarts instead of bursting
+RESYNC_PERIODS = 5
+
+# Velocity jogging: JV_<joint>,<deg/s> starts a joint (1-6) or changes its speed,
+# JVS_<joint> ramps it to a stop and JK keeps it alive. The controller stops a
+# velocity-jogged joint when no JK arrives for VELOCITY_WATCHDOG_S; the jogger
+# stops it the same way when its owner stops calling feed()
+VELOCITY_KEEPALIVE_S = 0.1
+VELOCITY_WATCHDOG_S = 0.3
+# Speed changes smaller than this [deg/s] are not sent
+VELOCITY_DEADBAND = 0.05
+
+
+class MotionStreamer:
+    """
+    Single sender of J_ frames. Motion sources queue joint setpoints [deg]; one
+    thread emits them on an absolute deadline schedule (t0 + k / rate_hz), so the
+    frame timing does not depend on how long the producers take per tick.
+    The queue holds lookahead_s worth of setpoints and push() blocks while it is
+    full, which paces the producers to the stream.
+
+    While a session is open (a motion source is active) a deadline with an empty
+    queue counts as an underrun; without sessions the thread sleeps.
+
+    An optional validator(setpoint_deg) -> bool sees every setpoint before it is
+    queued; a rejected one is not sent, push() returns False and on_rejected is
+    called with it. last_queued is then the setpoint the arm will stop at.
+    """
+
+    def __init__(self, uart, rate_hz=DEFAULT_STREAM_HZ, lookahead_s=DEFAULT_LOOKAHEAD_S):
+        self.uart = uart
+        self.rate_hz = float(rate_hz)
+        self.period = 1.0 / self.rate_hz
+        self.capacity = max(1, int(round(lookahead_s * self.rate_hz)))
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._sessions = 0
+        self._thread = None
+        self._running = False
+        self.last_sent = None
+        self.last_queued = None
+        self.validator = None
+        self.on_rejected = None
+
+        self.frames_sent = 0
+        self.underruns = 0
+        self.late_frames = 0
+        self.max_lateness = 0.0
+        self.rejected = 0
+
+    # ================= LIFECYCLE =================
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._queue.clear()
+            self._cond.notify_all()
+
+    @contextmanager
+    def session(self):
+        with self._cond:
+            self._sessions += 1
+            self._cond.notify_all()
+        try:
+            yield self
+        finally:
+            with self._cond:
+                self._sessions -= 1
+                self._cond.notify_all()
+
+    # ================= PRODUCERS =================
+
+    def push(self, setpoint_deg, keep_running=None):
+        """
+        Queues one setpoint, waiting while the lookahead is full. False if
+        keep_running turned False or the validator rejected the setpoint.
+        """
+        q = np.array(setpoint_deg, dtype=float)
+        validator = self.validator
+        if validator is not None and not validator(q):
+            with self._cond:
+                self.rejected += 1
+            if self.on_rejected is not None:
+                self.on_rejected(q)
+            return False
+        with self._cond:
+            while self._running and len(self._queue) >= self.capacity:
+                if keep_running is not None and not keep_running():
+                    return False
+                self._cond.wait(self.period)
+            if keep_running is not None and not keep_running():
+                return False
+            self._queue.append(q)
+            self.last_queued = q
+            self._cond.notify_all()
+        return True
+
+    def push_segment(self, start_deg, end_deg, duration, keep_running=None):
+        """Linear segment from start to end lasting duration [s], resampled to the stream rate."""
+        start = np.asarray(start_deg, dtype=float)
+        end = np.asarray(end_deg, dtype=float)
+        n = max(1, int(round(duration * self.rate_hz)))
+        for k in range(1, n + 1):
+            if not self.push(start + (end - start) * (k / n), keep_running):
+                return False
+        return True
+
+    def play(self, trajectory, emit=None, keep_running=None, degrees=True):
+        """
+        Streams a planned trajectory (anything with sample(rate_hz)) and waits
+        until its last frame is sent. emit(q) is called with every queued
+        setpoint in the trajectory's own units. Returns False when stopped early.
+        """
+        with self.session():
+            for q in trajectory.sample(self.rate_hz):
+                if not self.push(q if degrees else np.degrees(q), keep_running):
+                    return False
+                if emit is not None:
+                    emit(q)
+            return self.wait_drained(keep_running)
+
+    def wait_drained(self, keep_running=None):
+        with self._cond:
+            while self._running and self._queue:
+                if keep_running is not None and not keep_running():
+                    return False
+                self._cond.wait(self.period)
+        return True
+
+    def clear(self):
+        """Drops the queued setpoints and returns the last one sent [deg] (or None)."""
+        with self._cond:
+            self._queue.clear()
+            self.last_queued = self.last_sent
+            self._cond.notify_all()
+            return None if self.last_sent is None else self.last_sent.copy()
+
+    def sync(self, position_deg):
+        """Records a position the arm reached without J_ frames (e.g. a velocity jog)."""
+        with self._cond:
+            self.last_sent = np.array(position_deg, dtype=float)
+            if not self._queue:
+                self.last_queued = self.last_sent
+
+    # ================= STATISTICS =================
+
+    def stats(self):
+        with self._cond:
+            return {
+                "rate_hz": self.rate_hz,
+                "frames": self.frames_sent,
+                "underruns": self.underruns,
+                "late_frames": self.late_frames,
+                "max_lateness_ms": self.max_lateness * 1000.0,
+                "rejected": self.rejected,
+                "queued": len(self._queue),
+            }
+
+    def reset_stats(self):
+        with self._cond:
+            self.frames_sent = 0
+            self.underruns = 0
+            self.late_frames = 0
+            self.max_lateness = 0.0
+            self.rejected = 0
+
+    # ================= SENDER =================
+
+    def _run(self):
+        deadline = None
+        while True:
+            with self._cond:
+                while self._running and not self._queue and not self._sessions:
+                    deadline = None
+                    self._cond.wait()
+                if not self._running:
+                    return
+            if deadline is None:
+                deadline = time.monotonic()
+
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            now = time.monotonic()
+            lateness = now - deadline
+
+            with self._cond:
+                q = self._queue.popleft() if self._queue else None
+                if q is None:
+                    if self._sessions:
+                        self.underruns += 1
+                else:
+                    self.frames_sent += 1
+                    if lateness > self.period * LATE_FRACTION:
+                        self.late_frames += 1
+                    self.max_lateness = max(self.max_lateness, lateness)
+                    self.last_sent = q
+                self._cond.notify_all()
+
+            if q is not None:
+                self._send(q)
+
+            deadline += self.period
+            if now - deadline > RESYNC_PERIODS * self.period:
+                deadline = now
+
+    def _send(self, q_deg):
+        if self.uart and self.uart.is_open():
+            try:
+                self.uart.send_joints(q_deg)
+            except Exception:
+                pass
+
+
+class VelocityJogger:
+    """
+    Velocity-mode jog of one joint: one JV_ command to start, a JK keepalive
+    every VELOCITY_KEEPALIVE_S while it runs and one JVS_ to stop, instead of
+    a J_ frame with all six joints every stream period.
+
+    The position is estimated from the commanded speed, ramped with the
+    joint's AMAX. The jog stops early enough for its deceleration to end
+    inside the soft limits, and before a pose the streamer's validator
+    rejects (collision). Feedback corrects the position once the jog is over.
+    """
+
+    def __init__(self, uart, streamer=None):
+        self.uart = uart
+        self.streamer = streamer
+        self._lock = threading.Lock()
+        self._thread = None
+        self.active = False
+        self.joint = None
+        self.velocity = 0.0
+        self.stop_reason = None
+
+        self._position = np.zeros(6)
+        self._speed = 0.0
+        self._limits = (-np.inf, np.inf)
+        self._accel = np.inf
+        self._vmax = np.inf
+        self._fed = 0.0
+        self._stamp = 0.0
+        self._generation = 0
+
+        self.commands_sent = 0
+        self.bytes_sent = 0
+
+    def start(self, joint, velocity_deg_s, position_deg, limits_deg):
+        """
+        Starts jogging joint (0-5) from position_deg; False if a jog is already
+        running or the controller has not acknowledged velocity jogs (JV_OK).
+        """
+        if not getattr(self.uart, "velocity_active", False):
+            return False
+        vmax, amax = load_joint_dynamics()
+        with self._lock:
+            if self.active:
+                return False
+            self.active = True
+            self.joint = int(joint)
+            self._position = np.array(position_deg, dtype=float)
+            self._limits = (float(limits_deg[0]), float(limits_deg[1]))
+            self._vmax = float(np.degrees(vmax[self.joint]))
+            self._accel = float(np.degrees(amax[self.joint]))
+            self._speed = 0.0
+            self.velocity = float(np.clip(velocity_deg_s, -self._vmax, self._vmax))
+            self.stop_reason = None
+            self._fed = self._stamp = time.monotonic()
+            self._generation += 1
+            generation = self._generation
+
+            # Too close to the limit to even start and stop again
+            reach = self._position[self.joint] + self.velocity * VELOCITY_KEEPALIVE_S \
+                + np.sign(self.velocity) * self.velocity ** 2 / (2.0 * self._accel)
+            if self.velocity == 0.0 or not self._limits[0] < reach < self._limits[1]:
+                self.active = False
+                self.stop_reason = "limit"
+                return False
+
+        if self.streamer is not None:
+            self.streamer.clear()
+        self._send(f"JV_{self.joint + 1},{self.velocity:.2f}")
+        self._thread = threading.Thread(target=self._run, args=(generation,), daemon=True)
+        self._thread.start()
+        return True
+
+    def set_velocity(self, velocity_deg_s):
+        with self._lock:
+            if not self.active:
+                return
+            velocity = float(np.clip(velocity_deg_s, -self._vmax, self._vmax))
+            if abs(velocity - self.velocity) < VELOCITY_DEADBAND:
+                return
+            self.velocity = velocity
+        self._send(f"JV_{self.joint + 1},{velocity:.2f}")
+
+    def feed(self):
+        """Owner keepalive; without it the jog stops after VELOCITY_WATCHDOG_S."""
+        self._fed = time.monotonic()
+
+    def estimate(self):
+        """Estimated joint positions [deg] now."""
+        with self._lock:
+            self._advance(time.monotonic())
+            return self._position.copy()
+
+    def stop(self, reason="released"):
+        """Ramps the joint to a stop; returns the estimated rest position [deg]."""
+        with self._lock:
+            if not self.active:
+                return self._position.copy()
+            self.active = False
+            self.stop_reason = reason
+            self._advance(time.monotonic())
+            # The controller decelerates with AMAX from the current speed
+            self._position[self.joint] += np.sign(self._speed) * self._speed ** 2 / (2.0 * self._accel)
+            self._speed = 0.0
+            position = self._position.copy()
+        self._send(f"JVS_{self.joint + 1}")
+        if self.streamer is not None:
+            self.streamer.sync(position)
+        return position
+
+    def stats(self):
+        return {"commands": self.commands_sent, "bytes": self.bytes_sent}
+
+    def _advance(self, now):
+        """Integrates the estimate up to now (speed ramps towards velocity with AMAX)."""
+        dt = now - self._stamp
+        self._stamp = now
+        if dt <= 0.0:
+            return
+        change = float(np.clip(self.velocity - self._speed, -self._accel * dt, self._accel * dt))
+        self._position[self.joint] += (self._speed + change / 2.0) * dt
+        self._speed += change
+
+    def _run(self, generation):
+        while True:
+            time.sleep(VELOCITY_KEEPALIVE_S)
+            now = time.monotonic()
+            with self._lock:
+                # A stop followed by a new start within one period must not revive this thread
+                if not self.active or generation != self._generation:
+                    return
+                self._advance(now)
+                speed = max(abs(self._speed), abs(self.velocity))
+                braking = speed ** 2 / (2.0 * self._accel) + speed * VELOCITY_KEEPALIVE_S
+                direction = np.sign(self.velocity)
+                rest = self._position.copy()
+                rest[self.joint] += direction * braking
+                lo, hi = self._limits
+                at_limit = rest[self.joint] >= hi if direction > 0 else rest[self.joint] <= lo
+                starved = now - self._fed > VELOCITY_WATCHDOG_S
+
+            if starved:
+                self.stop("watchdog")
+                return
+            if at_limit:
+                self.stop("limit")
+                return
+            validator = self.streamer.validator if self.streamer is not None else None
+            if validator is not None and not validator(rest):
+                self.stop("collision")
+                if self.streamer.on_rejected is not None:
+                    self.streamer.on_rejected(rest)
+                return
+            self._send("JK")
+
+    def _send(self, command):
+        if self.uart and self.uart.is_open():
+            try:
+                if self.uart.send_message(command):
+                    self.commands_sent += 1
+                    self.bytes_sent += len(command) + 1
+            except Exception:
+                pass
+
+
+_STREAMERS = {}
+_STREAMERS_LOCK = threading.Lock()
+_JOGGERS = {}
+
+def get_motion_streamer(uart):
+    """Returns the MotionStreamer shared by all views for uart, starting it on first use."""
+    with _STREAMERS_LOCK:
+        streamer = _STREAMERS.get(id(uart))
+        if streamer is None:
+            streamer = MotionStreamer(uart)
+            streamer.start()
+            _STREAMERS[id(uart)] = streamer
+        return streamer
+
+
+def get_velocity_jogger(uart):
+    """Returns the VelocityJogger for uart, sharing its MotionStreamer (validator included)."""
+    streamer = get_motion_streamer(uart)
+    with _STREAMERS_LOCK:
+        jogger = _JOGGERS.get(id(uart))
+        if jogger is None:
+            jogger = VelocityJogger(uart, streamer)
+            _JOGGERS[id(uart)] = jogger
+        return jogger
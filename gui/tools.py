@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+
+TOOL_TABLE_FILE = "tool_table.json"
+
+# Built-in grippers, used when the tool table is missing or unreadable
+DEFAULT_TOOLS = {
+    "CHWYTAK_MALY": {
+        "translation": [0.100, 0.0, -0.090],
+        "orientation": [0.0, -180.0, 0.0]
+    },
+
+    "CHWYTAK_DUZY": {
+        "translation": [0.0, 0.0, -0.18831],
+        "orientation": [0.0, -90.0, 0.0]
+    }
+}
+
+
+class Tool:
+    """
+    One TCP definition. translation [m] and orientation (xyz euler, degrees) are
+    relative to the flange; transform (flange -> TCP) and inverse are composed
+    once here so the kinematics never rebuild or invert them per call.
+    """
+
+    __slots__ = ("name", "translation", "orientation", "transform", "inverse")
+
+    def __init__(self, name, translation, orientation=(0.0, 0.0, 0.0)):
+        self.name = name
+        self.translation = np.array(translation, dtype=float).reshape(3)
+        self.orientation = np.array(orientation, dtype=float).reshape(3)
+
+        T = np.eye(4)
+        T[:3, :3] = R.from_euler('xyz', self.orientation, degrees=True).as_matrix()
+        T[:3, 3] = self.translation
+        self.transform = T
+
+        T_inv = np.eye(4)
+        T_inv[:3, :3] = T[:3, :3].T
+        T_inv[:3, 3] = -T[:3, :3].T @ self.translation
+        self.inverse = T_inv
+
+        for arr in (self.translation, self.orientation, self.transform, self.inverse):
+            arr.flags.writeable = False
+
+    @property
+    def rotation(self):
+        return self.transform[:3, :3]
+
+    @classmethod
+    def from_dict(cls, name, data):
+        return cls(name, data["translation"], data.get("orientation", [0, 0, 0]))
+
+    def to_dict(self):
+        return {
+            "translation": [round(float(v), 6) for v in self.translation],
+            "orientation": [round(float(v), 6) for v in self.orientation]
+        }
+
+
+class ToolLibrary:
+    """
+    Named tools loaded from a JSON tool table ({name: {translation, orientation}}).
+    Lookups are a dict access; define/remove write the table back to disk.
+    """
+
+    def __init__(self, path=TOOL_TABLE_FILE):
+        self.path = path
+        self.tools = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def __contains__(self, name):
+        return name in self.tools
+
+    def __iter__(self):
+        return iter(list(self.tools))
+
+    def get(self, name):
+        return self.tools.get(name)
+
+    def names(self):
+        return list(self.tools)
+
+    def load(self):
+        table = DEFAULT_TOOLS
+        try:
+            with open(self.path, "r") as f:
+                loaded = json.load(f)
+            if isinstance(loaded, dict) and loaded:
+                table = loaded
+        except Exception:
+            pass
+
+        tools = {}
+        for name, data in table.items():
+            try:
+                tools[name] = Tool.from_dict(name, data)
+            except Exception:
+                pass
+        with self._lock:
+            self.tools = tools or {n: Tool.from_dict(n, d) for n, d in DEFAULT_TOOLS.items()}
+
+    def save(self):
+        with self._lock:
+            table = {name: tool.to_dict() for name, tool in self.tools.items()}
+        try:
+            tmp_path = f"{self.path}.tmp{os.getpid()}"
+            with open(tmp_path, "w") as f:
+                json.dump(table, f, indent=4)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            pass
+
+    def define(self, name, translation, orientation=(0.0, 0.0, 0.0), save=True):
+        """Adds or replaces a tool and returns it."""
+        tool = Tool(name, translation, orientation)
+        with self._lock:
+            self.tools = {**self.tools, name: tool}
+        if save:
+            self.save()
+        return tool
+
+    def remove(self, name, save=True):
+        with self._lock:
+            if name not in self.tools:
+                return False
+            self.tools = {n: t for n, t in self.tools.items() if n != name}
+        if save:
+            self.save()
+        return True
+
+    # ================= TCP CALIBRATION =================
+
+    @staticmethod
+    def calibrate_tcp(flange_poses):
+        """
+        Pivot calibration: the TCP is touched to one fixed point from several
+        flange orientations (4+ poses, as different as possible). Solves
+        R_i t + p_i = c for the flange -> TCP offset t and the point c.
+        Returns (translation, point, rms residual) in metres.
+        """
+        poses = np.asarray(flange_poses, dtype=float)
+        if poses.ndim != 3 or poses.shape[0] < 3:
+            raise ValueError("TCP calibration needs at least 3 flange poses")
+
+        n = poses.shape[0]
+        A = np.zeros((3 * n, 6))
+        A[:, :3] = poses[:, :3, :3].reshape(3 * n, 3)
+        A[:, 3:] = np.tile(-np.eye(3), (n, 1))
+        b = -poses[:, :3, 3].reshape(3 * n)
+
+        x, _, rank, _ = np.linalg.lstsq(A, b, rcond=None)
+        if rank < 6:
+            raise ValueError("TCP calibration poses are degenerate (rotate the flange more)")
+
+        residual = A @ x - b
+        rms = float(np.sqrt(np.sum(residual ** 2) / n))
+        return x[:3], x[3:], rms
+
+
+_LIBRARIES = {}
+_LIBRARIES_LOCK = threading.Lock()
+
+def get_tool_library(path=TOOL_TABLE_FILE):
+    """Returns the ToolLibrary shared by all engines for path, loading it on first use."""
+    key = os.path.abspath(path)
+    with _LIBRARIES_LOCK:
+        library = _LIBRARIES.get(key)
+        if library is None:
+            library = ToolLibrary(path)
+            _LIBRARIES[key] = library
+        return library
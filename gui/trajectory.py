@@ -0,0 +1,468 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from gui.drive import MICROSTEPS_PER_MOTOR_REV, JOINT_GEAR_RATIOS
+
+MOTOR_SETTINGS_FILE = "motor_settings.json"
+
+# Slider set 1 of every motor: [A1, V1, AMAX, VMAX, D1] in TMC5160 ramp units
+RAMP_SLIDER_SET = "1"
+RAMP_AMAX_INDEX = 2
+RAMP_VMAX_INDEX = 3
+
+# TMC5160 internal clock (steps and gear ratios are in gui/drive.py)
+TMC_CLOCK_HZ = 12_000_000
+
+# Used when motor_settings.json is missing or incomplete
+DEFAULT_RAMP_SETTINGS = [
+    [2000, 5000, 10000, 250000, 2000],
+    [2000, 5000, 8000, 200000, 2000],
+    [2000, 5000, 8000, 200000, 2000],
+    [3000, 10000, 15000, 400000, 3000],
+    [3000, 10000, 15000, 400000, 3000],
+    [3000, 8000, 12000, 250000, 3000],
+]
+
+PROFILE_TRAPEZOID = "trapezoid"
+PROFILE_SCURVE = "scurve"
+
+# Blended path segments shorter than this (joint-space norm) are repeated waypoints
+MIN_SEGMENT_LENGTH = 1e-9
+
+
+def ramp_to_joint_units(vmax, amax, gear_ratios=JOINT_GEAR_RATIOS):
+    """
+    TMC5160 VMAX/AMAX register values -> joint velocity [rad/s] and acceleration [rad/s^2].
+    v[usteps/s] = VMAX * fCLK / 2^24, a[usteps/s^2] = AMAX * fCLK^2 / 2^41.
+    """
+    rad_per_ustep = 2.0 * np.pi / (MICROSTEPS_PER_MOTOR_REV * np.asarray(gear_ratios, dtype=float))
+    v = np.asarray(vmax, dtype=float) * TMC_CLOCK_HZ / 2 ** 24 * rad_per_ustep
+    a = np.asarray(amax, dtype=float) * TMC_CLOCK_HZ ** 2 / 2 ** 41 * rad_per_ustep
+    return v, a
+
+
+_DYNAMICS_CACHE = {}
+_DYNAMICS_LOCK = threading.Lock()
+
+def load_joint_dynamics(path=MOTOR_SETTINGS_FILE):
+    """
+    Per-joint (vmax [rad/s], amax [rad/s^2]) from the ramp sliders in motor_settings.json.
+    The file is re-read only when it changes on disk.
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+
+    with _DYNAMICS_LOCK:
+        cached = _DYNAMICS_CACHE.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        ramps = [list(r) for r in DEFAULT_RAMP_SETTINGS]
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            for j in range(6):
+                vals = data.get(str(j + 1), {}).get(RAMP_SLIDER_SET)
+                if vals and len(vals) > RAMP_VMAX_INDEX:
+                    ramps[j] = vals
+        except Exception:
+            pass
+
+        vmax = [r[RAMP_VMAX_INDEX] for r in ramps]
+        amax = [r[RAMP_AMAX_INDEX] for r in ramps]
+        dynamics = ramp_to_joint_units(vmax, amax)
+        _DYNAMICS_CACHE[path] = (mtime, dynamics)
+        return dynamics
+
+
+class JointTrajectory:
+    """
+    Synchronized point-to-point joint move. All joints follow one normalized
+    profile s(t) in [0, 1] along the straight joint-space line, so they start
+    and arrive together; s is scaled so the most constrained joint runs at its
+    own VMAX/AMAX, which makes the move time-optimal for that line.
+
+    The trapezoid has constant acceleration phases. The S-curve uses a sin^2
+    acceleration pulse (jerk-limited, same peak AMAX), which doubles the
+    acceleration phase but removes the acceleration steps.
+    """
+
+    def __init__(self, start, goal, vmax, amax, speed_scale=1.0, profile=PROFILE_TRAPEZOID):
+        self.start = np.asarray(start, dtype=float).copy()
+        self.goal = np.asarray(goal, dtype=float).copy()
+        self.delta = self.goal - self.start
+        self.profile = profile
+
+        moving = np.abs(self.delta) > 1e-12
+        if not np.any(moving):
+            self.peak_velocity = self.peak_accel = 0.0
+            self.accel_time = self.duration = 0.0
+            return
+
+        # Normalized limits: the joint with the least headroom per radian sets them
+        vmax = np.asarray(vmax, dtype=float) * max(float(speed_scale), 1e-3)
+        amax = np.asarray(amax, dtype=float)
+        V = float(np.min(vmax[moving] / np.abs(self.delta[moving])))
+        A = float(np.min(amax[moving] / np.abs(self.delta[moving])))
+
+        # Acceleration phase covers V*ta/2 of the unit path
+        if profile == PROFILE_SCURVE:
+            V = min(V, np.sqrt(A / 2.0))
+            ta = 2.0 * V / A
+        else:
+            V = min(V, np.sqrt(A))
+            ta = V / A
+
+        self.peak_velocity = V
+        self.peak_accel = A
+        self.accel_time = ta
+        self.duration = 1.0 / V + ta
+
+    def progress(self, t):
+        """Normalized path position s(t) for a scalar or an array of times [s]."""
+        t = np.clip(np.asarray(t, dtype=float), 0.0, self.duration)
+        if self.duration <= 0.0:
+            return np.ones_like(t)
+        V, ta, T = self.peak_velocity, self.accel_time, self.duration
+
+        def ramp(x):
+            # Distance covered x seconds into the acceleration phase
+            if self.profile == PROFILE_SCURVE:
+                return V * (x * x / (2.0 * ta) - ta * (1.0 - np.cos(2.0 * np.pi * x / ta)) / (4.0 * np.pi ** 2))
+            return 0.5 * V / ta * x * x
+
+        return np.where(
+            t < ta, ramp(t),
+            np.where(t > T - ta, 1.0 - ramp(np.maximum(T - t, 0.0)), 0.5 * V * ta + V * (t - ta))
+        )
+
+    def position(self, t):
+        """Joint positions at time t (scalar -> (n,), array -> (k, n))."""
+        s = self.progress(t)
+        return self.start + np.multiply.outer(s, self.delta)
+
+    def sample(self, rate_hz):
+        """Setpoints every 1/rate_hz seconds, ending exactly on the goal -> (k, n)."""
+        n = max(1, int(np.ceil(self.duration * rate_hz)))
+        return self.position(np.minimum(np.arange(1, n + 1) / rate_hz, self.duration))
+
+
+def plan_joint_move(start, goal, speed_scale=1.0, profile=PROFILE_TRAPEZOID, dynamics=None, degrees=False):
+    """
+    Time-optimal synchronized move between two joint vectors using the per-joint
+    VMAX/AMAX of motor_settings.json (or dynamics=(vmax, amax) in rad).
+    degrees=True plans in degrees (JogView units).
+    """
+    vmax, amax = dynamics if dynamics is not None else load_joint_dynamics()
+    if degrees:
+        vmax, amax = np.degrees(vmax), np.degrees(amax)
+    return JointTrajectory(start, goal, vmax, amax, speed_scale, profile)
+
+
+
+class BlendedTrajectory:
+    """
+    Multi-point joint path without stops: straight segments at constant
+    velocity joined by parabolic (constant acceleration) blends centred on the
+    corners, so the arm rounds each waypoint instead of halting there.
+
+    Repeated waypoints (zero-length segments) are dropped before timing.
+    Segment i is timed so its fastest joint runs at VMAX (times speed_scales[i]).
+    Blend k lasts long enough for every joint to change velocity within AMAX
+    and never exceeds the adjacent segments. blend_radii[k] [joint-space norm]
+    bounds how far the path passes from corner k (|dv| * tb / 8 at the middle
+    of the blend): the blend is as wide as that allows, and where AMAX needs a
+    wider one the segments on both sides are slowed down until it fits. A
+    radius of 0 leaves only the AMAX minimum blend, without a bound. Where a
+    corner has no room the shorter adjacent segment is slowed down. The start
+    and end blends accelerate from and to rest, which makes single segments
+    plain trapezoids.
+    """
+
+    def __init__(self, waypoints, vmax, amax, speed_scales=1.0, blend_radii=0.0):
+        waypoints = np.asarray(waypoints, dtype=float)
+        n = len(waypoints) - 1
+        scales = np.broadcast_to(np.maximum(np.asarray(speed_scales, dtype=float), 1e-3), (n,))
+        radii = np.broadcast_to(np.asarray(blend_radii, dtype=float), (max(n - 1, 0),))
+
+        # Zero-length segments carry no motion; a corner spread over repeated
+        # waypoints keeps the smallest of their radii
+        kept = np.flatnonzero(np.linalg.norm(np.diff(waypoints, axis=0), axis=1) > MIN_SEGMENT_LENGTH)
+        if not len(kept):
+            kept = np.array([0])
+        self.waypoints = np.vstack([waypoints[:1], waypoints[kept + 1]])
+        self.waypoints[-1] = waypoints[-1]
+        scales = scales[kept]
+        radii = np.array([np.min(radii[a:b]) for a, b in zip(kept[:-1], kept[1:])])
+
+        d = np.diff(self.waypoints, axis=0)
+        n = len(d)
+        vmax = np.asarray(vmax, dtype=float)
+        amax = np.asarray(amax, dtype=float)
+
+        # Segment times at VMAX, then stretched until every corner blend fits
+        T = np.maximum(np.max(np.abs(d) / (vmax * scales[:, None]), axis=1), 1e-6)
+        for _ in range(100):
+            tb_acc = self._accel_blend_times(d, T, amax)
+            room = np.minimum(np.append(T, np.inf), np.insert(T, 0, np.inf))
+            tb_dev = self._deviation_blend_times(d, T, radii)
+            tight = tb_acc > np.minimum(room, tb_dev) * (1.0 + 1e-9)
+            if not np.any(tight):
+                break
+            stretch = np.ones(n)
+            for k in np.flatnonzero(tight):
+                # tb_acc ~ 1/T while room and tb_dev ~ T, so T grows with the square root
+                limit = min(room[k], tb_dev[k])
+                factor = np.sqrt(tb_acc[k] / limit) * 1.01
+                # The radius needs both sides slower; missing room only the shorter side
+                sides = [i for i in (k - 1, k) if 0 <= i < n and (tb_dev[k] < room[k] or T[i] <= room[k])]
+                for i in sides:
+                    stretch[i] = max(stretch[i], factor)
+            T = T * stretch
+
+        velocities = d / T[:, None]
+        v_ext = np.vstack([np.zeros(self.waypoints.shape[1]), velocities, np.zeros(self.waypoints.shape[1])])
+
+        tb = self._accel_blend_times(d, T, amax)
+        tb_dev = self._deviation_blend_times(d, T, radii)
+        for k in range(1, n):
+            if radii[k - 1] > 0.0:
+                tb[k] = max(tb[k], min(tb_dev[k], T[k - 1], T[k]))
+
+        self.segment_times = T
+        self.corner_times = np.concatenate([[0.0], np.cumsum(T)])
+        self.blend_times = tb
+        self.velocities = v_ext
+        self.duration = self.corner_times[-1] + tb[0] / 2.0 + tb[-1] / 2.0
+
+    @staticmethod
+    def _deviation_blend_times(d, T, radii):
+        """Longest blend per corner whose middle stays within its radius of the corner (inf: no bound)."""
+        v = d / T[:, None]
+        limits = np.full(len(d) + 1, np.inf)
+        dv = np.linalg.norm(np.diff(v, axis=0), axis=1)
+        bounded = (radii > 0.0) & (dv > 0.0)
+        limits[1:-1][bounded] = 8.0 * radii[bounded] / dv[bounded]
+        return limits
+
+    @staticmethod
+    def _accel_blend_times(d, T, amax):
+        v = d / T[:, None]
+        v_ext = np.vstack([np.zeros(d.shape[1]), v, np.zeros(d.shape[1])])
+        return np.max(np.abs(np.diff(v_ext, axis=0)) / amax, axis=1)
+
+    def _linear(self, tau):
+        """Corner-to-corner polyline at virtual time tau -> (k, n)."""
+        seg = np.clip(np.searchsorted(self.corner_times, tau, side="right") - 1, 0, len(self.segment_times) - 1)
+        local = np.clip(tau - self.corner_times[seg], 0.0, self.segment_times[seg])
+        return self.waypoints[seg] + local[:, None] * self.velocities[seg + 1]
+
+    def position(self, t):
+        t = np.atleast_1d(np.clip(np.asarray(t, dtype=float), 0.0, self.duration))
+        tau = t - self.blend_times[0] / 2.0
+        q = self._linear(tau)
+        for k, (corner, tb) in enumerate(zip(self.corner_times, self.blend_times)):
+            if tb <= 0.0:
+                continue
+            start = corner - tb / 2.0
+            inside = np.abs(tau - corner) <= tb / 2.0
+            if not np.any(inside):
+                continue
+            x = tau[inside] - start
+            v_in, v_out = self.velocities[k], self.velocities[k + 1]
+            q[inside] = (self._linear(np.array([start]))[0] + np.multiply.outer(x, v_in)
+                         + np.multiply.outer(0.5 * x * x / tb, v_out - v_in))
+        return q
+
+    def sample(self, rate_hz):
+        """Setpoints every 1/rate_hz seconds, ending exactly on the last waypoint -> (k, n)."""
+        n = max(1, int(np.ceil(self.duration * rate_hz)))
+        q = self.position(np.minimum(np.arange(1, n + 1) / rate_hz, self.duration))
+        q[-1] = self.waypoints[-1]
+        return q
+
+
+def plan_blended_path(waypoints, speed_scales=1.0, blend_radii=0.0, dynamics=None, degrees=False):
+    """
+    Joint path through waypoints (first = start) with rounded corners, see
+    BlendedTrajectory. speed_scales is per segment, blend_radii per interior
+    waypoint (both may be scalars). degrees=True plans in degrees.
+    """
+    vmax, amax = dynamics if dynamics is not None else load_joint_dynamics()
+    if degrees:
+        vmax, amax = np.degrees(vmax), np.degrees(amax)
+    return BlendedTrajectory(waypoints, vmax, amax, speed_scales, blend_radii)
+
+class SampledTrajectory:
+    """
+    Precomputed setpoints at a fixed rate (e.g. a solved Cartesian path).
+    Streams like JointTrajectory; other rates are linearly resampled.
+    """
+
+    def __init__(self, setpoints, rate_hz):
+        self.setpoints = np.asarray(setpoints, dtype=float)
+        self.rate_hz = float(rate_hz)
+        self.duration = len(self.setpoints) / self.rate_hz
+
+    def sample(self, rate_hz):
+        if abs(rate_hz - self.rate_hz) < 1e-9 or len(self.setpoints) < 2:
+            return self.setpoints
+        src = np.arange(1, len(self.setpoints) + 1) / self.rate_hz
+        n = max(1, int(np.ceil(self.duration * rate_hz)))
+        dst = np.minimum(np.arange(1, n + 1) / rate_hz, src[-1])
+        return np.stack([np.interp(dst, src, self.setpoints[:, j]) for j in range(self.setpoints.shape[1])], axis=1)
+
+
+class TrajectoryCache:
+    """
+    Planned setpoints keyed by quantized start joints, goal, tool, speed and
+    everything else the plan depends on. Two layers: an in-memory LRU and one
+    .npy file per entry on disk, opened memory-mapped, so a repeated move (also
+    after a restart) is streamed without planning. The disk layer keeps at
+    most disk_capacity files: a put removes the least recently used ones
+    (by mtime, which a disk hit refreshes).
+    """
+
+    # Start/goal quantum in the move's units (0.01 deg / ~1.7e-4 rad)
+    QUANTUM = {"deg": 1e-2, "rad": 1.7e-4, "m": 1e-5}
+
+    def __init__(self, cache_dir, capacity=64, disk_capacity=512):
+        self.cache_dir = cache_dir
+        self.capacity = capacity
+        self.disk_capacity = disk_capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evicted = 0
+        self._lock = threading.Lock()
+
+    def key(self, start, goal, tool, speed_percent, rate_hz, units="rad", extra=""):
+        """Cache key for a move; goal may be joints or a flattened TCP pose."""
+        quantum = self.QUANTUM.get(units, 1e-4)
+        key = hashlib.sha1()
+        key.update(np.round(np.asarray(start, dtype=float) / quantum).astype(np.int64).tobytes())
+        key.update(np.round(np.asarray(goal, dtype=float) / quantum).astype(np.int64).tobytes())
+        key.update(np.round(np.concatenate(load_joint_dynamics()), 6).tobytes())
+        key.update(f"{tool}|{float(speed_percent):.1f}|{float(rate_hz):.6f}|{units}|{extra}".encode())
+        return key.hexdigest()[:24]
+
+    def get(self, key, rate_hz):
+        with self._lock:
+            setpoints = self.entries.get(key)
+            if setpoints is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return SampledTrajectory(setpoints, rate_hz)
+
+        path = self._path(key)
+        try:
+            setpoints = np.load(path, mmap_mode="r")
+        except Exception:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, setpoints)
+        return SampledTrajectory(setpoints, rate_hz)
+
+    def put(self, key, setpoints):
+        setpoints = np.ascontiguousarray(setpoints, dtype=float)
+        with self._lock:
+            self._remember(key, setpoints)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(key)
+            tmp_path = f"{path}.tmp{os.getpid()}.npy"
+            np.save(tmp_path, setpoints)
+            os.replace(tmp_path, path)
+            self._evict_files()
+        except Exception:
+            pass
+
+    def get_or_plan(self, key, rate_hz, plan):
+        """Cached trajectory for key, or plan() sampled at rate_hz and stored."""
+        cached = self.get(key, rate_hz)
+        if cached is not None:
+            return cached
+        setpoints = plan().sample(rate_hz)
+        self.put(key, setpoints)
+        return SampledTrajectory(setpoints, rate_hz)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / total if total else 0.0,
+                "size": len(self.entries),
+                "capacity": self.capacity,
+                "disk_files": len(self._files()),
+                "disk_capacity": self.disk_capacity,
+                "disk_evicted": self.disk_evicted,
+            }
+
+    def _remember(self, key, setpoints):
+        self.entries[key] = setpoints
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"traj_{key}.npy")
+
+    def _files(self):
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return []
+        return [os.path.join(self.cache_dir, n) for n in names if n.startswith("traj_") and n.endswith(".npy")]
+
+    def _evict_files(self):
+        """Removes the least recently used files beyond disk_capacity."""
+        files = self._files()
+        if len(files) <= self.disk_capacity:
+            return
+        aged = []
+        for path in files:
+            try:
+                aged.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+        aged.sort()
+        for _, path in aged[:len(aged) - self.disk_capacity]:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            with self._lock:
+                self.disk_evicted += 1
+
+
+TRAJECTORY_CACHE_DIR = "cache"
+_TRAJECTORY_CACHES = {}
+_TRAJECTORY_CACHES_LOCK = threading.Lock()
+
+def get_trajectory_cache(cache_dir=TRAJECTORY_CACHE_DIR):
+    """Returns the TrajectoryCache shared by all views for cache_dir."""
+    key = os.path.abspath(cache_dir)
+    with _TRAJECTORY_CACHES_LOCK:
+        cache = _TRAJECTORY_CACHES.get(key)
+        if cache is None:
+            cache = TrajectoryCache(cache_dir)
+            _TRAJECTORY_CACHES[key] = cache
+        return cache
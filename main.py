@@ -8,12 +8,14 @@ import serial.tools.list_ports
 try:
     from gui.cartesian import CartesianView
     from gui.jog import JogView
-    from gui.settings import SettingsView 
+    from gui.settings import SettingsView, load_global_settings
     from gui.status import StatusView 
     from gui.errors import ErrorsView
-    from gui.communication import UARTCommunicator
+    from gui.communication import UARTCommunicator, FRAME_JOINTS, FRAME_PROT, get_async_transport
 except ImportError as e:
     CartesianView = JogView = SettingsView = StatusView = ErrorsView = UARTCommunicator = None
+    load_global_settings = None
+    FRAME_JOINTS = FRAME_PROT = None
 
 from PIL import Image
 
@@ -28,7 +30,12 @@ def main(page: ft.Page):
     
     # Communicator initialization
     if UARTCommunicator:
-        communicator = UARTCommunicator()
+        # Link options from the global settings (SETTINGS view, "Other Settings")
+        link_settings = load_global_settings()
+        communicator = UARTCommunicator(binary=bool(link_settings.get("binary_link", False)),
+                                        velocity_jog=bool(link_settings.get("velocity_jog", False)))
+        # The serial event loop reads the port and serves awaitable replies
+        get_async_transport(communicator)
     else:
         class DummyComm:
             def is_open(self): return False
@@ -408,12 +415,17 @@ def main(page: ft.Page):
             views["CARTESIAN"].commanded_joints = cartesian_joints
 
     def global_set_tool(tool_name):
-        """Set tool for ALL views at once"""
+        """Set tool for ALL views at once (views normally share one KinematicsEngine)"""
+        engines = {}
+        for name in ["JOG", "CARTESIAN"]:
+            if name in views and views[name] and views[name].ik:
+                engines[id(views[name].ik)] = views[name].ik
+        for engine in engines.values():
+            engine.set_tool(tool_name)
+
         if "JOG" in views and views["JOG"] and views["JOG"].ik:
-            views["JOG"].ik.set_tool(tool_name)
             views["JOG"]._calculate_forward_kinematics()
         if "CARTESIAN" in views and views["CARTESIAN"] and views["CARTESIAN"].ik:
-            views["CARTESIAN"].ik.set_tool(tool_name)
             views["CARTESIAN"]._update_labels_logic()
 
     # Initialize views - ERRORS first to be available for others
@@ -438,6 +450,80 @@ def main(page: ft.Page):
     if StatusView:
         views["STATUS"] = StatusView()
 
+    def handle_joint_feedback(joint_degrees):
+        """Joint positions [deg] from A_ lines and from binary feedback frames."""
+        joint_values = {f"J{i + 1}": float(v) for i, v in enumerate(joint_degrees)}
+
+        if "JOG" in views and views["JOG"]:
+            views["JOG"].update_joints_and_fk(joint_values)
+        
+        if "CARTESIAN" in views and views["CARTESIAN"]:
+            if hasattr(views["CARTESIAN"], 'update_from_feedback'):
+                views["CARTESIAN"].update_from_feedback(joint_values)
+
+        if "SETTINGS" in views and views["SETTINGS"]:
+            settings = views["SETTINGS"]
+            idx = settings.selected_motor_index
+            key = f"J{idx}"
+            
+            if key in joint_values:
+                raw_val = joint_values[key]
+                if key in ["J1", "J2", "J3", "J4", "J5"]:
+                    settings.current_test_pos = -raw_val
+                else:
+                    settings.current_test_pos = raw_val
+
+    def handle_protection(values):
+        """Power status and temperatures from PROT_ lines and from binary PROT frames."""
+        p3v3, p5v, pok, pstat, t1, t2, t3, t4 = values
+
+        # 1. Update Status View
+        if "STATUS" in views and views["STATUS"]:
+            status = views["STATUS"]
+            # Power
+            status.update_status("PWR3V3", "OK" if p3v3 else "FAIL", ft.colors.GREEN_400 if p3v3 else ft.colors.RED_400)
+            status.update_status("PWR5V", "OK" if p5v else "FAIL", ft.colors.GREEN_400 if p5v else ft.colors.RED_400)
+            status.update_status("PWROK", "OK" if pok else "FAIL", ft.colors.GREEN_400 if pok else ft.colors.RED_400)
+            status.update_status("PWRSTAT", str(pstat), ft.colors.BLUE_400)
+            
+            # Temps
+            status.update_status("TEMP1", f"{t1:.1f} °C", ft.colors.ORANGE_300)
+            status.update_status("TEMP2", f"{t2:.1f} °C", ft.colors.ORANGE_300)
+            status.update_status("TEMP3", f"{t3:.1f} °C", ft.colors.ORANGE_300)
+            status.update_status("TEMP4", f"{t4:.1f} °C", ft.colors.ORANGE_300)
+
+        # 2. Check Thresholds against Global Settings
+        if "SETTINGS" in views and views["SETTINGS"] and "ERRORS" in views and views["ERRORS"]:
+            settings = views["SETTINGS"].global_settings_data
+            errors = views["ERRORS"]
+            
+            # Helper to check one sensor
+            def check_sensor(idx, val):
+                ot_limit = settings.get(f"sensor_{idx}_ot", 50) # Changed default to 50 to match settings.py
+                ct_limit = settings.get(f"sensor_{idx}_ct", 90)
+
+                # Critical (CT) check
+                if val > ct_limit:
+                    errors.handle_error_code(f"CT{idx}")
+                # Warning (OT) check - only if not already critical
+                elif val > ot_limit:
+                    errors.handle_error_code(f"OT{idx}")
+
+            check_sensor(1, t1)
+            check_sensor(2, t2)
+            check_sensor(3, t3)
+            check_sensor(4, t4)
+
+    def handle_uart_frame(frame_type, values):
+        """Binary frames decoded by the communicator (see gui/communication.py)."""
+        try:
+            if frame_type == FRAME_JOINTS:
+                handle_joint_feedback(values)
+            elif frame_type == FRAME_PROT:
+                handle_protection(values)
+        except Exception:
+            pass
+
     def handle_uart_data(data_string):
             """
             Main UART data parsing function in main.py
@@ -626,58 +712,10 @@ def main(page: ft.Page):
             # Format: PROT_p3v3,p5v,pok,pstat,t1,t2,t3,t4
             if data_string.startswith("PROT_"):
                 try:
-                    content = data_string[5:] # Remove PROT_
-                    parts = content.split(',')
+                    parts = data_string[5:].split(',') # Remove PROT_
                     if len(parts) >= 8:
-                        # 1. Parse Power Status
-                        p3v3 = int(parts[0])
-                        p5v = int(parts[1])
-                        pok = int(parts[2])
-                        pstat = int(parts[3])
-                        
-                        # 2. Parse Temperatures
-                        t1 = float(parts[4])
-                        t2 = float(parts[5])
-                        t3 = float(parts[6])
-                        t4 = float(parts[7])
-                        
-                        # 3. Update Status View
-                        if "STATUS" in views and views["STATUS"]:
-                            status = views["STATUS"]
-                            # Power
-                            status.update_status("PWR3V3", "OK" if p3v3 else "FAIL", ft.colors.GREEN_400 if p3v3 else ft.colors.RED_400)
-                            status.update_status("PWR5V", "OK" if p5v else "FAIL", ft.colors.GREEN_400 if p5v else ft.colors.RED_400)
-                            status.update_status("PWROK", "OK" if pok else "FAIL", ft.colors.GREEN_400 if pok else ft.colors.RED_400)
-                            status.update_status("PWRSTAT", str(pstat), ft.colors.BLUE_400)
-                            
-                            # Temps
-                            status.update_status("TEMP1", f"{t1:.1f} °C", ft.colors.ORANGE_300)
-                            status.update_status("TEMP2", f"{t2:.1f} °C", ft.colors.ORANGE_300)
-                            status.update_status("TEMP3", f"{t3:.1f} °C", ft.colors.ORANGE_300)
-                            status.update_status("TEMP4", f"{t4:.1f} °C", ft.colors.ORANGE_300)
-
-                        # 4. Check Thresholds against Global Settings
-                        if "SETTINGS" in views and views["SETTINGS"] and "ERRORS" in views and views["ERRORS"]:
-                            settings = views["SETTINGS"].global_settings_data
-                            errors = views["ERRORS"]
-                            
-                            # Helper to check one sensor
-                            def check_sensor(idx, val):
-                                ot_limit = settings.get(f"sensor_{idx}_ot", 50) # Changed default to 50 to match settings.py
-                                ct_limit = settings.get(f"sensor_{idx}_ct", 90)
-
-                                # Critical (CT) check
-                                if val > ct_limit:
-                                    errors.handle_error_code(f"CT{idx}")
-                                # Warning (OT) check - only if not already critical
-                                elif val > ot_limit:
-                                    errors.handle_error_code(f"OT{idx}")
-
-                            check_sensor(1, t1)
-                            check_sensor(2, t2)
-                            check_sensor(3, t3)
-                            check_sensor(4, t4)
-
+                        # Power status flags, then temperatures
+                        handle_protection([int(p) for p in parts[:4]] + [float(p) for p in parts[4:8]])
                 except Exception:
                     pass
                 return
@@ -687,35 +725,9 @@ def main(page: ft.Page):
             # ==========================================================
             if data_string.startswith("A_"):
                 try:
-                    content = data_string[2:]
-                    parts = [p for p in content.split('_') if p.strip()]
-                    
+                    parts = [p for p in data_string[2:].split('_') if p.strip()]
                     if len(parts) == 6:
-                        joint_values = {
-                            "J1": float(parts[0]), "J2": float(parts[1]),
-                            "J3": float(parts[2]), "J4": float(parts[3]),
-                            "J5": float(parts[4]), "J6": float(parts[5])
-                        }
-
-                        if "JOG" in views and views["JOG"]:
-                            views["JOG"].update_joints_and_fk(joint_values)
-                        
-                        if "CARTESIAN" in views and views["CARTESIAN"]:
-                            if hasattr(views["CARTESIAN"], 'update_from_feedback'):
-                                views["CARTESIAN"].update_from_feedback(joint_values)
-
-                        if "SETTINGS" in views and views["SETTINGS"]:
-                            settings = views["SETTINGS"]
-                            idx = settings.selected_motor_index
-                            key = f"J{idx}"
-                            
-                            if key in joint_values:
-                                raw_val = joint_values[key]
-                                if key in ["J1", "J2", "J3", "J4", "J5"]:
-                                    settings.current_test_pos = -raw_val
-                                else:
-                                    settings.current_test_pos = raw_val
-
+                        handle_joint_feedback([float(p) for p in parts])
                 except: pass
                 return
 
@@ -750,6 +762,11 @@ def main(page: ft.Page):
                         except: pass
 
     communicator.on_data_received = handle_uart_data
+    communicator.on_frame_received = handle_uart_frame
+    # The handlers update the page: they run on the communicator's handler
+    # thread, so the serial event loop never waits on a page update
+    if hasattr(communicator, "start_handler_thread"):
+        communicator.start_handler_thread()
     
     # 2. MIDDLE 
 